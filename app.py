@@ -11,15 +11,27 @@ SRC_DIR = PROJECT_ROOT / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.append(str(SRC_DIR))
 
-from src.config import Paths
-from src.rag import answer, log_audit
-from openai import RateLimitError, APIError, APITimeoutError
+from src.config import Paths, Settings
+from src.audit import audit_answer, audit_duplicate, get_audit_sink
+from src.query import dedup_key
+from src.client import answer_events, ServiceBusy
+from src.llm import is_api_error, is_busy_error  # openai itself is imported on first use
 
 st.set_page_config(page_title="ComplianceBot", page_icon="⚖️", layout="centered")
 
 st.title("⚖️ ComplianceBot (FATF + VARA)")
 st.caption("Grounded answers with quotes & citations. If context is missing → bot says 'Insufficient context.'")
 
+# --- Preload model + index once per server process, while the first user is typing ---
+@st.cache_resource(show_spinner=False)
+def _start_warmup():
+    from src.warmup import warmup
+    settings = Settings()
+    if settings.warmup and not settings.api_url:
+        return warmup(Paths(), settings, background=True)
+
+_start_warmup()
+
 # --- Simple per-session throttle (prevents rapid clicks) ---
 if "last_call_ts" not in st.session_state:
     st.session_state.last_call_ts = 0.0
@@ -29,7 +41,19 @@ if "qa_cache" not in st.session_state:
     st.session_state.qa_cache = {}
 
 # ---------- Input form ----------
+@st.cache_data(ttl=300, show_spinner=False)
+def _jurisdictions():
+    from src.retriever import get_retriever
+    settings = Settings()
+    try:
+        docs = get_retriever(Paths().artifacts_dir, settings.index_name, settings).documents()
+    except Exception:
+        return []
+    return sorted({d.get("jurisdiction") for d in docs if d.get("jurisdiction")})
+
 with st.form("ask_form", clear_on_submit=False):
+    options = ["All"] + ([] if Settings().api_url else _jurisdictions())
+    jurisdiction = st.selectbox("Jurisdiction", options) if len(options) > 1 else "All"
     query = st.text_input("Ask ComplianceBot a question", placeholder="e.g., What does FATF Rec 16 require for wire transfers?")
     submitted = st.form_submit_button("Answer")
 
@@ -47,38 +71,70 @@ if submitted:
     st.session_state.last_call_ts = now
 
     # Serve from cache if available
-    key = query.strip().lower()
+    filters = {"jurisdiction": jurisdiction} if jurisdiction != "All" else None
+    key = (dedup_key(query), jurisdiction)  # "Rec 16" and "FATF Recommendation 16" share an entry
     if key in st.session_state.qa_cache:
+        try:
+            audit_duplicate(query, "session_cache", source="app", filters=filters)
+        except Exception:
+            pass
         st.subheader("Answer (cached)")
         st.markdown(st.session_state.qa_cache[key])
         st.stop()
 
-    # Run the RAG pipeline with friendly error handling
+    # Run the RAG pipeline with friendly error handling; the answer is rendered as it streams
+    t0 = time.perf_counter()
     try:
-        with st.spinner("Searching authoritative sources and generating answer..."):
-            res = answer(query)  # Answer(text=..., quotes=[...], citations=[...], used_contexts=[...])
-    except (RateLimitError, APITimeoutError):
-        st.warning("⏳ High load detected. Please wait a few seconds and try again.")
-        st.stop()
-    except APIError as e:
-        st.error(f"Upstream API error: {e.__class__.__name__}. Please try again shortly.")
-        st.stop()
+        with st.spinner("Searching authoritative sources..."):
+            events = answer_events(query, filters=filters)  # via COMPLIANCEBOT_API_URL when set, else in-process
+            next(events)  # ("results", ...): retrieval is done once this returns
+        res = None
+        placeholder = None
+        streamed = ""
+        for kind, payload in events:
+            if kind == "token":
+                if placeholder is None:
+                    st.subheader("Answer")
+                    placeholder = st.empty()
+                streamed += payload
+                placeholder.markdown(streamed + "▌")
+            elif kind == "tail" and placeholder is not None:
+                placeholder.markdown(streamed.strip() + "\n\n" + payload)
+            elif kind == "answer":
+                res = payload  # Answer(text=..., quotes=[...], citations=[...], used_contexts=[...])
     except Exception as e:
-        st.error(f"Unexpected error: {e}")
+        if isinstance(e, ServiceBusy) or is_busy_error(e):
+            st.warning("⏳ High load detected. Please wait a few seconds and try again.")
+        elif is_api_error(e):
+            st.error(f"Upstream API error: {e.__class__.__name__}. Please try again shortly.")
+        else:
+            st.error(f"Unexpected error: {e}")
+        st.stop()
+
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+    if res is None:  # the stream ended early (e.g. the API connection was cut)
+        st.error("The answer stream ended before the answer was complete. Please try again.")
         st.stop()
 
     # Guardrail: insufficient
     if res.text.strip() == "Insufficient context.":
         st.error("Insufficient context.")
+        if not res.audited:  # answers from the API were logged by the service
+            try:
+                audit_answer(query, res, latency_ms, source="app", filters=filters)  # refusals belong in the trail too
+            except Exception:
+                pass
         if res.used_contexts:
             with st.expander("Closest sources (for debugging)"):
                 for r in res.used_contexts[:3]:
                     st.write(f"- {r['doc_name']}#{r['anchor']}")
         st.stop()
 
-    # Answer panel
-    st.subheader("Answer")
-    st.markdown(res.text)
+    # Answer panel (final composed text replaces the streamed draft)
+    if placeholder is None:
+        st.subheader("Answer")
+        placeholder = st.empty()
+    placeholder.markdown(res.text)
 
     with st.expander("Quotes (structured view)"):
         if res.quotes:
@@ -94,15 +150,16 @@ if submitted:
         else:
             st.write("No citations captured.")
 
-    # Audit log
-    try:
-        paths = Paths()
-        os.makedirs(paths.logs_dir, exist_ok=True)
-        log_audit(query, res.citations, paths=paths)
-        st.success("Logged to audit trail.")
-        st.caption(f"Log file: {Path(paths.logs_dir) / 'audit_log.csv'}")
-    except Exception as e:
-        st.warning(f"Could not write audit log: {e}")
+    # Audit log (queued; written in the background). Answers from the API were logged by the service.
+    if res.audited:
+        st.success("Logged to the API's audit trail.")
+    else:
+        try:
+            audit_answer(query, res, latency_ms, source="app", filters=filters)
+            st.success("Logged to audit trail.")
+            st.caption(f"Log file: {get_audit_sink(Paths()).path}")
+        except Exception as e:
+            st.warning(f"Could not write audit log: {e}")
 
     # Cache the final composed text to absorb repeat clicks
     st.session_state.qa_cache[key] = res.text
@@ -0,0 +1,216 @@
+# src/ann.py
+"""
+FAISS index construction for the retriever.
+
+INDEX_TYPE selects flat | hnsw | ivf_flat | ivf_pq, or auto (by corpus size).
+All types use inner product on L2-normalized vectors (= cosine similarity).
+Two more store quantized vectors and are only used when asked for:
+sq8 (int8 per dimension, 4x smaller than flat) and binary (1 bit per
+dimension scanned by Hamming distance; the best ANN_REFINE_FACTOR * k are
+rescored against int8 copies, so scores stay cosines).
+
+    python -m src.ann                 # benchmark every type on the current index's vectors
+    python -m src.ann --synthetic 50000   # ... or on clustered random vectors of that size
+
+reports recall@k against the flat index, per-query latency and index size.
+"""
+from __future__ import annotations
+import os, json, math, time, argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import Paths, Settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "binary")
+
+def choose_index_type(n: int) -> str:
+    """Exact search while it is cheap; graph, then inverted lists, then compression as the corpus grows."""
+    if n < 20_000:
+        return "flat"
+    if n < 200_000:
+        return "hnsw"
+    if n < 2_000_000:
+        return "ivf_flat"
+    return "ivf_pq"
+
+def resolve_index_type(n: int, settings: Settings) -> str:
+    kind = settings.index_type.lower()
+    if kind == "auto":
+        return choose_index_type(n)
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"INDEX_TYPE must be auto or one of {', '.join(INDEX_TYPES)}; got {settings.index_type!r}")
+    return kind
+
+def _nlist(n: int, settings: Settings) -> int:
+    nlist = settings.ann_ivf_nlist or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39))  # FAISS wants ~39 training points per list
+
+def build_ann_index(vecs: np.ndarray, settings: Settings = Settings(), kind: Optional[str] = None):
+    """Build (and train, for IVF types) an index over `vecs` (float32, normalized)."""
+    import faiss
+
+    vecs = np.ascontiguousarray(vecs, dtype="float32")
+    n, dim = vecs.shape
+    kind = kind or resolve_index_type(n, settings)
+    ip = faiss.METRIC_INNER_PRODUCT
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings.ann_hnsw_m, ip)
+        index.hnsw.efConstruction = max(40, 2 * settings.ann_hnsw_m)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        nlist = _nlist(n, settings)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, ip)
+        else:
+            m = settings.ann_pq_m
+            if dim % m:
+                raise ValueError(f"ANN_PQ_M={m} must divide the embedding dimension {dim}")
+            nbits = 8 if n >= 39 * 256 else max(1, int(math.log2(max(2, n // 39))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits, ip)
+        index.train(vecs)  # the faiss wrapper keeps `quantizer` referenced
+    elif kind == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, ip)
+        index.train(vecs)
+    elif kind == "binary":
+        lsh = faiss.IndexLSH(dim, dim, False, False)  # sign bits, no rotation
+        lsh.metric_type = ip  # IndexRefine wants matching metrics; LSH always ranks by Hamming distance
+        index = faiss.IndexRefine(lsh, faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, ip))
+        index.train(vecs)
+    else:
+        raise ValueError(f"Unknown index type {kind!r}")
+    index.add(vecs)
+    apply_search_params(index, settings)
+    return index
+
+def apply_search_params(index, settings: Settings):
+    """Set nprobe / efSearch / refine factor from Settings on a freshly built or loaded index."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.ann_nprobe, ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = settings.ann_ef_search
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = float(settings.ann_refine_factor)
+    return index
+
+def search_params(index, selector):
+    """
+    SearchParameters restricting `index.search` to `selector`, keeping the
+    index's nprobe / efSearch; None for index types that take no selector (binary).
+    """
+    import faiss
+
+    if isinstance(index, faiss.IndexRefine):
+        return None
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def index_memory_bytes(index) -> int:
+    import faiss
+    return int(faiss.serialize_index(index).nbytes)
+
+def index_kind(index) -> str:
+    import faiss
+    if isinstance(index, faiss.IndexRefine):
+        return "binary"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+# -------- Benchmark --------
+def _load_corpus_vectors(artifacts_dir: str, settings: Settings) -> np.ndarray:
+    import faiss
+
+    folder = os.path.join(artifacts_dir, settings.index_name)
+    vec_path = os.path.join(folder, "vectors.npy")
+    if os.path.exists(vec_path):
+        return np.load(vec_path).astype("float32")
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)  # flat indexes store the vectors verbatim
+
+def benchmark(vecs: np.ndarray, settings: Settings, k: int = 10, n_queries: int = 200,
+              kinds: List[str] = list(INDEX_TYPES), seed: int = 0) -> List[Dict[str, float]]:
+    """Recall@k vs flat, per-query latency and serialized size for each index type."""
+    rng = np.random.default_rng(seed)
+    n, dim = vecs.shape
+    # Queries: perturbed corpus vectors, so each has a meaningful neighbourhood
+    q = vecs[rng.integers(0, n, size=n_queries)] + rng.normal(0, 0.05, size=(n_queries, dim)).astype("float32")
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    q = q.astype("float32")
+    k = min(k, n)
+
+    truth = build_ann_index(vecs, settings, "flat").search(q, k)[1]
+    rows = []
+    for kind in kinds:
+        t0 = time.perf_counter()
+        try:
+            index = build_ann_index(vecs, settings, kind)
+        except Exception as e:
+            rows.append({"index": kind, "error": str(e)})
+            continue
+        build_s = time.perf_counter() - t0
+        lat = []
+        found = np.empty_like(truth)
+        for i in range(n_queries):
+            t = time.perf_counter()
+            found[i] = index.search(q[i:i + 1], k)[1][0]
+            lat.append(time.perf_counter() - t)
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(n_queries)])
+        lat_ms = np.array(lat) * 1000
+        rows.append({
+            "index": kind,
+            "recall_at_k": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(lat_ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(lat_ms, 95)), 3),
+            "build_s": round(build_s, 3),
+            "memory_mb": round(index_memory_bytes(index) / 1e6, 3),
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index types on recall@k, latency and memory.")
+    parser.add_argument("--artifacts_dir", default=str(Paths().artifacts_dir))
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark N random vectors instead of the corpus")
+    parser.add_argument("--dim", type=int, default=384, help="dimension for --synthetic")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    settings = Settings()
+    if args.synthetic:
+        # Clustered like real chunk embeddings (topics), not uniform noise
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(max(1, args.synthetic // 100), args.dim))
+        vecs = centers[rng.integers(0, len(centers), args.synthetic)] + rng.normal(0, 0.6, size=(args.synthetic, args.dim))
+        vecs = (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype("float32")
+    else:
+        vecs = _load_corpus_vectors(args.artifacts_dir, settings)
+    rows = benchmark(vecs, settings, k=args.k, n_queries=args.queries)
+    if args.json:
+        print(json.dumps({"n": len(vecs), "k": args.k, "auto": choose_index_type(len(vecs)), "results": rows}, indent=1))
+        return
+    print(f"{len(vecs)} vectors, k={args.k}, auto choice: {choose_index_type(len(vecs))}")
+    print(f"{'index':<9} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'MB':>8}")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['index']:<9} error: {r['error']}")
+            continue
+        print(f"{r['index']:<9} {r['recall_at_k']:>9.3f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['build_s']:>8.2f} {r['memory_mb']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# src/answer_cache.py
+from __future__ import annotations
+import os, json, time, sqlite3, threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .utils import ensure_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope TEXT NOT NULL,          -- hash of prompt / model / retrieval settings
+    index_version TEXT NOT NULL,  -- Retriever.version the answer was built from
+    query TEXT NOT NULL,
+    embedding BLOB NOT NULL,      -- float32, L2-normalized
+    payload TEXT NOT NULL,        -- JSON of the Answer
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_scope ON answers(scope, index_version);
+CREATE INDEX IF NOT EXISTS answers_access ON answers(last_access);
+"""
+
+class AnswerCache:
+    """
+    Cross-session answer cache in one SQLite file. A lookup is a hit when a
+    stored query in the same scope and index version has cosine similarity
+    >= `threshold` with the new query. Entries expire after `ttl` seconds and
+    the least recently used are evicted beyond `max_entries`. Rows of a scope
+    built from an older index version are deleted the first time that scope
+    sees a new version.
+
+    Embeddings of the active scope are mirrored in memory and topped up from
+    the database incrementally, so other processes' writes are picked up.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.95, ttl: float = 86400.0, max_entries: int = 5000):
+        ensure_dir(os.path.dirname(path))
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (scope, index_version) -> (ids, matrix, max_id)
+        self._mirror: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray, int]] = {}
+        self._versions: Dict[str, str] = {}  # scope -> index version last seen
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _invalidate_old_versions(self, scope: str, index_version: str):
+        # Only within the scope: it includes the index name, and other indexes share this file.
+        if self._versions.get(scope) == index_version:
+            return
+        with self._conn() as conn:
+            conn.execute("DELETE FROM answers WHERE scope = ? AND index_version != ?", (scope, index_version))
+        with self._lock:
+            self._mirror = {k: v for k, v in self._mirror.items() if k[0] != scope or k[1] == index_version}
+            self._versions[scope] = index_version
+
+    def _sync(self, scope: str, index_version: str) -> Tuple[np.ndarray, np.ndarray]:
+        key = (scope, index_version)
+        with self._lock:
+            ids, mat, max_id = self._mirror.get(key, (np.zeros(0, dtype="int64"), None, 0))
+        rows = self._conn().execute(
+            "SELECT id, embedding FROM answers WHERE scope = ? AND index_version = ? AND id > ? ORDER BY id",
+            (scope, index_version, max_id),
+        ).fetchall()
+        if rows:
+            new_ids = np.array([r[0] for r in rows], dtype="int64")
+            new_mat = np.stack([np.frombuffer(r[1], dtype="float32") for r in rows])
+            ids = np.concatenate([ids, new_ids])
+            mat = new_mat if mat is None else np.vstack([mat, new_mat])
+            with self._lock:
+                self._mirror[key] = (ids, mat, int(new_ids[-1]))
+        return ids, mat
+
+    def _forget(self, scope: str, index_version: str, row_id: int):
+        key = (scope, index_version)
+        with self._lock:
+            if key in self._mirror:
+                ids, mat, max_id = self._mirror[key]
+                keep = ids != row_id
+                self._mirror[key] = (ids[keep], mat[keep], max_id)
+
+    def lookup(self, qvec: np.ndarray, scope: str, index_version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached Answer payload (dict) for the nearest stored query, or None."""
+        self._invalidate_old_versions(scope, index_version)
+        ids, mat = self._sync(scope, index_version)
+        if mat is None or not len(ids):
+            self.misses += 1
+            return None
+        sims = mat @ qvec.reshape(-1).astype("float32")
+        best = int(np.argmax(sims))
+        if float(sims[best]) < self.threshold:
+            self.misses += 1
+            return None
+        row_id = int(ids[best])
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT payload, created FROM answers WHERE id = ?", (row_id,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            # Evicted by another process, or expired.
+            self._forget(scope, index_version, row_id)
+            if row is not None:
+                with conn:
+                    conn.execute("DELETE FROM answers WHERE id = ?", (row_id,))
+            self.misses += 1
+            return None
+        with conn:
+            conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (now, row_id))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def store(self, query: str, qvec: np.ndarray, scope: str, index_version: str, payload: Dict[str, Any]):
+        now = time.time()
+        emb = np.ascontiguousarray(qvec.reshape(-1), dtype="float32").tobytes()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO answers (scope, index_version, query, embedding, payload, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, index_version, query, emb, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        # Deleted rows may still sit in the mirror; lookup() re-checks the row before serving it.
+
+    def stats(self) -> Dict[str, int]:
+        (size,) = self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+_caches: Dict[str, AnswerCache] = {}
+_caches_lock = threading.Lock()
+
+def get_answer_cache(path: str, settings) -> AnswerCache:
+    """Return the process-wide AnswerCache for `path`."""
+    cache = _caches.get(path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(path)
+            if cache is None:
+                cache = AnswerCache(
+                    path,
+                    threshold=settings.answer_cache_threshold,
+                    ttl=settings.answer_cache_ttl,
+                    max_entries=settings.answer_cache_max_entries,
+                )
+                _caches[path] = cache
+    return cache
@@ -0,0 +1,183 @@
+# src/audit.py
+"""
+Audit trail: one JSON object per answered question in data/logs/audit.jsonl.
+Each record carries the question's dedup key hash and how many times this
+process has seen it ("repeat"); `python -m src.query dupes` summarizes the trail.
+
+log() only enqueues. A background thread writes batches with a single
+O_APPEND write each (so concurrent processes never interleave lines), fsyncs
+every AUDIT_FSYNC_INTERVAL seconds and at exit, and rotates the file to
+audit-YYYYMMDD-HHMMSS-<pid>.jsonl when it passes AUDIT_MAX_MB or the
+UTC day changes.
+"""
+from __future__ import annotations
+import os, json, time, queue, atexit, datetime, threading
+from typing import Any, Dict, List, Optional
+
+from .config import Paths, Settings
+
+AUDIT_FILE = "audit.jsonl"
+
+class AuditSink:
+    def __init__(self, log_dir: str, fsync_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024,
+                 rotate_daily: bool = True):
+        self.path = os.path.join(log_dir, AUDIT_FILE)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.written = 0
+        self.errors = 0
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._fd: Optional[int] = None
+        self._closed = False
+        os.makedirs(log_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record: Dict[str, Any]):
+        """Queue one record; never blocks on disk."""
+        record.setdefault("ts", datetime.datetime.utcnow().isoformat() + "Z")
+        self._q.put(record)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written and fsynced."""
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._q.put(None)
+            self._thread.join(timeout=10)
+
+    # -------- writer thread --------
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+
+    def _rotate_if_needed(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if self._fd is not None and (st is None or st.st_ino != os.fstat(self._fd).st_ino):
+            os.close(self._fd)  # another process rotated it
+            self._fd = None
+        now = datetime.datetime.utcnow()
+        if st is not None and (
+                st.st_size >= self.max_bytes
+                or (self.rotate_daily and datetime.datetime.utcfromtimestamp(st.st_mtime).date() != now.date())):
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+            try:
+                os.replace(self.path, os.path.join(os.path.dirname(self.path),
+                                                   f"audit-{now:%Y%m%d-%H%M%S}-{os.getpid()}.jsonl"))
+            except FileNotFoundError:
+                pass  # rotated by another process a moment ago
+        if self._fd is None:
+            self._open()
+
+    def _write(self, records: List[Dict[str, Any]]):
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records).encode("utf-8")
+        self._rotate_if_needed()
+        os.write(self._fd, data)  # one append per batch: whole lines, never interleaved
+        self.written += len(records)
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        retry: List[Dict[str, Any]] = []
+        while True:
+            batch: List[Dict[str, Any]] = retry
+            waiters: List[threading.Event] = []
+            stop = False
+            try:
+                item = self._q.get(timeout=self.fsync_interval)
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch.append(item)
+                    item = self._q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write(batch)
+                    dirty = True
+                if dirty and (stop or waiters or time.monotonic() - last_sync >= self.fsync_interval):
+                    os.fsync(self._fd)
+                    dirty, last_sync = False, time.monotonic()
+                retry = []
+            except OSError:
+                self.errors += 1  # disk trouble: keep serving, retry the batch next round
+                retry = batch if not stop else []
+            for w in waiters:
+                w.set()
+            if stop:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                return
+
+_sinks: Dict[str, AuditSink] = {}
+_sinks_lock = threading.Lock()
+
+def get_audit_sink(paths: Paths = Paths(), settings: Settings = Settings()) -> AuditSink:
+    """Return the process-wide sink for paths.logs_dir."""
+    key = os.path.abspath(paths.logs_dir)
+    sink = _sinks.get(key)
+    if sink is None:
+        with _sinks_lock:
+            sink = _sinks.get(key)
+            if sink is None:
+                sink = AuditSink(paths.logs_dir, settings.audit_fsync_interval,
+                                 settings.audit_max_mb * 1024 * 1024, settings.audit_rotate_daily)
+                _sinks[key] = sink
+    return sink
+
+def _query_fields(question: str) -> Dict[str, Any]:
+    from .query import canonical_query, dedup_key, get_query_counter, key_hash
+
+    fields: Dict[str, Any] = {"question": question, "query_key": key_hash(question),
+                              "repeat": get_query_counter().seen(dedup_key(question))}
+    canonical = canonical_query(question)
+    if canonical != question.strip():
+        fields["canonical"] = canonical
+    return fields
+
+def audit_answer(question: str, res, latency_ms: Optional[float] = None, source: str = "app",
+                 paths: Paths = Paths(), settings: Settings = Settings(), **extra):
+    """Queue the audit record for one answer (rag.Answer)."""
+    from .embed_backend import embedding_id
+    from .rag import PROMPT_VERSION
+
+    record = {
+        "event": "answer",
+        "source": source,
+        **_query_fields(question),
+        "answered": res.text.strip() != "Insufficient context.",
+        "citations": list(res.citations),
+        "quotes": list(res.quotes),
+        "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+        "model": settings.openai_model,
+        "embedding_model": embedding_id(settings),
+        "index_version": getattr(res, "index_version", None),  # set by the pipeline; never opens the index here
+        "prompt_version": PROMPT_VERSION,
+    }
+    if getattr(res, "trace", None):
+        record["trace"] = res.trace
+    record.update(extra)
+    get_audit_sink(paths, settings).log(record)
+
+def audit_duplicate(question: str, served_by: str, source: str = "app", paths: Paths = Paths(),
+                    settings: Settings = Settings(), **extra):
+    """Queue the record for a repeat served without a pipeline run (served_by: "coalesced", "session_cache")."""
+    record = {"event": "duplicate", "source": source, **_query_fields(question), "served_by": served_by}
+    record.update(extra)
+    get_audit_sink(paths, settings).log(record)
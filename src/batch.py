@@ -0,0 +1,94 @@
+# src/batch.py
+"""
+Bulk question answering, e.g. a counterparty questionnaire.
+
+    python -m src.batch questions.jsonl -o answers.jsonl
+
+Input lines are JSON objects with a "question" key (optionally "id"), or plain
+text, one question per line. Output is JSONL in input order.
+"""
+from __future__ import annotations
+import sys, json, argparse
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Union
+
+from .config import Paths, Settings
+from .retriever import retrieve_many
+from .llm import LLMClient
+from .rag import Answer, answer_from_results
+from .context import retrieval_depth
+from .query import canonical_query
+
+def iter_answers(queries: List[str], paths: Paths = Paths(), settings: Settings = Settings(),
+                 concurrency: Optional[int] = None, return_exceptions: bool = False) -> Iterator[Union[Answer, Exception]]:
+    """
+    Yield one Answer per query, in input order, as soon as it (and everything
+    before it) is done. Retrieval runs once for the whole batch; LLM calls run
+    on up to `concurrency` threads.
+    """
+    queries = [canonical_query(q) for q in queries]
+    retrieved = retrieve_many(queries, retrieval_depth(settings), settings.min_sim_threshold, settings, paths.artifacts_dir)
+    llm = LLMClient(settings) if any(ok for _, ok in retrieved) else None
+    workers = max(1, concurrency or settings.batch_concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(answer_from_results, q, results, ok, llm, settings)
+            for q, (results, ok) in zip(queries, retrieved)
+        ]
+        try:
+            for fut in futures:
+                try:
+                    yield fut.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    yield e
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+def answer_many(queries: List[str], paths: Paths = Paths(), settings: Settings = Settings(),
+                concurrency: Optional[int] = None) -> List[Answer]:
+    """Answer a list of questions; results are in input order."""
+    return list(iter_answers(queries, paths, settings, concurrency))
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                obj = json.loads(line)
+                items.append({"id": obj.get("id", n), "question": obj["question"]})
+            else:
+                items.append({"id": n, "question": line})
+    return items
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions.")
+    parser.add_argument("questions", help="JSONL with a 'question' key per line (or one question per line)")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL path (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=None, help="parallel LLM calls")
+    args = parser.parse_args()
+
+    items = load_questions(args.questions)
+    queries = [it["question"] for it in items]
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for it, res in zip(items, iter_answers(queries, concurrency=args.concurrency, return_exceptions=True)):
+            row: Dict[str, Any] = {"id": it["id"], "question": it["question"]}
+            if isinstance(res, Exception):
+                row["error"] = f"{res.__class__.__name__}: {res}"
+            else:
+                row.update(asdict(res))
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
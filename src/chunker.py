@@ -0,0 +1,139 @@
+# src/chunker.py
+"""
+Structure-aware chunking for rulebook-style text (FATF Recommendations,
+Interpretive Notes, VARA rules).
+
+Text is split at numbered paragraphs ("16.", "3.Key issues") and lettered
+sub-clauses ("(b)", "b."). A paragraph becomes one chunk when it fits
+CHUNK_MAX_WORDS; longer ones split at their sub-clauses, then at sentence
+boundaries. Anchors name the clause:
+
+    p12-para3        PDF page 12, paragraph 3
+    p12-para3(b)     ... sub-clause (b), when the paragraph had to be split
+    section-b-treatment-of-client-money-para2
+
+Pieces shorter than CHUNK_MIN_WORDS are folded into the previous chunk;
+fragments of a few words (page numbers, running headers) are dropped.
+"""
+from __future__ import annotations
+import re
+from typing import List, Optional, Tuple
+
+from .utils import clean_text, sentence_spans
+
+_NUMBERED = re.compile(r'^\s*(\d{1,3})\.(?!\d)\s*(?=[A-Z(“‘"\'])')
+_LETTERED = re.compile(r'^\s*(?:\(([a-z]{1,2}|[ivx]{1,4})\)|([a-z])\.)\s+')
+_MIN_KEEP_WORDS = 8  # smaller leftovers are page numbers and running headers
+
+class _Unit:
+    """A numbered paragraph's lead text or one of its sub-clauses."""
+    __slots__ = ("num", "letter", "lines")
+
+    def __init__(self, num: Optional[str], letter: Optional[str]):
+        self.num, self.letter, self.lines = num, letter, []
+
+    def text(self) -> str:
+        return '\n'.join(self.lines).strip()
+
+def _units(text: str) -> List[_Unit]:
+    units: List[_Unit] = []
+    cur = _Unit(None, None)
+    for line in text.splitlines():
+        m = _NUMBERED.match(line)
+        if m:
+            units.append(cur)
+            cur = _Unit(m.group(1), None)
+        else:
+            m = _LETTERED.match(line)
+            if m:
+                units.append(cur)
+                cur = _Unit(cur.num, m.group(1) or m.group(2))
+        cur.lines.append(line)
+    units.append(cur)
+    return [u for u in units if u.text()]
+
+def _label(base: str, num: Optional[str], letter: Optional[str] = None) -> str:
+    label = base if num is None else f"{base}-para{num}"
+    return label + (f"({letter})" if letter else "")
+
+def _split_sentences(text: str, max_words: int) -> List[str]:
+    """Greedy sentence packing into pieces of <= max_words (a longer sentence is cut by words)."""
+    pieces: List[str] = []
+    buf: List[str] = []
+    for a, b in sentence_spans(text):
+        words = text[a:b].split()
+        while len(words) > max_words:
+            if buf:
+                pieces.append(' '.join(buf))
+                buf = []
+            pieces.append(' '.join(words[:max_words]))
+            words = words[max_words:]
+        if len(buf) + len(words) > max_words:
+            pieces.append(' '.join(buf))
+            buf = []
+        buf.extend(words)
+    if buf:
+        pieces.append(' '.join(buf))
+    return pieces
+
+def _fits(text: str, max_words: int) -> bool:
+    return len(text.split()) <= max_words
+
+def clause_chunks(text: str, base_anchor: str, max_words: int = 250, min_words: int = 40) -> List[Tuple[str, str]]:
+    """Return [(anchor, chunk_text), ...] for one page or section."""
+    units = _units(text)
+    paragraphs: List[List[_Unit]] = []
+    for u in units:
+        if paragraphs and u.letter is not None and paragraphs[-1][0].num == u.num:
+            paragraphs[-1].append(u)
+        else:
+            paragraphs.append([u])
+
+    pieces: List[Tuple[str, str]] = []
+    for para in paragraphs:
+        num = para[0].num
+        whole = '\n'.join(u.text() for u in para)
+        if _fits(whole, max_words):
+            pieces.append((_label(base_anchor, num, para[0].letter), whole))
+            continue
+        for u in para:
+            anchor = _label(base_anchor, num, u.letter)
+            body = u.text()
+            if _fits(body, max_words):
+                pieces.append((anchor, body))
+            else:  # same anchor for every piece, so the context packer can stitch them back
+                pieces.extend((anchor, p) for p in _split_sentences(body, max_words))
+
+    chunks: List[Tuple[str, str]] = []
+    for anchor, body in pieces:
+        if chunks and len(body.split()) < min_words \
+                and _fits(chunks[-1][1] + ' ' + body, max_words + min_words):
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + '\n' + body)
+        else:
+            chunks.append((anchor, body))
+    if len(chunks) > 1 and chunks[0][0] == base_anchor and len(chunks[0][1].split()) < min_words \
+            and _fits(chunks[0][1] + ' ' + chunks[1][1], max_words + min_words):
+        # a short lead-in (page header, carried-over line) joins the first clause
+        chunks[:2] = [(chunks[1][0], chunks[0][1] + '\n' + chunks[1][1])]
+    return [c for c in chunks if len(c[1].split()) >= _MIN_KEEP_WORDS]
+
+def md_clause_chunks(md_text: str, max_words: int = 250, min_words: int = 40) -> List[Tuple[str, str]]:
+    """Markdown: split at headings (as md_sections_to_chunks), then at clauses within each section."""
+    out: List[Tuple[str, str]] = []
+    anchor, buf = 'section-0', []
+
+    def flush():
+        txt = clean_text('\n'.join(buf))
+        if txt:
+            out.extend(clause_chunks(txt, anchor, max_words, min_words))
+
+    for line in md_text.splitlines():
+        m = re.match(r'^(#{1,6})\s+(.*)$', line.strip())
+        if m:
+            flush()
+            slug = re.sub(r'[^a-zA-Z0-9]+', '-', m.group(2).strip()).strip('-').lower()
+            anchor, buf = f'section-{slug}', []
+        else:
+            buf.append(line)
+    flush()
+    return out
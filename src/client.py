@@ -0,0 +1,81 @@
+# src/client.py
+"""
+Thin client for src/service.py (stdlib only), used by app.py when
+COMPLIANCEBOT_API_URL is set. Events match rag.answer_stream(), so callers
+can switch between the service and the in-process pipeline.
+"""
+from __future__ import annotations
+import json
+import urllib.error, urllib.request
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .config import Paths, Settings
+
+class ServiceBusy(RuntimeError):
+    """The service (or the LLM behind it) is at capacity; retry shortly."""
+
+class ServiceUnavailable(RuntimeError):
+    """The service could not be reached."""
+
+def _post(api_url: str, path: str, question: str, timeout: float, filters: Optional[Dict[str, Any]] = None):
+    body: Dict[str, Any] = {"question": question}
+    if filters:
+        body["filters"] = filters
+    req = urllib.request.Request(
+        api_url.rstrip("/") + path,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        return urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", "replace")
+        if e.code in (429, 503):
+            raise ServiceBusy(detail) from e
+        raise RuntimeError(f"ComplianceBot API returned {e.code}: {detail}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise ServiceUnavailable(str(e)) from e
+
+def remote_answer(question: str, api_url: str, timeout: float = 120.0, filters: Optional[Dict[str, Any]] = None):
+    from .rag import Answer
+
+    with _post(api_url, "/v1/answer", question, timeout, filters) as resp:
+        return Answer(**json.loads(resp.read()))
+
+def remote_answer_stream(question: str, api_url: str, timeout: float = 120.0,
+                         filters: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """Same (kind, payload) events as rag.answer_stream(), read from the service's SSE stream."""
+    from .rag import Answer
+
+    resp = _post(api_url, "/v1/answer/stream", question, timeout, filters)
+    with resp:
+        kind, data = None, []
+        for raw in resp:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                kind = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
+            elif not line and kind is not None:
+                payload = json.loads("\n".join(data))
+                if kind == "error":
+                    raise (ServiceBusy if payload.get("busy") else RuntimeError)(payload["error"])
+                yield kind, Answer(**payload) if kind == "answer" else payload
+                kind, data = None, []
+
+def answer_events(question: str, paths: Paths = Paths(), settings: Settings = Settings(),
+                  filters: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """Stream from the API when configured and reachable, otherwise run the pipeline in-process."""
+    if settings.api_url:
+        try:
+            events = remote_answer_stream(question, settings.api_url, settings.service_request_timeout, filters)
+            first = next(events)
+        except ServiceUnavailable:
+            pass  # fall back to inline
+        else:
+            yield first
+            yield from events
+            return
+    from .rag import answer_stream
+    yield from answer_stream(question, paths, settings, filters)
@@ -9,18 +9,96 @@ load_dotenv()
 class Paths:
     base_dir: str = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     docs_dir: str = os.path.join(base_dir, "docs")
-    artifacts_dir: str = os.path.join(base_dir, "artifacts")
+    artifacts_dir: str = os.getenv("ARTIFACTS_DIR", os.path.join(base_dir, "artifacts"))  # or a bundle from src/warmup.py
     logs_dir: str = os.path.join(base_dir, "data", "logs")
+    cache_dir: str = os.path.join(base_dir, "data", "cache")
 
 @dataclass(frozen=True)
 class Settings:
     # Embeddings & index
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     index_name: str = os.getenv("INDEX_NAME", "faiss_index")
+    embedding_model_path: str | None = os.getenv("EMBEDDING_MODEL_PATH")  # load weights from here (e.g. a bundle's model/)
+    index_mmap: bool = os.getenv("INDEX_MMAP", "1") == "1"  # memory-map index.faiss instead of reading it into RAM
+    embed_cache_size: int = int(os.getenv("EMBED_CACHE_SIZE", "1024"))  # LRU of query vectors
+    embed_batch_window_ms: float = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))  # wait to group concurrent queries
+    embed_max_batch: int = int(os.getenv("EMBED_MAX_BATCH", "32"))
+    embed_backend: str = os.getenv("EMBED_BACKEND", "torch")  # torch | onnx | onnx_int8 (see src/embed_backend.py)
+    embed_onnx_dir: str | None = os.getenv("EMBED_ONNX_DIR")  # ONNX export; default data/cache/models/<model>
+    embed_threads: int = int(os.getenv("EMBED_THREADS", "0"))  # onnxruntime intra-op threads; 0 = all cores
+    # Chunking (see src/chunker.py)
+    chunker: str = os.getenv("CHUNKER", "clauses")  # clauses (paragraph/clause boundaries) | words (400/40 windows)
+    chunk_max_words: int = int(os.getenv("CHUNK_MAX_WORDS", "250"))
+    chunk_min_words: int = int(os.getenv("CHUNK_MIN_WORDS", "40"))  # shorter clauses join their neighbour
+    # Ingest pipeline
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))  # extraction processes
+    ingest_pages_per_task: int = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))  # PDF page range per task
+    ingest_embed_batch: int = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks per encode call
+    ingest_queue_batches: int = int(os.getenv("INGEST_QUEUE_BATCHES", "8"))  # parsed batches waiting for the embedder
+    # ANN index (see src/ann.py)
+    index_type: str = os.getenv("INDEX_TYPE", "auto")  # auto | flat | hnsw | ivf_flat | ivf_pq | sq8 | binary
+    ann_nprobe: int = int(os.getenv("ANN_NPROBE", "16"))  # IVF lists probed per query
+    ann_ef_search: int = int(os.getenv("ANN_EF_SEARCH", "64"))  # HNSW search breadth
+    ann_hnsw_m: int = int(os.getenv("ANN_HNSW_M", "32"))
+    ann_ivf_nlist: int = int(os.getenv("ANN_IVF_NLIST", "0"))  # 0 = ~4*sqrt(n)
+    ann_pq_m: int = int(os.getenv("ANN_PQ_M", "48"))  # PQ sub-quantizers; must divide the dimension
+    ann_refine_factor: int = int(os.getenv("ANN_REFINE_FACTOR", "8"))  # binary: candidates rescored per result
+    index_check_interval: float = float(os.getenv("INDEX_CHECK_INTERVAL", "2.0"))  # seconds between rebuild checks
+    # Shards and filters (see src/shards.py)
+    shard_by: str = os.getenv("SHARD_BY", "")  # "" (one index) | jurisdiction | doc_type | doc
+    shard_workers: int = int(os.getenv("SHARD_WORKERS", "4"))  # shards searched in parallel
+    filter_exact_max: int = int(os.getenv("FILTER_EXACT_MAX", "2048"))  # filtered rows searched exactly, else ID selector
     # Retrieval - stable, fewer tokens, prevents rate limit
     top_k: int = int(os.getenv("TOP_K", "3"))  # reduced from 5 → 3
     min_sim_threshold: float = float(os.getenv("MIN_SIM", "0.30"))
+    hybrid: bool = os.getenv("HYBRID", "1") == "1"  # BM25 + dense with reciprocal-rank fusion
+    hybrid_candidates: int = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per-retriever depth before fusion
+    rrf_k: int = int(os.getenv("RRF_K", "60"))
+    bm25_k1: float = float(os.getenv("BM25_K1", "1.2"))
+    bm25_b: float = float(os.getenv("BM25_B", "0.75"))
+    # Cross-encoder rerank (see src/reranker.py)
+    rerank: bool = os.getenv("RERANK", "0") == "1"
+    rerank_model: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "20"))  # retrieved, then cut to top_k by rerank score
+    rerank_min_score: float | None = float(os.environ["RERANK_MIN_SCORE"]) if os.getenv("RERANK_MIN_SCORE") else None  # drop candidates below (best is kept)
+    rerank_batch_size: int = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+    rerank_cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", "4096"))  # (query, chunk) scores
+    # Context packing (see src/context.py)
+    context_packing: bool = os.getenv("CONTEXT_PACKING", "1") == "1"
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # prompt tokens for sources
+    context_candidates: int = int(os.getenv("CONTEXT_CANDIDATES", "6"))  # retrieved before packing
+    context_score_gap: float = float(os.getenv("CONTEXT_SCORE_GAP", "0.10"))  # keep cosine >= best - gap
+    context_dup_threshold: float = float(os.getenv("CONTEXT_DUP_THRESHOLD", "0.8"))  # shingle Jaccard = duplicate
     # LLM
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     openai_base_url: str | None = os.getenv("OPENAI_BASE_URL")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # in-flight requests (and pooled connections)
+    llm_rpm: int = int(os.getenv("LLM_RPM", "500"))          # requests/min, shared by the whole process; 0 = no limit
+    llm_tpm: int = int(os.getenv("LLM_TPM", "200000"))       # tokens/min (prompt + max completion); 0 = no limit
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    # Answer cache (shared across sessions, on disk)
+    answer_cache: bool = os.getenv("ANSWER_CACHE", "1") == "1"
+    answer_cache_threshold: float = float(os.getenv("ANSWER_CACHE_MIN_SIM", "0.95"))  # cosine for a hit
+    answer_cache_ttl: float = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # seconds
+    answer_cache_max_entries: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+    # Batch answering (src/batch.py)
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))  # parallel LLM calls
+    # Tracing / metrics (src/metrics.py)
+    metrics: bool = os.getenv("METRICS", "0") == "1"  # per-stage timings, counters, Prometheus export
+    metrics_port: int = int(os.getenv("METRICS_PORT", "0"))  # serve /metrics on this port (0 = off)
+    metrics_host: str = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 to let a scraper on another host in
+    metrics_file: str | None = os.getenv("METRICS_FILE")  # write Prometheus text here at exit
+    # Startup (src/warmup.py)
+    warmup: bool = os.getenv("WARMUP", "1") == "1"  # app/service preload model + index in the background
+    # Audit trail (src/audit.py)
+    audit_fsync_interval: float = float(os.getenv("AUDIT_FSYNC_INTERVAL", "1.0"))  # seconds between fsyncs
+    audit_max_mb: int = int(os.getenv("AUDIT_MAX_MB", "50"))  # rotate audit.jsonl beyond this size
+    audit_rotate_daily: bool = os.getenv("AUDIT_ROTATE_DAILY", "1") == "1"
+    # HTTP API (src/service.py)
+    service_host: str = os.getenv("SERVICE_HOST", "127.0.0.1")
+    service_port: int = int(os.getenv("SERVICE_PORT", "8080"))
+    service_workers: int = int(os.getenv("SERVICE_WORKERS", "16"))  # concurrent pipeline runs
+    service_queue_size: int = int(os.getenv("SERVICE_QUEUE_SIZE", "64"))  # waiting runs before 503
+    service_request_timeout: float = float(os.getenv("SERVICE_REQUEST_TIMEOUT", "120"))  # seconds
+    api_url: str | None = os.getenv("COMPLIANCEBOT_API_URL")  # app.py calls this service instead of running inline
@@ -0,0 +1,140 @@
+# src/context.py
+"""
+Token-budgeted context packing: turns retrieved chunks into the blocks that go
+into the prompt.
+
+    1. keep chunks whose cosine is within CONTEXT_SCORE_GAP of the best one
+       (so the number of chunks adapts to how sharply relevance falls off)
+    2. merge chunks from the same doc#anchor, removing the word_chunks overlap
+    3. drop near-duplicates (word-shingle Jaccard >= CONTEXT_DUP_THRESHOLD)
+    4. add blocks in rank order while they fit in CONTEXT_TOKEN_BUDGET
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .config import Settings
+from .utils import estimate_tokens
+
+BLOCK_SEPARATOR = "\n\n---\n\n"
+_MIN_OVERLAP_WORDS = 5
+
+def retrieval_depth(settings: Settings) -> int:
+    """How many chunks to retrieve; the packer then decides how many are used."""
+    return max(settings.top_k, settings.context_candidates) if settings.context_packing else settings.top_k
+
+def _public(r: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop ingest-time sentence offsets; they are only needed for trimming here."""
+    return {k: v for k, v in r.items() if k != "sentences"}
+
+def format_block(r: Dict[str, Any]) -> str:
+    return f"[Source: {r['doc_name']}#{r['anchor']}]\n{r['text']}"
+
+def _overlap(a: List[str], b: List[str]) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    for k in range(min(len(a), len(b)), _MIN_OVERLAP_WORDS - 1, -1):
+        if a[-k:] == b[:k]:
+            return k
+    return 0
+
+def _merge_text(a: str, b: str) -> str:
+    wa, wb = a.split(), b.split()
+    ja, jb = f" {' '.join(wa)} ", f" {' '.join(wb)} "
+    if jb in ja:
+        return a
+    if ja in jb:
+        return b
+    k = _overlap(wa, wb)
+    if k:
+        return " ".join(wa + wb[k:])
+    k = _overlap(wb, wa)
+    if k:
+        return " ".join(wb + wa[k:])
+    return f"{a}\n…\n{b}"  # same section, not contiguous: still one source header
+
+def _shingles(text: str, n: int = 3) -> Set[Tuple[str, ...]]:
+    words = text.lower().split()
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+def _jaccard(a: Set, b: Set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def _truncate(r: Dict[str, Any], budget: int) -> Optional[Dict[str, Any]]:
+    """Cut the block's text to fit `budget` tokens, at a sentence boundary when the
+    chunk has precomputed ones, else at a word. None if nothing fits."""
+    header = estimate_tokens(format_block({**r, "text": ""}))
+    text = r["text"]
+    cuts = [s for s in r.get("sentences", [])[1:] if header + estimate_tokens(text[:s]) <= budget]
+    if cuts:
+        return _with_text(r, text[:cuts[-1]].rstrip() + " …")
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:  # largest word count that fits
+        mid = (lo + hi + 1) // 2
+        if header + estimate_tokens(" ".join(words[:mid])) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo == 0:
+        return None
+    return _with_text(r, " ".join(words[:lo]) + " …")
+
+def _with_text(r: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """`r` with trimmed text; drops quotes that were cut, so none is cited from text the model never saw."""
+    out = {**r, "text": text}
+    if "quotes" in r:
+        out["quotes"] = [q for q in r["quotes"] if q in text]
+    return out
+
+def pack_context(results: List[Dict[str, Any]], settings: Settings = Settings()) -> List[Dict[str, Any]]:
+    """Select, merge and deduplicate retrieved chunks to fit the context token budget. Keeps rank order."""
+    if not settings.context_packing or not results:
+        return [_public(r) for r in results[:settings.top_k]]
+
+    best = max(r["score"] for r in results)
+    # The top-ranked chunk always stays: with hybrid fusion it may not be the best cosine.
+    kept = [r for n, r in enumerate(results) if n == 0 or r["score"] >= best - settings.context_score_gap]
+    kept = kept[:max(settings.top_k, settings.context_candidates)]
+
+    # Merge same doc#anchor into the highest-ranked occurrence
+    merged: List[Dict[str, Any]] = []
+    by_key: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for r in kept:
+        key = (r["doc_name"], r["anchor"])
+        head = by_key.get(key)
+        if head is None:
+            head = by_key[key] = dict(r)
+            merged.append(head)
+        else:
+            head["text"] = _merge_text(head["text"], r["text"])
+            head["score"] = max(head["score"], r["score"])
+            head.pop("sentences", None)  # offsets no longer match the merged text
+            if "quotes" in r:
+                head["quotes"] = head.get("quotes", []) + [q for q in r["quotes"] if q not in head.get("quotes", [])]
+
+    # Near-duplicates across sections (e.g. the same clause restated in two documents)
+    unique: List[Dict[str, Any]] = []
+    seen: List[Set] = []
+    for r in merged:
+        sh = _shingles(r["text"])
+        if any(_jaccard(sh, s) >= settings.context_dup_threshold for s in seen):
+            continue
+        seen.append(sh)
+        unique.append(r)
+
+    budget = settings.context_token_budget
+    sep = estimate_tokens(BLOCK_SEPARATOR)
+    packed: List[Dict[str, Any]] = []
+    used = 0
+    for r in unique:
+        cost = estimate_tokens(format_block(r)) + (sep if packed else 0)
+        if used + cost > budget:
+            if not packed:  # the best chunk alone is over budget: send a trimmed version
+                trimmed = _truncate(r, budget)
+                if trimmed is None:
+                    break
+                packed.append(trimmed)
+                used = budget
+            continue  # a shorter, lower-ranked block may still fit
+        packed.append(r)
+        used += cost
+    return [_public(r) for r in packed]
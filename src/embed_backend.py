@@ -0,0 +1,255 @@
+# src/embed_backend.py
+"""
+Embedding backends. EMBED_BACKEND picks what EmbeddingService.model is;
+every backend has SentenceTransformer's encode() signature:
+
+    torch       SentenceTransformer (default)
+    onnx        the same network exported to ONNX, run by onnxruntime + tokenizers
+    onnx_int8   ... with weights dynamically quantized to int8 (smaller, faster on CPU)
+
+The ONNX backends need only onnxruntime, tokenizers and numpy at query time.
+The export needs torch (and onnx), once. It runs from ingest or on first
+use, into EMBED_ONNX_DIR (default data/cache/models/<model>/):
+
+    model.onnx, model_int8.onnx, tokenizer.json, backend.json
+
+    python -m src.embed_backend export                     # write the export
+    python -m src.embed_backend parity --backend onnx_int8 # cosine, top-k overlap, eval recall vs torch
+
+Vectors from different backends are close but not identical, so ingest
+keys its manifest and vector cache on embedding_id(), and changing the
+backend rebuilds the index.
+"""
+from __future__ import annotations
+import os, json, shutil, argparse
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .config import Paths, Settings
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+BACKEND_FILE = "backend.json"
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+def embedding_id(settings: Settings) -> str:
+    """Identity of the vectors this configuration produces (manifest / vector-cache key)."""
+    if settings.embed_backend == "torch":
+        return settings.embedding_model
+    return f"{settings.embedding_model}#{settings.embed_backend}"
+
+def onnx_dir(settings: Settings, paths: Paths = Paths()) -> str:
+    from .vector_cache import model_slug
+    return settings.embed_onnx_dir or os.path.join(paths.cache_dir, "models", model_slug(settings.embedding_model))
+
+# -------- ONNX runtime backend --------
+class OnnxEmbedder:
+    """Tokenize with `tokenizers`, run the exported transformer, pool and normalize in numpy."""
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, BACKEND_FILE), "r", encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.inputs = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dim"]
+
+    get_embedding_dimension = get_sentence_embedding_dimension
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in enc], dtype="int64"),
+            "attention_mask": np.array([e.attention_mask for e in enc], dtype="int64"),
+            "token_type_ids": np.array([e.type_ids for e in enc], dtype="int64"),
+        }
+        hidden = self.session.run(None, {k: feeds[k] for k in self.inputs})[0]  # (batch, seq, dim)
+        if self.config["pooling"] == "cls":
+            return hidden[:, 0]
+        mask = feeds["attention_mask"][:, :, None].astype("float32")
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.config["dim"]), dtype="float32")
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))  # similar lengths pad less
+        for s in range(0, len(order), batch_size):
+            idx = order[s:s + batch_size]
+            out[idx] = self._forward([texts[i] for i in idx])
+        if normalize_embeddings or self.config.get("normalize"):
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+# -------- Export --------
+def _pooling_mode(pooling) -> str:
+    if hasattr(pooling, "get_pooling_mode_str"):  # sentence-transformers < 6
+        return pooling.get_pooling_mode_str()
+    mode = pooling.pooling_mode
+    return mode if isinstance(mode, str) else "+".join(mode)
+
+def export_onnx(model_name: str, out_dir: str, model_path: Optional[str] = None, int8: bool = True) -> Dict[str, Any]:
+    """Export a Transformer + Pooling (+ Normalize) SentenceTransformer to out_dir; replaced in one rename."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st = SentenceTransformer(model_path or model_name, device="cpu")
+    kinds = [type(m).__name__ for m in st]
+    if kinds[:2] != ["Transformer", "Pooling"] or any(k != "Normalize" for k in kinds[2:]):
+        raise ValueError(f"Only Transformer + Pooling (+ Normalize) models can be exported; {model_name} has {kinds}")
+    pooling = _pooling_mode(st[1])
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling {pooling!r} (mean or cls)")
+    transformer, tokenizer = st[0].auto_model.eval(), st.tokenizer
+    sample = tokenizer(["Export sample sentence."], return_tensors="pt")
+    inputs = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Hidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(inputs, args))).last_hidden_state
+
+    out_dir = os.path.abspath(out_dir)
+    tmp = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with torch.no_grad():
+        torch.onnx.export(_Hidden(transformer), tuple(sample[n] for n in inputs), os.path.join(tmp, ONNX_FILE),
+                          input_names=inputs, output_names=["last_hidden_state"],
+                          dynamic_axes={n: {0: "batch", 1: "seq"} for n in inputs + ["last_hidden_state"]},
+                          opset_version=17, dynamo=False)
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(tmp, ONNX_FILE), os.path.join(tmp, ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(os.path.join(tmp, TOKENIZER_FILE))
+    config = {
+        "model": model_name,
+        "pooling": pooling,
+        "normalize": "Normalize" in kinds,
+        "max_seq_length": int(st.max_seq_length),
+        "dim": int(getattr(st, "get_embedding_dimension", st.get_sentence_embedding_dimension)()),
+        "pad_id": int(tokenizer.pad_token_id),
+        "pad_token": tokenizer.pad_token,
+        "int8": int8,
+    }
+    with open(os.path.join(tmp, BACKEND_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=1)
+    old = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return config
+
+def ensure_export(model_name: str, out_dir: str, model_path: Optional[str] = None, int8: bool = True) -> str:
+    """Export unless out_dir already has what is needed; returns out_dir."""
+    want = ONNX_INT8_FILE if int8 else ONNX_FILE
+    if not (os.path.exists(os.path.join(out_dir, BACKEND_FILE)) and os.path.exists(os.path.join(out_dir, want))):
+        export_onnx(model_name, out_dir, model_path, int8=int8)
+    return out_dir
+
+def load_model(model_name: str, backend: str = "torch", model_path: Optional[str] = None,
+               model_dir: Optional[str] = None, threads: int = 0):
+    """The encoder for `backend` (EmbeddingService calls this once per process); exports on first use."""
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {', '.join(BACKENDS)}; got {backend!r}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_path or model_name)
+    if model_dir is None:
+        raise ValueError(f"EMBED_BACKEND={backend} needs the export directory")
+    int8 = backend == "onnx_int8"
+    return OnnxEmbedder(ensure_export(model_name, model_dir, model_path, int8), quantized=int8, threads=threads)
+
+# -------- Parity --------
+def parity(settings: Settings, paths: Paths = Paths(), k: int = 5, max_chunks: int = 2000) -> Dict[str, Any]:
+    """
+    Compare settings.embed_backend with the torch reference on the indexed
+    chunks and the eval-set questions: per-text cosine between the two
+    vectors, overlap of each question's top-k chunks, and the eval-set
+    recall@k (expected documents in the top-k) of both.
+    """
+    from .eval import load_eval_set
+    from .retriever import get_retriever
+
+    snap = get_retriever(paths.artifacts_dir, settings.index_name, settings).snapshot()
+    rows = [s.meta.get(i) for s in (snap if isinstance(snap, list) else [snap]) for i in range(len(s.meta))][:max_chunks]
+    chunks = [r["text"] for r in rows]
+    items = load_eval_set()
+    questions = [item["question"] for item in items]
+
+    ref = load_model(settings.embedding_model, "torch", settings.embedding_model_path)
+    cand = load_model(settings.embedding_model, settings.embed_backend, settings.embedding_model_path,
+                      onnx_dir(settings, paths), settings.embed_threads)
+    enc = lambda m, texts: np.asarray(m.encode(texts, normalize_embeddings=True, show_progress_bar=False), dtype="float32")
+    ref_c, cand_c = enc(ref, chunks), enc(cand, chunks)
+    ref_q, cand_q = enc(ref, questions), enc(cand, questions)
+    cos = np.concatenate([(ref_c * cand_c).sum(axis=1), (ref_q * cand_q).sum(axis=1)])
+    k = min(k, len(chunks))
+    top_ref = np.argsort(-(ref_q @ ref_c.T), axis=1)[:, :k]
+    top_cand = np.argsort(-(cand_q @ cand_c.T), axis=1)[:, :k]
+
+    def doc_recall(top) -> Optional[float]:
+        """Mean share of each question's expected documents found in its top-k (as eval.py's recall_at_k)."""
+        scores = []
+        for item, ids in zip(items, top):
+            expected = item.get("expected_citation_contains", [])
+            docs = {rows[i]["doc_name"] for i in ids}
+            if expected:
+                scores.append(sum(any(e in d for d in docs) for e in expected) / len(expected))
+        return round(float(np.mean(scores)), 4) if scores else None
+
+    return {
+        "backend": settings.embed_backend,
+        "texts": int(len(cos)),
+        "cosine_mean": round(float(cos.mean()), 5),
+        "cosine_min": round(float(cos.min()), 5),
+        f"overlap_at_{k}": round(float(np.mean([len(set(a) & set(b)) / k for a, b in zip(top_ref, top_cand)])), 4)
+        if questions else None,
+        f"eval_recall_at_{k}": {"reference": doc_recall(top_ref), settings.embed_backend: doc_recall(top_cand)},
+    }
+
+def main(argv: Optional[list] = None):
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX or check backend parity.")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--backend", default=settings.embed_backend if settings.embed_backend != "torch" else "onnx_int8",
+                        choices=BACKENDS[1:])
+    parser.add_argument("--out", default=None, help="export directory (default: EMBED_ONNX_DIR or data/cache/models/...)")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--min_cosine", type=float, default=0.99, help="parity: exit 1 when the mean cosine is lower")
+    parser.add_argument("--min_overlap", type=float, default=0.9, help="parity: exit 1 when the top-k overlap is lower")
+    args = parser.parse_args(argv)
+
+    from dataclasses import replace
+    settings = replace(settings, embed_backend=args.backend, embed_onnx_dir=args.out or settings.embed_onnx_dir)
+    if args.command == "export":
+        folder = onnx_dir(settings)
+        print(json.dumps(export_onnx(settings.embedding_model, folder, settings.embedding_model_path), indent=1))
+        print(f"Wrote {folder}")
+        return
+    report = parity(settings, k=args.k)
+    print(json.dumps(report, indent=1))
+    overlap = next(v for key, v in report.items() if key.startswith("overlap_at_"))
+    if report["cosine_mean"] < args.min_cosine or (overlap is not None and overlap < args.min_overlap):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
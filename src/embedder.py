@@ -0,0 +1,172 @@
+# src/embedder.py
+from __future__ import annotations
+import queue, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from .config import Settings
+from .embed_backend import onnx_dir
+from .query import canonical_query, dedup_key
+
+class EmbeddingService:
+    """
+    One embedding model per process (SentenceTransformer or an ONNX export). Single-query calls from concurrent
+    sessions are queued and encoded together by a background worker, so N
+    simultaneous users cost one `encode` call. Vectors are kept in a bounded
+    LRU keyed on query.dedup_key(); what is encoded is query.canonical_query().
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 1024,
+                 batch_window: float = 0.005, max_batch: int = 32, model_path: str | None = None,
+                 backend: str = "torch", model_dir: str | None = None, threads: int = 0):
+        self.model_name = model_name
+        self.model_path = model_path  # local copy of model_name's weights, if any
+        self.backend = backend  # see embed_backend.py
+        self.model_dir = model_dir  # ONNX export, for the onnx backends
+        self.threads = threads
+        self.cache_size = cache_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+
+    # -------- model --------
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from .embed_backend import load_model
+                    self._model = load_model(self.model_name, self.backend, self.model_path,
+                                             self.model_dir, self.threads)
+        return self._model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        self.batches += 1
+        vecs = self.model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vecs, dtype="float32")
+
+    # -------- LRU cache --------
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            vec = self._cache.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def _cache_put(self, key: str, vec: np.ndarray):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "batches": self.batches}
+
+    # -------- micro-batching --------
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    t = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    t.start()
+                    self._worker = t
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Same question asked twice in one window is encoded once.
+            texts: Dict[str, str] = {}
+            for key, text, _ in batch:
+                texts.setdefault(key, text)
+            try:
+                vecs = self._encode(list(texts.values()))
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            by_key = dict(zip(texts.keys(), vecs))
+            for key, vec in by_key.items():
+                self._cache_put(key, vec)
+            for key, _, fut in batch:
+                fut.set_result(by_key[key])
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one query (shape: (dim,)), via the cache and the shared batcher."""
+        key = dedup_key(text)
+        vec = self._cache_get(key)
+        if vec is not None:
+            return vec
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((key, canonical_query(text), fut))
+        return fut.result()
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of queries in one `encode` call (cached ones are skipped). Shape: (n, dim)."""
+        keys = [dedup_key(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        todo: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in todo:
+                continue
+            vec = self._cache_get(key)
+            if vec is None:
+                todo[key] = canonical_query(text)
+            else:
+                found[key] = vec
+        if todo:
+            for key, vec in zip(todo.keys(), self._encode(list(todo.values()))):
+                self._cache_put(key, vec)
+                found[key] = vec
+        return np.stack([found[k] for k in keys]).astype("float32")
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+def get_embedder(model_name: str, settings: Settings = Settings()) -> EmbeddingService:
+    """Return the process-wide EmbeddingService for `model_name` and settings.embed_backend."""
+    key = model_name if settings.embed_backend == "torch" else f"{model_name}#{settings.embed_backend}"
+    svc = _services.get(key)
+    if svc is None:
+        with _services_lock:
+            svc = _services.get(key)
+            if svc is None:
+                svc = EmbeddingService(
+                    model_name,
+                    cache_size=settings.embed_cache_size,
+                    batch_window=settings.embed_batch_window_ms / 1000.0,
+                    max_batch=settings.embed_max_batch,
+                    model_path=settings.embedding_model_path,
+                    backend=settings.embed_backend,
+                    model_dir=onnx_dir(settings) if settings.embed_backend != "torch" else None,
+                    threads=settings.embed_threads,
+                )
+                _services[key] = svc
+    return svc
@@ -0,0 +1,216 @@
+# src/eval.py
+"""
+Offline evaluation + latency benchmark driven by tests/eval_set.jsonl.
+
+    python -m src.eval                          # quality + per-stage latency, local stub LLM
+    python -m src.eval --workers 8 --out run.json
+    python -m src.eval --live                   # use the configured OpenAI endpoint instead
+    python -m src.eval --compare base.json run.json   # exit 1 on regressions
+
+Quality: citation hit-rate (any expected doc cited), recall@k (share of
+expected docs among the retrieved chunks), and whether answers carry a quote
+and citations. Latency: p50/p95/p99 per stage (embed, search, rerank, prompt,
+llm, post) and end to end, plus throughput with N concurrent workers.
+"""
+from __future__ import annotations
+import os, sys, json, time, argparse, datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import metrics
+from .config import Paths, Settings
+from .retriever import retrieve
+from .llm import LLMClient
+from .query import canonical_query
+from .utils import estimate_tokens
+from .rag import SYSTEM_PROMPT, answer_from_results, build_prompt
+from .context import retrieval_depth
+
+STAGES = ("embed", "search", "rerank", "prompt", "llm", "post", "total")
+EVAL_SET = os.path.join(Paths().base_dir, "tests", "eval_set.jsonl")
+
+def load_eval_set(path: str = EVAL_SET) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run_one(item: Dict[str, Any], paths: Paths, settings: Settings) -> Dict[str, Any]:
+    """Run one question through the pipeline (rag.answer_from_results); stage timings (ms) come from Answer.trace."""
+    query = canonical_query(item["question"])
+    with metrics.trace():
+        results, ok = retrieve(query, retrieval_depth(settings), settings.min_sim_threshold, settings,
+                               paths.artifacts_dir)
+        res = answer_from_results(query, results, ok, LLMClient(settings), settings)
+    trace = res.trace or {}
+    timings = trace.get("stages_ms", {})
+    stages = {
+        "embed": timings.get("embed", 0.0),
+        "search": sum(timings.get(k, 0.0) for k in ("dense_search", "bm25", "fusion")),
+        "rerank": timings.get("rerank", 0.0),
+        "prompt": timings.get("pack", 0.0) + timings.get("prompt", 0.0),
+        "llm": timings.get("llm", 0.0),
+        "post": timings.get("post", 0.0),
+        "total": trace.get("total_ms", 0.0),
+    }
+    prompt_tokens = 0
+    if ok:  # res.used_contexts is the packed context the prompt was built from
+        user_prompt, _ = build_prompt(query, res.used_contexts, settings)
+        prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt)
+
+    expected = item.get("expected_citation_contains", [])
+    retrieved_docs = {r["doc_name"] for r in (res.used_contexts if ok else results)}
+    found = [e for e in expected if any(e in d for d in retrieved_docs)]
+    return {
+        "id": item.get("id"),
+        "question": item["question"],
+        "ok": ok,
+        "citation_hit": bool(expected) and any(e in c for e in expected for c in res.citations),
+        "recall_at_k": len(found) / len(expected) if expected else None,
+        "has_quote": bool(res.quotes),
+        "has_citations": bool(res.citations),
+        "context_chunks": len(res.used_contexts),
+        "prompt_tokens": prompt_tokens,
+        "stages_ms": stages,
+    }
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    arr = np.array(values, dtype="float64")
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    recalls = [r["recall_at_k"] for r in rows if r["recall_at_k"] is not None]
+    quality = {
+        "questions": len(rows),
+        "citation_hit_rate": round(sum(r["citation_hit"] for r in rows) / len(rows), 4),
+        "recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+        "guardrail_pass_rate": round(sum(r["ok"] for r in rows) / len(rows), 4),
+        "quote_rate": round(sum(r["has_quote"] for r in rows) / len(rows), 4),
+        "citation_rate": round(sum(r["has_citations"] for r in rows) / len(rows), 4),
+        "mean_prompt_tokens": round(float(np.mean([r["prompt_tokens"] for r in rows])), 1),
+        "mean_context_chunks": round(float(np.mean([r["context_chunks"] for r in rows])), 2),
+    }
+    latency = {s: _percentiles([r["stages_ms"][s] for r in rows]) for s in STAGES}
+    return {"quality": quality, "latency_ms": latency}
+
+def run_benchmark(items: List[Dict[str, Any]], paths: Paths, settings: Settings,
+                  workers: int = 4, rounds: int = 1) -> Dict[str, Any]:
+    metrics.configure(True)  # run_one reads stage timings from Answer.trace
+    # Warm-up: load model, index and HTTP pool so the first row doesn't carry cold-start cost.
+    run_one(items[0], paths, settings)
+
+    rows: List[Dict[str, Any]] = []
+    for _ in range(rounds):
+        rows.extend(run_one(it, paths, settings) for it in items)
+    report = summarize(rows)
+
+    batch = [it for _ in range(rounds) for it in items]
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda it: run_one(it, paths, settings), batch))
+    elapsed = time.perf_counter() - t
+    report["throughput"] = {"workers": workers, "requests": len(batch),
+                            "seconds": round(elapsed, 3), "qps": round(len(batch) / elapsed, 3)}
+    report["rows"] = rows[:len(items)]
+    return report
+
+# -------- Compare --------
+# (section, metric, direction): +1 = higher is better, -1 = lower is better
+_COMPARED = [("quality", m, +1) for m in ("citation_hit_rate", "recall_at_k", "quote_rate", "citation_rate")] \
+    + [("latency_ms", s, -1) for s in STAGES] + [("throughput", "qps", +1)]
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.10) -> List[str]:
+    """
+    Regressions of `new` against `base`. Quality metrics may not drop at all;
+    latency p95 and throughput may move by up to `tolerance` (relative).
+    """
+    problems = []
+    for section, metric, direction in _COMPARED:
+        b = base.get(section, {}).get(metric)
+        n = new.get(section, {}).get(metric)
+        if section == "latency_ms":
+            b, n = (b or {}).get("p95"), (n or {}).get("p95")
+            metric = f"{metric} p95"
+        if b is None or n is None:
+            continue
+        if section == "quality":
+            worse = n < b - 1e-9
+        else:
+            change = (n - b) / b if b else 0.0
+            worse = change * direction < -tolerance
+        if worse:
+            problems.append(f"{section}.{metric}: {b} -> {n}")
+    return problems
+
+def _print_report(report: Dict[str, Any]):
+    q = report["quality"]
+    print(f"questions={q['questions']}  citation_hit_rate={q['citation_hit_rate']}  recall@k={q['recall_at_k']}  "
+          f"guardrail_pass={q['guardrail_pass_rate']}  quotes={q['quote_rate']}  citations={q['citation_rate']}")
+    print(f"prompt tokens (est.) mean={q['mean_prompt_tokens']}  context chunks mean={q['mean_context_chunks']}")
+    print(f"{'stage':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for s in STAGES:
+        l = report["latency_ms"][s]
+        print(f"{s:<8} {l['p50']:>9.2f} {l['p95']:>9.2f} {l['p99']:>9.2f}")
+    t = report["throughput"]
+    print(f"throughput: {t['qps']} q/s with {t['workers']} workers ({t['requests']} requests)")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and pipeline latency on the eval set.")
+    parser.add_argument("--eval_set", default=EVAL_SET)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent workers for the throughput run")
+    parser.add_argument("--rounds", type=int, default=1, help="passes over the eval set for latency stats")
+    parser.add_argument("--live", action="store_true", help="call the configured LLM instead of the local stub")
+    parser.add_argument("--stub_latency", type=float, default=0.0, help="seconds of simulated LLM latency")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two JSON reports")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative latency/throughput change")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            new = json.load(f)
+        problems = compare(base, new, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if not problems:
+            print("No regressions.")
+        sys.exit(1 if problems else 0)
+
+    paths = Paths()
+    settings = replace(Settings(), answer_cache=False)  # measure the pipeline, not the cache
+    server = None
+    if not args.live:
+        from .llm_stub import start_stub_server
+        server, url = start_stub_server(latency=args.stub_latency)
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+        settings = replace(settings, openai_base_url=url)
+    try:
+        report = run_benchmark(load_eval_set(args.eval_set), paths, settings, args.workers, args.rounds)
+    finally:
+        if server is not None:
+            server.shutdown()
+    report["meta"] = {
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "llm": "live" if args.live else "stub",
+        "top_k": settings.top_k,
+        "hybrid": settings.hybrid,
+        "rerank": settings.rerank_model if settings.rerank else None,
+        "index_type": settings.index_type,
+        "embedding_model": settings.embedding_model,
+    }
+    _print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
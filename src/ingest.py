@@ -1,24 +1,31 @@
 # src/ingest.py
 from __future__ import annotations
-import os, argparse, json
-from typing import List, Dict, Any
-from dataclasses import dataclass, asdict
+import os, argparse, json, hashlib, queue, threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+from dataclasses import dataclass, asdict, field
 from tqdm import tqdm
 
 from .config import Paths, Settings
-from .utils import clean_text, word_chunks, md_sections_to_chunks, Chunk, ensure_dir
+from .utils import clean_text, word_chunks, md_sections_to_chunks, Chunk, ensure_dir, sentence_spans, quote_spans
+from .chunker import clause_chunks, md_clause_chunks
 
 # -------- PDF parsing --------
-def extract_pdf_text(path: str) -> List[Dict[str, Any]]:
-    """Return list of pages: [{'page': 1, 'text': '...'}, ...]"""
+def _pdf_reader(path: str):
     try:
         from pypdf import PdfReader
     except Exception as e:
         raise RuntimeError("Install pypdf to parse PDFs") from e
+    return PdfReader(path)
+
+def extract_pdf_text(path: str, start: int = 0, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return list of pages: [{'page': 1, 'text': '...'}, ...] (optionally only pages[start:end])"""
     pages = []
-    reader = PdfReader(path)
-    for i, page in enumerate(reader.pages):
-        txt = page.extract_text() or ""
+    reader = _pdf_reader(path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    for i in range(start, end):
+        txt = reader.pages[i].extract_text() or ""
         pages.append({'page': i + 1, 'text': clean_text(txt)})
     return pages
 
@@ -31,42 +38,204 @@ class Record:
     doc_name: str
     anchor: str
     text: str
+    sentences: List[int] = field(default_factory=list)     # sentence start offsets in text
+    quotes: List[List[int]] = field(default_factory=list)  # ranked quote candidates as [start, end]
 
-def build_corpus(docs_dir: str) -> List[Record]:
-    records: List[Record] = []
+def make_record(doc_name: str, anchor: str, text: str) -> Record:
+    """Record with sentence boundaries and quote candidates precomputed (so answer time is a lookup)."""
+    return Record(doc_name=doc_name, anchor=anchor, text=text,
+                  sentences=[a for a, _ in sentence_spans(text)],
+                  quotes=[list(span) for span in quote_spans(text)])
+
+def chunk_settings(settings: Settings) -> Dict[str, Any]:
+    return {"chunker": settings.chunker, "max_words": settings.chunk_max_words, "min_words": settings.chunk_min_words}
+
+SUPPORTED_EXTS = ('.pdf', '.md')  # extendable: .txt, .html, etc.
+
+def list_documents(docs_dir: str) -> List[Tuple[str, str]]:
+    """Return [(relative_path, full_path), ...] of supported files, sorted for a stable row order."""
+    docs = []
     for root, _, files in os.walk(docs_dir):
         for name in files:
-            low = name.lower()
-            full = os.path.join(root, name)
-            if low.endswith('.pdf'):
-                for page in extract_pdf_text(full):
-                    if page['text'].strip():
-                        for ch in word_chunks(page['text']):
-                            records.append(Record(doc_name=name, anchor=f"p{page['page']}", text=ch))
-            elif low.endswith('.md'):
-                md = load_markdown(full)
-                for anchor, ch in md_sections_to_chunks(md):
-                    records.append(Record(doc_name=name, anchor=anchor, text=ch))
-            # extendable: .txt, .html, etc.
+            if name.lower().endswith(SUPPORTED_EXTS):
+                full = os.path.join(root, name)
+                docs.append((os.path.relpath(full, docs_dir).replace(os.sep, '/'), full))
+    return sorted(docs)
+
+def load_document(full: str, start: int = 0, end: Optional[int] = None,
+                  settings: Settings = Settings()) -> List[Record]:
+    """Parse and chunk one file (for PDFs, optionally only pages[start:end])."""
+    name = os.path.basename(full)
+    low = name.lower()
+    by_clause = settings.chunker == "clauses"
+    max_w, min_w = settings.chunk_max_words, settings.chunk_min_words
+    records: List[Record] = []
+    if low.endswith('.pdf'):
+        for page in extract_pdf_text(full, start, end):
+            if page['text'].strip():
+                base = f"p{page['page']}"
+                if by_clause:
+                    for anchor, ch in clause_chunks(page['text'], base, max_w, min_w):
+                        records.append(make_record(name, anchor, ch))
+                else:
+                    for ch in word_chunks(page['text']):
+                        records.append(make_record(name, base, ch))
+    elif low.endswith('.md'):
+        md = load_markdown(full)
+        chunks = md_clause_chunks(md, max_w, min_w) if by_clause else md_sections_to_chunks(md)
+        for anchor, ch in chunks:
+            records.append(make_record(name, anchor, ch))
     return records
 
-def embed_records(records: List[Record], model_name: str):
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(model_name)
+def build_corpus(docs_dir: str) -> List[Record]:
+    records: List[Record] = []
+    for _, full in list_documents(docs_dir):
+        records.extend(load_document(full))
+    return records
+
+def embed_records(records: List[Record], settings: Settings, show_progress_bar: bool = True):
+    """Embed chunk texts, reusing vectors cached by (model + backend, text hash); see vector_cache.py."""
+    from .embed_backend import embedding_id
+    from .embedder import get_embedder
+    from .vector_cache import cached_encode
+
+    def encode(texts):
+        model = get_embedder(settings.embedding_model, settings).model  # loaded once per process, only if something is uncached
+        return model.encode(texts, normalize_embeddings=True, show_progress_bar=show_progress_bar)
+
     texts = [r.text for r in records]
-    vectors = model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
-    return vectors  # numpy array
+    return cached_encode(texts, embedding_id(settings), encode)  # numpy array
+
+# -------- Parallel extraction --------
+_DONE = object()
+
+def plan_tasks(full: str, pages_per_task: int) -> List[Tuple[str, int, Optional[int]]]:
+    """Split one document into (path, start, end) extraction tasks; large PDFs by page range."""
+    if full.lower().endswith('.pdf') and pages_per_task > 0:
+        n = len(_pdf_reader(full).pages)
+        return [(full, s, min(n, s + pages_per_task)) for s in range(0, n, pages_per_task)] or [(full, 0, 0)]
+    return [(full, 0, None)]
+
+def _extract_task(task: Tuple[str, int, Optional[int]], settings: Settings) -> List[Record]:
+    return load_document(*task, settings=settings)
+
+def iter_document_records(paths: List[str], workers: int, pages_per_task: int,
+                          settings: Settings = Settings()) -> Iterator[Tuple[str, List[Record]]]:
+    """
+    Yield (path, records) per document, in the order of `paths`, while a
+    process pool extracts ahead. At most 2 * workers tasks are in flight, so
+    parsed-but-unconsumed text stays bounded.
+    """
+    tasks = (t for p in paths for t in plan_tasks(p, pages_per_task))
+    if workers <= 1:
+        results = ((t[0], _extract_task(t, settings)) for t in tasks)
+        yield from _group_by_doc(results)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def ordered():
+            pending = deque()
+            for t in tasks:
+                pending.append((t[0], pool.submit(_extract_task, t, settings)))
+                if len(pending) >= 2 * workers:
+                    path, fut = pending.popleft()
+                    yield path, fut.result()
+            while pending:
+                path, fut = pending.popleft()
+                yield path, fut.result()
+        yield from _group_by_doc(ordered())
+
+def _group_by_doc(results: Iterator[Tuple[str, List[Record]]]) -> Iterator[Tuple[str, List[Record]]]:
+    current, buf = None, []
+    for path, recs in results:
+        if path != current and current is not None:
+            yield current, buf
+            buf = []
+        current = path
+        buf.extend(recs)
+    if current is not None:
+        yield current, buf
+
+def extract_and_embed(paths: List[str], settings: Settings) -> Dict[str, Tuple[List[Record], Any]]:
+    """
+    Parse `paths` in a process pool and embed their chunks in batches on this
+    thread as they arrive, through a bounded queue, so parsing and embedding
+    overlap. Returns {path: (records, vectors)}; order within a document is
+    the same as a serial load_document().
+    """
+    import numpy as np
+
+    q: "queue.Queue" = queue.Queue(maxsize=settings.ingest_queue_batches)
+    batch_size = settings.ingest_embed_batch
+
+    stop = threading.Event()  # set by the consumer on the way out, e.g. when embedding fails
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        docs = iter_document_records(paths, settings.ingest_workers, settings.ingest_pages_per_task, settings)
+        try:
+            for path, recs in docs:
+                for i in range(0, len(recs), batch_size):
+                    if not put((path, recs[i:i + batch_size])):
+                        return
+                if not put((path, None)):  # document complete
+                    return
+        except BaseException as e:
+            put(e)
+        finally:
+            docs.close()  # shuts the process pool down if we stopped early
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="ingest-extract", daemon=True)
+    producer.start()
+    out: Dict[str, Tuple[List[Record], Any]] = {}
+    recs_buf: Dict[str, List[Record]] = {}
+    vecs_buf: Dict[str, List[Any]] = {}
+    bar = tqdm(desc="Embedding", unit="chunk")
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            path, batch = item
+            if batch is None:
+                recs = recs_buf.pop(path, [])
+                vecs = vecs_buf.pop(path, [])
+                out[path] = (recs, np.vstack(vecs) if vecs else np.zeros((0, 0), dtype="float32"))
+                continue
+            recs_buf.setdefault(path, []).extend(batch)
+            vecs_buf.setdefault(path, []).append(
+                np.asarray(embed_records(batch, settings, show_progress_bar=False), dtype="float32"))
+            bar.update(len(batch))
+    finally:
+        stop.set()
+        producer.join()
+        bar.close()
+    return out
 
 def save_jsonl(records: List[Record], out_path: str):
-    # Save metadata as JSONL (plain dicts, cloud-safe)
-    with open(out_path, "w", encoding="utf-8") as f:
+    # Save metadata as JSONL (plain dicts, cloud-safe). Written to a temp file and
+    # renamed, so a running Retriever never sees a half-written file.
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         for r in records:
             f.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+    os.replace(tmp_path, out_path)
 
-def build_faiss_index(vectors, records: List[Record], artifacts_dir: str, index_name: str):
+def build_faiss_index(vectors, records: List[Record], artifacts_dir: str, index_name: str,
+                      settings: Settings = Settings()):
     """
     Writes to:
-      artifacts/{index_name}/index.faiss
+      artifacts/{index_name}/index.faiss   (type per INDEX_TYPE, see ann.py)
       artifacts/{index_name}/metadata.jsonl
     """
     import faiss, numpy as np
@@ -83,32 +252,209 @@ def build_faiss_index(vectors, records: List[Record], artifacts_dir: str, index_
         vecs = np.array(vectors, dtype="float32")
         dim = vecs.shape[1]
 
-    index = faiss.IndexFlatIP(dim)
-    index.add(vecs)
-    faiss.write_index(index, os.path.join(out_dir, "index.faiss"))
+    from .ann import build_ann_index
+    index = build_ann_index(vecs, settings)
+    index_path = os.path.join(out_dir, "index.faiss")
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
 
-    # Metadata as JSONL (no pickle/classes)
+    # Metadata as JSONL (no pickle/classes) for portability and incremental ingest,
+    # plus the memory-mapped store the Retriever serves from
     save_jsonl(records, os.path.join(out_dir, "metadata.jsonl"))
+    from .metastore import save_metastore, META_BIN_FILE
+    save_metastore((asdict(r) for r in records), os.path.join(out_dir, META_BIN_FILE))
+    from .lexical import build_lexical_index, LEXICAL_FILE
+    build_lexical_index((r.text for r in records), os.path.join(out_dir, LEXICAL_FILE))
 
     return index
 
+# -------- Incremental ingest --------
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_VERSION = 2  # bump when chunking or the record format changes, to force a full rebuild
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_id(r: Record) -> str:
+    return hashlib.sha1(f"{r.doc_name}\x1f{r.anchor}\x1f{r.text}".encode('utf-8')).hexdigest()[:16]
+
+def load_previous(out_dir: str, model_name: str,
+                  chunking: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Dict[str, Any], List[Record], Any]]:
+    """Return (manifest, records, vectors) from the last run, or None if unusable."""
+    import numpy as np
+
+    paths = [os.path.join(out_dir, n) for n in (MANIFEST_FILE, VECTORS_FILE, "metadata.jsonl")]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    with open(paths[0], 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("embedding_model") != model_name:
+        return None
+    if chunking is not None and manifest.get("chunking") != chunking:
+        return None
+    vectors = np.load(paths[1])
+    records = []
+    with open(paths[2], 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(Record(**json.loads(line)))
+    if len(records) != len(vectors) or sum(d["count"] for d in manifest["documents"].values()) != len(records):
+        return None  # interrupted run; fall back to a full rebuild
+    return manifest, records, vectors
+
+def save_manifest(out_dir: str, manifest: Dict[str, Any], vectors):
+    import numpy as np
+
+    vec_path = os.path.join(out_dir, VECTORS_FILE)
+    with open(vec_path + ".tmp", 'wb') as f:
+        np.save(f, np.asarray(vectors, dtype="float32"))
+    os.replace(vec_path + ".tmp", vec_path)
+    man_path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(man_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(man_path + ".tmp", man_path)
+
+def ingest(docs_dir: str, artifacts_dir: str, settings: Settings, full: bool = False) -> Dict[str, List[str]]:
+    """
+    Build or update artifacts/{index_name}/, or with SHARD_BY one index per
+    shard under artifacts/{index_name}/shards/ (see shards.py). Each folder is
+    updated incrementally by ingest_folder(). Returns a change report.
+    """
+    import shutil
+    from .shards import (SHARDS_DIR, SHARDS_FILE, doc_tags, load_docs, load_tag_rules, save_shards, shard_key)
+
+    if settings.embed_backend != "torch":
+        from .embed_backend import ensure_export, onnx_dir
+        ensure_export(settings.embedding_model, onnx_dir(settings), settings.embedding_model_path,
+                      int8=settings.embed_backend == "onnx_int8")  # torch is needed here, not at query time
+    docs = list_documents(docs_dir)
+    rules = load_tag_rules(docs_dir)
+    tags = {rel: doc_tags(rel, rules) for rel, _ in docs}
+    index_dir = os.path.join(artifacts_dir, settings.index_name)
+    if not settings.shard_by:
+        report = ingest_folder(docs, tags, index_dir, settings, full)
+        if os.path.exists(os.path.join(index_dir, SHARDS_FILE)):
+            os.remove(os.path.join(index_dir, SHARDS_FILE))  # serve the single index again
+        return report
+
+    groups: Dict[str, List[Tuple[str, str]]] = {}
+    for rel, full_path in docs:
+        groups.setdefault(shard_key(rel, tags[rel], settings.shard_by), []).append((rel, full_path))
+    report: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    shards_root = os.path.join(index_dir, SHARDS_DIR)
+    shard_docs: Dict[str, List[Dict[str, Any]]] = {}
+    for name, group in sorted(groups.items()):
+        part = ingest_folder(group, tags, os.path.join(shards_root, name), settings, full)
+        for kind in report:
+            report[kind].extend(part[kind])
+        shard_docs[name] = load_docs(os.path.join(shards_root, name)) or []
+    shard_docs = {name: d for name, d in shard_docs.items() if d}
+    save_shards(index_dir, settings.shard_by, shard_docs)
+    if os.path.isdir(shards_root):
+        for name in os.listdir(shards_root):
+            if name not in groups:  # every document of this shard was deleted (or re-tagged)
+                report["removed"].extend(d["path"] for d in load_docs(os.path.join(shards_root, name)) or [])
+                shutil.rmtree(os.path.join(shards_root, name), ignore_errors=True)
+    for kind in report:
+        report[kind] = sorted(set(report[kind]) - (set(report["added"]) if kind == "removed" else set()))
+    return report
+
+def ingest_folder(docs: List[Tuple[str, str]], tags: Dict[str, Dict[str, str]], out_dir: str,
+                  settings: Settings, full: bool = False) -> Dict[str, List[str]]:
+    """
+    Build or update one index folder from `docs` [(relative_path, full_path)].
+    Only new or changed documents (by sha256) are parsed and embedded; vectors
+    for unchanged ones come from the previous run's vectors.npy, and deleted
+    documents are dropped. The FAISS index is rebuilt from the combined vectors.
+    """
+    import numpy as np
+    from .embed_backend import embedding_id
+    from .shards import save_docs
+
+    prev = None if full else load_previous(out_dir, embedding_id(settings), chunk_settings(settings))
+    prev_docs: Dict[str, Any] = prev[0]["documents"] if prev else {}
+
+    report: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    current = {rel for rel, _ in docs}
+    report["removed"] = sorted(set(prev_docs) - current)
+
+    hashes = {rel: file_sha256(full_path) for rel, full_path in docs}
+    todo = [full_path for rel, full_path in docs
+            if rel not in prev_docs or prev_docs[rel]["sha256"] != hashes[rel]]
+    fresh = extract_and_embed(todo, settings) if todo else {}
+    if todo:
+        from .vector_cache import get_vector_cache
+        get_vector_cache(embedding_id(settings)).flush()
+
+    records: List[Record] = []
+    parts = []  # per-document vector blocks, in row order
+    manifest_docs: Dict[str, Any] = {}
+    for rel, full_path in docs:
+        old = prev_docs.get(rel)
+        if full_path in fresh:
+            doc_records, doc_vectors = fresh[full_path]
+            report["changed" if old is not None else "added"].append(rel)
+        else:
+            start, count = old["start"], old["count"]
+            doc_records = prev[1][start:start + count]
+            doc_vectors = prev[2][start:start + count]
+            report["unchanged"].append(rel)
+        manifest_docs[rel] = {
+            "sha256": hashes[rel],
+            "start": len(records),
+            "count": len(doc_records),
+            "chunk_ids": [chunk_id(r) for r in doc_records],
+        }
+        records.extend(doc_records)
+        if doc_records:
+            parts.append(np.asarray(doc_vectors, dtype="float32"))
+
+    if parts:
+        vectors = np.vstack(parts)
+    elif prev is not None:  # every document was removed: replace the old index with an empty one
+        vectors = np.zeros((0, prev[2].shape[1]), dtype="float32")
+    else:
+        return report
+    doc_entries = [{"doc_name": os.path.basename(rel), "path": rel, "start": d["start"], "count": d["count"], **tags[rel]}
+                   for rel, d in manifest_docs.items()]
+    from .ann import resolve_index_type
+    index_type = resolve_index_type(len(vectors), settings)
+    if prev and not (report["added"] or report["changed"] or report["removed"]) \
+            and prev[0].get("index_type", "flat") == index_type:
+        save_docs(out_dir, doc_entries)  # tags may have changed
+        return report  # nothing to do
+
+    build_faiss_index(vectors, records, os.path.dirname(out_dir), os.path.basename(out_dir), settings)
+    save_docs(out_dir, doc_entries)
+    save_manifest(out_dir, {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_id(settings),
+        "chunking": chunk_settings(settings),
+        "index_type": index_type,
+        "documents": manifest_docs,
+    }, vectors)
+    return report
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--docs_dir', default=str(Paths().docs_dir))
     parser.add_argument('--artifacts_dir', default=str(Paths().artifacts_dir))
+    parser.add_argument('--full', action='store_true', help='ignore the manifest and re-embed everything')
     args = parser.parse_args()
 
     settings = Settings()
     print(f"Loading documents from: {args.docs_dir}")
-    records = build_corpus(args.docs_dir)
-    if not records:
+    report = ingest(args.docs_dir, args.artifacts_dir, settings, full=args.full)
+    if not (report["added"] or report["changed"] or report["unchanged"]):
         print("No documents found. Put PDFs/MD files in ./docs and rerun.")
         return
-    print(f"Built {len(records)} chunks. Embedding...")
-    vectors = embed_records(records, settings.embedding_model)
-
-    print("Saving FAISS index + metadata...")
-    build_faiss_index(vectors, records, args.artifacts_dir, settings.index_name)
+    for kind in ("added", "changed", "removed", "unchanged"):
+        print(f"{kind:>9}: {len(report[kind])}" + (f"  ({', '.join(report[kind])})" if report[kind] and kind != "unchanged" else ""))
     print("Done.")
 
 if __name__ == '__main__':
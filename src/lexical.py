@@ -0,0 +1,122 @@
+# src/lexical.py
+"""
+BM25 over chunk texts, stored as a CSR-style inverted index
+(artifacts/{index_name}/lexical.npz):
+
+    terms    sorted vocabulary, newline-joined UTF-8 (uint8)
+    indptr   int64 (V + 1)   postings of term t are [indptr[t], indptr[t + 1])
+    docs     int32           FAISS row IDs, ascending within a term
+    tfs      uint16          term frequency per posting
+    doc_len  int32 (N)       tokens per chunk
+
+Regulatory shorthand is folded at tokenization ("R.16", "Rec 16",
+"Recommendation 16" -> "r16"), so those queries match each other lexically.
+
+    python -m src.lexical      # build lexical.npz for an existing index
+"""
+from __future__ import annotations
+import os, re, json, argparse
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Paths, Settings
+
+LEXICAL_FILE = "lexical.npz"
+
+_REC_RE = re.compile(r"\b(?:recommendations?|recs?\.?|r\.)\s*(\d{1,2})\b", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "what does do under how must should shall any all".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    text = _REC_RE.sub(lambda m: f" r{m.group(1)} ", text.lower())
+    return [t for t in _TOKEN_RE.findall(text) if len(t) > 1 and t not in _STOPWORDS]
+
+def build_lexical_index(texts: Iterable[str], out_path: str):
+    """Tokenize every chunk and write the postings arrays to `out_path` (temp file + rename)."""
+    doc_terms: List[Counter] = [Counter(tokenize(t)) for t in texts]
+    vocab = sorted({term for c in doc_terms for term in c})
+    term_id = {t: i for i, t in enumerate(vocab)}
+    counts = np.zeros(len(vocab) + 1, dtype="int64")
+    for c in doc_terms:
+        for term in c:
+            counts[term_id[term] + 1] += 1
+    indptr = np.cumsum(counts)
+    docs = np.empty(indptr[-1], dtype="int32")
+    tfs = np.empty(indptr[-1], dtype="uint16")
+    fill = indptr[:-1].copy()
+    for d, c in enumerate(doc_terms):  # rows visited in order, so postings come out sorted
+        for term, tf in c.items():
+            t = term_id[term]
+            docs[fill[t]] = d
+            tfs[fill[t]] = min(tf, 65535)
+            fill[t] += 1
+    doc_len = np.array([sum(c.values()) for c in doc_terms], dtype="int32")
+    tmp_path = out_path + ".tmp.npz"
+    terms = np.frombuffer("\n".join(vocab).encode("utf-8"), dtype="uint8")
+    np.savez(tmp_path, terms=terms, indptr=indptr, docs=docs, tfs=tfs, doc_len=doc_len)
+    os.replace(tmp_path, out_path)
+
+class LexicalIndex:
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        with np.load(path, allow_pickle=False) as z:
+            blob = z["terms"].tobytes().decode("utf-8")
+            self.indptr, self.docs, self.tfs, self.doc_len = z["indptr"], z["docs"], z["tfs"], z["doc_len"]
+        self.term_id: Dict[str, int] = {t: i for i, t in enumerate(blob.split("\n"))} if blob else {}
+        self.n = len(self.doc_len)
+        self.k1, self.b = k1, b
+        avgdl = float(self.doc_len.mean()) if self.n else 1.0
+        self._norm = (k1 * (1 - b + b * self.doc_len / max(avgdl, 1e-9))).astype("float32")
+        df = np.diff(self.indptr).astype("float32")
+        self.idf = np.log(1 + (self.n - df + 0.5) / (df + 0.5)).astype("float32")
+
+    def __len__(self) -> int:
+        return self.n
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (row_ids, bm25_scores) for `query`, best first. Rows with score 0 (or outside `mask`) are omitted."""
+        scores = np.zeros(self.n, dtype="float32")
+        for term in set(tokenize(query)):
+            t = self.term_id.get(term)
+            if t is None:
+                continue
+            s, e = self.indptr[t], self.indptr[t + 1]
+            ids = self.docs[s:e]
+            tf = self.tfs[s:e].astype("float32")
+            scores[ids] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[ids])
+        if mask is not None:
+            scores[~mask] = 0.0
+        k = min(k, self.n)
+        if k <= 0:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return top.astype("int64"), scores[top]
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion: score(d) = sum over rankings of 1 / (k + rank). Best first."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Build lexical.npz (BM25 postings) for an existing index.")
+    parser.add_argument("--artifacts_dir", default=str(Paths().artifacts_dir))
+    parser.add_argument("--index_name", default=Settings().index_name)
+    args = parser.parse_args()
+
+    folder = os.path.join(args.artifacts_dir, args.index_name)
+    with open(os.path.join(folder, "metadata.jsonl"), "r", encoding="utf-8") as f:
+        texts = [json.loads(line)["text"] for line in f if line.strip()]
+    build_lexical_index(texts, os.path.join(folder, LEXICAL_FILE))
+    print(f"Indexed {len(texts)} chunks into {os.path.join(folder, LEXICAL_FILE)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 # src/llm.py
 from __future__ import annotations
-import os
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError
-from tenacity import retry, wait_exponential_jitter, stop_after_attempt, retry_if_exception_type
+import os, asyncio, queue, random, threading, time
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from . import metrics
+from .utils import estimate_tokens
+
+MAX_TOKENS = 700        # cap output size to reduce token usage
+REQUEST_TIMEOUT = 60    # seconds
 
 def _get_api_key():
     k = os.getenv("OPENAI_API_KEY")
@@ -14,32 +19,270 @@ def _get_api_key():
     except Exception:
         return None
 
+# -------- Error classes (matched by name so callers need not import openai) --------
+_BUSY_ERRORS = ("RateLimitError", "APITimeoutError")
+
+def is_busy_error(e: BaseException) -> bool:
+    """Rate limited or timed out upstream: worth retrying in a few seconds."""
+    return e.__class__.__name__ in _BUSY_ERRORS
+
+def is_api_error(e: BaseException) -> bool:
+    return e.__class__.__module__.startswith("openai") and e.__class__.__name__.endswith("Error")
+
+# -------- Rate limiting --------
+class TokenBucketLimiter:
+    """
+    Process-wide limiter over requests/min and tokens/min. Every caller draws
+    from the same two buckets, and a 429 pauses all of them at once (`penalize`)
+    instead of each caller backing off on its own.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = max(0.0, float(rpm))  # 0 (or less): no request limit
+        self.tpm = max(0.0, float(tpm))  # 0 (or less): no token limit
+        self._req = self.rpm
+        self._tok = self.tpm
+        self._stamp = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._stamp
+        self._stamp = now
+        if self.rpm:
+            self._req = min(self.rpm, self._req + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(self.tpm, self._tok + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int):
+        tokens = min(float(tokens), self.tpm) if self.tpm else 0.0  # an oversized request must still be admitted eventually
+        async with self._lock:  # FIFO: waiters are served in arrival order
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if (not self.rpm or self._req >= 1) and self._tok >= tokens:
+                    if self.rpm:
+                        self._req -= 1
+                    self._tok -= tokens
+                    return
+                wait_req = (1 - self._req) * 60.0 / self.rpm if self.rpm and self._req < 1 else 0.0
+                wait_tok = (tokens - self._tok) * 60.0 / self.tpm if self._tok < tokens else 0.0
+                await asyncio.sleep(max(wait_req, wait_tok, 0.001))
+
+    def refund(self, tokens: int):
+        """Give back tokens reserved beyond what the response actually used."""
+        self._tok = min(self.tpm, self._tok + max(0, tokens))
+
+    def penalize(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+# -------- Shared event loop --------
+class _LoopThread:
+    """Background event loop that owns the async client; sync callers submit to it."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        t = threading.Thread(target=self.loop.run_forever, name="llm-event-loop", daemon=True)
+        t.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+_loop_thread: Optional[_LoopThread] = None
+_loop_lock = threading.Lock()
+
+def _get_loop_thread() -> _LoopThread:
+    global _loop_thread
+    if _loop_thread is None:
+        with _loop_lock:
+            if _loop_thread is None:
+                _loop_thread = _LoopThread()
+    return _loop_thread
+
+# -------- Async client --------
+class AsyncLLMClient:
+    """
+    One pooled HTTP transport per (base_url, api key), shared by every caller in
+    the process. Concurrency is capped by a semaphore and throughput by a
+    TokenBucketLimiter; rate-limit retries go through the shared limiter.
+    """
+
+    def __init__(self, settings, api_key: str):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.settings = settings
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_concurrency,
+                max_keepalive_connections=settings.llm_max_concurrency,
+            ),
+            timeout=REQUEST_TIMEOUT,
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=settings.openai_base_url or None,
+            http_client=http_client,
+            max_retries=0,  # retries are coordinated below
+        )
+        self.limiter = TokenBucketLimiter(settings.llm_rpm, settings.llm_tpm)
+        self.semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
+    def _messages(self, system_prompt: str, user_prompt: str):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": user_prompt},
+        ]
+
+    async def _create(self, system_prompt: str, user_prompt: str, model: Optional[str], budget: int, **kwargs):
+        """chat.completions.create behind the limiter and semaphore, with coordinated retries."""
+        from openai import APIConnectionError, APIStatusError, InternalServerError, RateLimitError
+
+        attempts = self.settings.llm_max_retries
+        for attempt in range(1, attempts + 1):
+            if attempt > 1:
+                metrics.incr("llm_retries")
+            with metrics.stage("llm_wait"):
+                await self.limiter.acquire(budget)
+            try:
+                async with self.semaphore:
+                    return await self.client.chat.completions.create(
+                        model=model or self.settings.openai_model,
+                        messages=self._messages(system_prompt, user_prompt),
+                        temperature=0.1,
+                        max_tokens=MAX_TOKENS,
+                        timeout=REQUEST_TIMEOUT,
+                        **kwargs,
+                    )
+            except RateLimitError as e:
+                metrics.incr("llm_rate_limited")
+                if attempt == attempts:
+                    raise
+                # One pause for everybody, honouring Retry-After when the API sends it.
+                self.limiter.penalize(_retry_after(e) or min(20.0, 2.0 ** attempt))
+            except (APIConnectionError, InternalServerError):  # incl. timeouts and 5xx
+                metrics.incr("llm_errors")
+                if attempt == attempts:
+                    raise
+                await asyncio.sleep(min(20.0, 2.0 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            except APIStatusError:
+                metrics.incr("llm_errors")
+                raise  # bad key, oversized prompt, ...: retrying cannot help
+        raise RuntimeError("unreachable")
+
+    async def generate(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> str:
+        budget = estimate_tokens(system_prompt) + estimate_tokens(user_prompt) + MAX_TOKENS
+        resp = await self._create(system_prompt, user_prompt, model, budget)
+        usage = getattr(resp, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None):
+            self.limiter.refund(budget - usage.total_tokens)
+            _record_usage(usage)
+        return resp.choices[0].message.content or ""
+
+    async def generate_stream(self, system_prompt: str, user_prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield completion text deltas as they arrive. Retries only happen before the first token."""
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        budget = prompt_tokens + MAX_TOKENS
+        # The semaphore covers opening the stream; the httpx pool still caps open connections.
+        stream = await self._create(system_prompt, user_prompt, model, budget, stream=True)
+        received = []
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    _record_usage(chunk.usage)  # servers that report usage on the final chunk
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    received.append(delta)
+                    yield delta
+        finally:
+            await stream.close()
+            self.limiter.refund(budget - prompt_tokens - estimate_tokens("".join(received)))
+
+def _record_usage(usage):
+    metrics.incr("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+    metrics.incr("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+def _retry_after(err) -> Optional[float]:
+    try:
+        value = err.response.headers.get("retry-after")
+        return float(value) if value else None
+    except Exception:
+        return None
+
+_clients: Dict[Tuple[Optional[str], str], AsyncLLMClient] = {}
+_clients_lock = threading.Lock()
+
+def get_async_client(settings) -> AsyncLLMClient:
+    """Return the process-wide AsyncLLMClient for these settings' endpoint."""
+    api_key = _get_api_key()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not set.")
+    key = (settings.openai_base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = AsyncLLMClient(settings, api_key)
+                _clients[key] = client
+    return client
+
+# -------- Sync facade --------
+async def _in_trace(coro, trace):
+    """Run `coro` on the client loop with the caller's request trace current."""
+    with metrics.use_trace(trace):
+        return await coro
+
 class LLMClient:
+    """Thin synchronous wrapper over the shared AsyncLLMClient."""
+
     def __init__(self, settings):
-        api_key = _get_api_key()
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY is not set.")
-        self.client = OpenAI(api_key=api_key)
         self.settings = settings
+        self.aclient = get_async_client(settings)
 
-    @retry(
-        retry=retry_if_exception_type((RateLimitError, APITimeoutError, APIError)),
-        wait=wait_exponential_jitter(initial=1, max=20),  # 1s, 2s, 4s … jittered
-        stop=stop_after_attempt(5),
-        reraise=True,
-    )
-    def _call(self, system_prompt: str, user_prompt: str) -> str:
-        resp = self.client.chat.completions.create(
-            model=self.settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user",   "content": user_prompt},
-            ],
-            temperature=0.1,
-            max_tokens=700,           # cap output size to reduce token usage
-            timeout=60,               # seconds
-        )
-        return resp.choices[0].message.content
+    async def agenerate(self, system_prompt: str, user_prompt: str) -> str:
+        """Await from any event loop; the call itself runs on the client's loop."""
+        loop = _get_loop_thread().loop
+        coro = _in_trace(self.aclient.generate(system_prompt, user_prompt, self.settings.openai_model),
+                         metrics.current_trace())
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
 
     def generate(self, system_prompt: str, user_prompt: str) -> str:
-        return self._call(system_prompt, user_prompt)
+        coro = self.aclient.generate(system_prompt, user_prompt, self.settings.openai_model)
+        return _get_loop_thread().run(_in_trace(coro, metrics.current_trace()))
+
+    def generate_stream(self, system_prompt: str, user_prompt: str) -> Iterator[str]:
+        """Sync iterator of completion tokens, fed from the client's event loop."""
+        # Capture the caller's trace now; a generator body would only run at first next().
+        return self._stream(system_prompt, user_prompt, metrics.current_trace())
+
+    def _stream(self, system_prompt: str, user_prompt: str, trace) -> Iterator[str]:
+        q: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                with metrics.use_trace(trace):
+                    async for delta in self.aclient.generate_stream(system_prompt, user_prompt, self.settings.openai_model):
+                        q.put(delta)
+            except BaseException as e:
+                q.put(e)
+            finally:
+                q.put(done)
+
+        fut = asyncio.run_coroutine_threadsafe(pump(), _get_loop_thread().loop)
+        try:
+            while True:
+                item = q.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            fut.cancel()  # consumer stopped early: close the HTTP stream
@@ -0,0 +1,127 @@
+# src/llm_stub.py
+"""
+Deterministic local stand-in for the OpenAI chat completions API.
+
+    python -m src.llm_stub --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub streamlit run app.py
+
+The reply is built from the prompt's [Source: ...] lines, so the same prompt
+always gets the same answer. `--latency` adds a fixed delay and
+`--rate_limit_every N` answers every Nth request with a 429.
+"""
+from __future__ import annotations
+import re, json, time, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Tuple
+
+from .utils import estimate_tokens
+
+def stub_reply(messages) -> str:
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    sources = re.findall(r"\[Source: ([^\]]+)\]", prompt)
+    if not sources:
+        return "Insufficient context."
+    bullets = [f"- The cited context ({s}) addresses this question." for s in dict.fromkeys(sources)]
+    return "\n".join(bullets) + "\n\nSummary: answer drawn from the retrieved context only."
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # keep benchmarks quiet
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, n: int, model: str, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: dict, finish: str | None = None):
+            body = {"id": f"chatcmpl-stub-{n}", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self._write_chunk(f"data: {json.dumps(body)}\n\n")
+
+        event({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*", content):
+            event({"content": piece})
+        event({}, "stop")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            n = server.requests
+        if server.rate_limit_every and n % server.rate_limit_every == 0:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}},
+                            {"Retry-After": "0.05"})
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        messages = req.get("messages", [])
+        content = stub_reply(messages)
+        if req.get("stream"):
+            self._send_stream(n, req.get("model", "stub"), content)
+            return
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content)
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{n}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                      rate_limit_every: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a daemon thread. Returns (server, base_url); call server.shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.rate_limit_every = rate_limit_every
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="llm-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible chat stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to sleep per request")
+    parser.add_argument("--rate_limit_every", type=int, default=0, help="return 429 for every Nth request")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.host, args.port, args.latency, args.rate_limit_every)
+    print(f"Stub LLM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# src/metastore.py
+"""
+Compact, memory-mapped chunk metadata (artifacts/{index_name}/metadata.bin).
+
+Layout (little-endian):
+    magic      8 bytes  b"CBMETA2\\0"
+    hdr_len    uint64
+    header     JSON: {"n", "strings", "rows_offset", "spans_offset", "n_spans", "text_offset"}
+    rows       n x (doc: u4, anchor: u4, off: u8, len: u4,
+                    span: u4, n_sent: u2, n_quote: u2)       at rows_offset (8-aligned)
+    spans      int32: per row, n_sent sentence starts then
+               n_quote (start, end) quote candidates        at spans_offset
+    text       UTF-8 blob of all chunk texts                 at text_offset
+
+doc_name and anchor are indices into the interned string table, so a lookup
+by FAISS row ID is one row read plus one slice of the mapped text blob.
+Offsets in `spans` are character offsets into the chunk text. Files written
+before spans existed (b"CBMETA1\\0", no span columns) still load.
+
+    python -m src.metastore            # convert an existing metadata.jsonl
+"""
+from __future__ import annotations
+import os, json, mmap, struct, argparse
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from .config import Paths, Settings
+from .utils import quote_text
+
+MAGIC = b"CBMETA2\0"
+MAGIC_V1 = b"CBMETA1\0"
+META_BIN_FILE = "metadata.bin"
+ROW_DTYPE = np.dtype([("doc", "<u4"), ("anchor", "<u4"), ("off", "<u8"), ("len", "<u4"),
+                      ("span", "<u4"), ("n_sent", "<u2"), ("n_quote", "<u2")])
+ROW_DTYPE_V1 = np.dtype([("doc", "<u4"), ("anchor", "<u4"), ("off", "<u8"), ("len", "<u4")])
+
+def _align(n: int, to: int = 8) -> int:
+    return (n + to - 1) // to * to
+
+def save_metastore(records: Iterable[Dict[str, Any]], out_path: str):
+    """Write records (dicts with doc_name, anchor, text, and optionally sentences / quotes)
+    to `out_path` via temp file + rename."""
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def sid(s: str) -> int:
+        i = string_ids.get(s)
+        if i is None:
+            i = string_ids[s] = len(strings)
+            strings.append(s)
+        return i
+
+    rows = []
+    blobs = []
+    spans: List[int] = []
+    off = 0
+    for r in records:
+        data = r["text"].encode("utf-8")
+        sentences = r.get("sentences") or []
+        quotes = r.get("quotes") or []
+        rows.append((sid(r["doc_name"]), sid(r["anchor"]), off, len(data), len(spans), len(sentences), len(quotes)))
+        spans.extend(sentences)
+        for a, b in quotes:
+            spans.extend((a, b))
+        blobs.append(data)
+        off += len(data)
+    rows_arr = np.array(rows, dtype=ROW_DTYPE)
+    spans_arr = np.array(spans, dtype="<i4")
+
+    # The header holds its own offsets; fixed-width placeholders keep its length stable.
+    header = {"n": len(rows), "strings": strings, "rows_offset": 10 ** 15, "spans_offset": 10 ** 15,
+              "n_spans": len(spans), "text_offset": 10 ** 15}
+    hdr_len = len(json.dumps(header).encode("utf-8"))
+    rows_offset = _align(16 + hdr_len)
+    spans_offset = rows_offset + rows_arr.nbytes
+    text_offset = spans_offset + spans_arr.nbytes
+    header.update(rows_offset=rows_offset, spans_offset=spans_offset, text_offset=text_offset)
+    hdr = json.dumps(header).encode("utf-8").ljust(hdr_len)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", hdr_len))
+        f.write(hdr)
+        f.write(b"\0" * (rows_offset - 16 - hdr_len))
+        f.write(rows_arr.tobytes())
+        f.write(spans_arr.tobytes())
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, out_path)
+
+class MetaStore:
+    """Read-only view over metadata.bin. Same interface as retriever.MetadataStore."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic = f.read(8)
+            if magic not in (MAGIC, MAGIC_V1):
+                raise ValueError(f"{path} is not a metadata store")
+            (hdr_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(hdr_len))
+            # The mapping stays valid after the file is replaced, so old snapshots keep working.
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.strings: List[str] = header["strings"]
+        self._n = header["n"]
+        self._has_spans = magic == MAGIC
+        self._rows = np.frombuffer(self._mm, dtype=ROW_DTYPE if self._has_spans else ROW_DTYPE_V1,
+                                   count=self._n, offset=header["rows_offset"])
+        self._spans = np.frombuffer(self._mm, dtype="<i4", count=header["n_spans"],
+                                    offset=header["spans_offset"]) if self._has_spans else None
+        self._text_offset = header["text_offset"]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def text(self, i: int) -> str:
+        row = self._rows[i]
+        start = self._text_offset + int(row["off"])
+        return str(memoryview(self._mm)[start:start + int(row["len"])], "utf-8")
+
+    def get(self, i: int) -> Dict[str, Any]:
+        row = self._rows[i]
+        text = self.text(i)
+        rec = {
+            "doc_name": self.strings[row["doc"]],
+            "anchor": self.strings[row["anchor"]],
+            "text": text,
+        }
+        if self._has_spans:
+            s, ns, nq = int(row["span"]), int(row["n_sent"]), int(row["n_quote"])
+            rec["sentences"] = self._spans[s:s + ns].tolist()
+            q = self._spans[s + ns:s + ns + 2 * nq].tolist()
+            rec["quotes"] = [quote_text(text, q[k:k + 2]) for k in range(0, len(q), 2)]
+        return rec
+
+def convert_jsonl(meta_jsonl: str, out_path: str) -> int:
+    """Build metadata.bin from an existing metadata.jsonl, precomputing sentence / quote
+    spans for rows written before they existed. Returns the row count."""
+    from .utils import quote_spans, sentence_spans
+
+    with open(meta_jsonl, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for r in records:
+        if "sentences" not in r:
+            r["sentences"] = [a for a, _ in sentence_spans(r["text"])]
+            r["quotes"] = [list(span) for span in quote_spans(r["text"])]
+    save_metastore(records, out_path)
+    return len(records)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert metadata.jsonl to the memory-mapped metadata.bin.")
+    parser.add_argument("--artifacts_dir", default=str(Paths().artifacts_dir))
+    parser.add_argument("--index_name", default=Settings().index_name)
+    args = parser.parse_args()
+
+    folder = os.path.join(args.artifacts_dir, args.index_name)
+    n = convert_jsonl(os.path.join(folder, "metadata.jsonl"), os.path.join(folder, META_BIN_FILE))
+    print(f"Wrote {n} rows to {os.path.join(folder, META_BIN_FILE)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# src/metrics.py
+"""
+Lightweight per-request tracing and process-wide metrics.
+
+    with metrics.trace() as tr:          # one per answer(); None when METRICS is off
+        with metrics.stage("embed"):     # adds elapsed ms to the trace and the stage histogram
+            ...
+        metrics.incr("llm_retries")      # counters: retries, rate limits, token usage
+
+Aggregates are exposed in Prometheus text format: render_prometheus(), a
+METRICS_PORT HTTP endpoint (/metrics), and/or a METRICS_FILE written at exit.
+With METRICS=0 (the default) stage() returns a shared no-op context manager
+and incr() returns immediately.
+"""
+from __future__ import annotations
+import atexit, bisect, contextvars, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import Settings
+
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+class Trace:
+    """Stage timings (ms) and counters for one request."""
+    __slots__ = ("stages", "counters", "_start")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._start = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "stages_ms": {k: round(v, 3) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.sum += ms
+        self.count += 1
+
+_enabled = Settings().metrics
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("compliancebot_trace", default=None)
+_lock = threading.Lock()
+_histograms: Dict[str, _Histogram] = {}
+_counters: Dict[str, int] = {}
+
+def enabled() -> bool:
+    return _enabled
+
+def configure(enable: bool):
+    """Switch collection on or off at runtime (e.g. from a benchmark)."""
+    global _enabled
+    _enabled = enable
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def new_trace() -> Optional[Trace]:
+    """A fresh Trace, or None when metrics are off. Pair with use_trace() and finish()."""
+    return Trace() if _enabled else None
+
+def finish(tr: Optional[Trace]) -> Optional[Dict[str, Any]]:
+    """Record the request's total time and return its trace as a dict."""
+    if tr is None:
+        return None
+    out = tr.to_dict()
+    with use_trace(None):
+        observe("request", out["total_ms"])
+    return out
+
+@contextmanager
+def trace() -> Iterator[Optional[Trace]]:
+    """Start a request trace, or join the one already active in this context."""
+    if not _enabled:
+        yield None
+        return
+    existing = _current.get()
+    if existing is not None:
+        yield existing
+        return
+    tr = Trace()
+    token = _current.set(tr)
+    try:
+        yield tr
+    finally:
+        _current.reset(token)
+        observe("request", (time.perf_counter() - tr._start) * 1000)
+
+@contextmanager
+def use_trace(tr: Optional[Trace]) -> Iterator[None]:
+    """Make `tr` current here, e.g. in a thread or event loop that did not inherit it."""
+    token = _current.set(tr)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def observe(stage: str, ms: float):
+    """Record a stage duration on the current trace and the process-wide histogram."""
+    if not _enabled:
+        return
+    tr = _current.get()
+    if tr is not None:
+        tr.stages[stage] = tr.stages.get(stage, 0.0) + ms
+    with _lock:
+        h = _histograms.get(stage)
+        if h is None:
+            h = _histograms[stage] = _Histogram()
+        h.observe(ms)
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name: str):
+    """Context manager timing a pipeline stage; free when metrics are off."""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+def incr(name: str, n: int = 1):
+    if not _enabled or not n:
+        return
+    tr = _current.get()
+    if tr is not None:
+        tr.counters[name] = tr.counters.get(name, 0) + n
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+# -------- Export --------
+def render_prometheus() -> str:
+    lines: List[str] = []
+    with _lock:
+        hists = {k: (list(h.counts), h.sum, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    lines.append("# HELP compliancebot_stage_ms Time spent per pipeline stage (milliseconds).")
+    lines.append("# TYPE compliancebot_stage_ms histogram")
+    for name in sorted(hists):
+        counts, total, count = hists[name]
+        cum = 0
+        for le, c in zip(BUCKETS_MS, counts):
+            cum += c
+            lines.append(f'compliancebot_stage_ms_bucket{{stage="{name}",le="{le}"}} {cum}')
+        lines.append(f'compliancebot_stage_ms_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'compliancebot_stage_ms_sum{{stage="{name}"}} {total:.3f}')
+        lines.append(f'compliancebot_stage_ms_count{{stage="{name}"}} {count}')
+    lines.append("# HELP compliancebot_events_total Pipeline event counters (retries, rate limits, tokens).")
+    lines.append("# TYPE compliancebot_events_total counter")
+    for name in sorted(counters):
+        lines.append(f'compliancebot_events_total{{event="{name}"}} {counters[name]}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    import os
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve GET /metrics from a daemon thread. Returns the server."""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def _autostart(settings: Settings):
+    if not settings.metrics:
+        return
+    if settings.metrics_port:
+        try:
+            start_metrics_server(settings.metrics_port, settings.metrics_host)
+        except OSError:
+            pass  # another worker in this host already serves the port
+    if settings.metrics_file:
+        atexit.register(write_prometheus, settings.metrics_file)
+
+_autostart(Settings())
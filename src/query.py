@@ -0,0 +1,145 @@
+# src/query.py
+"""
+Query front-end: one canonical form per question, before caching and retrieval.
+
+canonical_query() rewrites what the pipeline embeds, searches and prompts with:
+
+    "what does  R.16 require ??"   ->  "what does FATF Recommendation 16 require?"
+    "INR.16 thresholds"            ->  "Interpretive Note to FATF Recommendation 16 thresholds"
+    "VARA’s rules – client money"  ->  "VARA's rules - client money"
+
+dedup_key() is the lowercased canonical form without trailing punctuation or
+quotes; the embedder LRU, the reranker cache, service coalescing, the app's
+session cache and the audit trail's duplicate counts all key on it.
+
+    python -m src.query "What does Rec 16 require?"   # show both forms
+    python -m src.query dupes [--logs data/logs]      # duplicate questions in the audit trail
+"""
+from __future__ import annotations
+import os, re, sys, glob, json, hashlib, argparse, threading, unicodedata
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+from .config import Paths
+
+FATF_RECOMMENDATIONS = 40
+
+_CHARS = str.maketrans({
+    "‘": "'", "’": "'", "‛": "'", "′": "'",
+    "“": '"', "”": '"', "‟": '"', "″": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "−": "-",
+    "​": "", "‌": "", "‍": "", "﻿": "",
+})
+# "INR.16", "INR16" (not "INR 16", which may be rupees); "Interpretive Note to Rec 16" is left to _REC
+_INR = re.compile(r"\b(?:FATF\s+)?INR(?:\s*\.\s*|)(\d{1,2})\b(?![.,]\d)")
+# "Rec 16", "rec. 16", "Recommendation 16", "FATF's Rec 16". Plurals ("Recommendations 10 and 11") are
+# left alone: rewriting them to the singular would drop the rest of the list.
+_REC = re.compile(r"\b(?:FATF(?:'s)?\s+)?(?:Rec|Recomm|Recommendation)\s*\.?\s*(\d{1,2})\b(?![.,]\d)",
+                  re.IGNORECASE)
+# "R16", "R.16", "fatf r 16": a bare R only upper-case and attached to the number, or after FATF in any
+# case (so "R 20 per transfer" in rand and "a 3 r 5" are left alone)
+_R = re.compile(r"(?:\b(?i:FATF(?:'s)?\s+R)\s*\.?\s*|\bR\.?)(\d{1,2})\b(?![.,]\d)")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([?!,;:)]|\.(?!\.))")  # not before an ellipsis
+_REPEATED_PUNCT = re.compile(r"(?!\.\.)([?!.,;:])[?!.,;:]*(?=\s|$)")  # "??" -> "?"; "..." stays
+_KEY_PUNCT = re.compile(r"[?!.,;:]+(?=\s|$)")
+_KEY_QUOTES = re.compile(r"[\"'`]")
+
+def _recommendation(number: str, prefix: str = "") -> Optional[str]:
+    n = int(number)
+    return f"{prefix}FATF Recommendation {n}" if 1 <= n <= FATF_RECOMMENDATIONS else None
+
+def canonical_query(text: str) -> str:
+    """Unicode, whitespace, punctuation and FATF shorthand normalized; idempotent."""
+    text = unicodedata.normalize("NFKC", text).translate(_CHARS)
+    text = " ".join(text.split())
+    text = _INR.sub(lambda m: _recommendation(m.group(1), "Interpretive Note to ") or m.group(0), text)
+    text = _REC.sub(lambda m: _recommendation(m.group(1)) or m.group(0), text)
+    text = _R.sub(lambda m: _recommendation(m.group(1)) or m.group(0), text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    return _REPEATED_PUNCT.sub(r"\1", text).strip()
+
+def dedup_key(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive key of the canonical query."""
+    text = _KEY_QUOTES.sub("", canonical_query(text).lower())
+    return " ".join(_KEY_PUNCT.sub(" ", text).split())
+
+def key_hash(text: str) -> str:
+    """Short stable id of dedup_key(text), for logs."""
+    return hashlib.sha1(dedup_key(text).encode("utf-8")).hexdigest()[:16]
+
+# -------- Repeat counts --------
+class QueryCounter:
+    """How many times each dedup key was seen in this process (bounded LRU)."""
+
+    def __init__(self, max_keys: int = 50000):
+        self.max_keys = max_keys
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, key: str) -> int:
+        """Count one more occurrence of `key`; returns the total so far (1 = first time)."""
+        with self._lock:
+            n = self._counts.pop(key, 0) + 1
+            self._counts[key] = n
+            while len(self._counts) > self.max_keys:
+                self._counts.popitem(last=False)
+            return n
+
+_counter: Optional[QueryCounter] = None
+_counter_lock = threading.Lock()
+
+def get_query_counter() -> QueryCounter:
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = QueryCounter()
+    return _counter
+
+# -------- Audit report --------
+def duplicate_report(log_dir: str, top: int = 10) -> Dict[str, Any]:
+    """Questions in every audit file under log_dir: unique by raw text (stripped, lowercased) vs by dedup key."""
+    raw: Counter = Counter()
+    keys: Counter = Counter()
+    examples: Dict[str, str] = {}
+    for path in sorted(glob.glob(os.path.join(log_dir, "audit*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                question = rec.get("question")
+                if not question:
+                    continue
+                key = dedup_key(question)
+                raw[question.strip().lower()] += 1
+                keys[key] += 1
+                examples.setdefault(key, question)
+    total = sum(keys.values())
+    return {
+        "questions": total,
+        "unique_raw": len(raw),
+        "unique_canonical": len(keys),
+        "duplicate_rate": round(1 - len(keys) / total, 4) if total else 0.0,
+        "top": [{"count": n, "key": k, "example": examples[k]} for k, n in keys.most_common(top) if n > 1],
+    }
+
+def main(argv: Optional[list] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["dupes"]:
+        parser = argparse.ArgumentParser(description="Show the canonical form and dedup key of a question.")
+        parser.add_argument("question", nargs="+")
+        args = parser.parse_args(argv)
+        question = " ".join(args.question)
+        print(f"canonical: {canonical_query(question)}\nkey:       {dedup_key(question)}")
+        return
+    parser = argparse.ArgumentParser(description="Duplicate questions in the audit trail.")
+    parser.add_argument("command", choices=["dupes"])
+    parser.add_argument("--logs", default=Paths().logs_dir)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+    print(json.dumps(duplicate_report(args.logs, args.top), indent=1, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
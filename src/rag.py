@@ -1,10 +1,17 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from dataclasses import dataclass
-import json, os, datetime
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from dataclasses import dataclass, asdict
+import json, os, time, hashlib
 
+from . import metrics
 from .config import Paths, Settings
-from .retriever import retrieve
+from .retriever import retrieve, get_retriever
+from .embedder import get_embedder
+from .embed_backend import embedding_id
+from .answer_cache import get_answer_cache
+from .shards import filters_key, normalize_filters
+from .query import canonical_query
+from .context import BLOCK_SEPARATOR, format_block, pack_context, retrieval_depth
 from .llm import LLMClient
 from .utils import select_short_quote, format_citations
 
@@ -15,31 +22,30 @@ SYSTEM_PROMPT = (
     "(5) NEVER include content not grounded in the context."
 )
 
+PROMPT_VERSION = 1  # bump when build_prompt()'s template changes, to retire cached answers
+
 @dataclass
 class Answer:
     text: str
     quotes: List[str]
     citations: List[str]
     used_contexts: List[Dict[str, Any]]
+    trace: Optional[Dict[str, Any]] = None  # per-stage timings and counters when METRICS=1
+    audited: bool = False  # the producer (src/service.py) already wrote the audit record
+    index_version: Optional[str] = None  # version of the index that answered (for the audit trail)
 
-def answer(query: str, paths: Paths = Paths(), settings: Settings = Settings()) -> Answer:
-    """Top-level API used by notebook and app."""
-    results, ok = retrieve(query, settings.top_k, settings.min_sim_threshold, settings, paths.artifacts_dir)
-    if not ok:
-        # Guardrail: insufficient
-        return Answer(text="Insufficient context.", quotes=[], citations=[], used_contexts=[])
-
-    # Build context
+def build_prompt(query: str, results: List[Dict[str, Any]], settings: Settings = Settings()):
+    """Return (user_prompt, candidate_quotes) for the (packed) results."""
     context_blocks = []
     chosen_quotes = []
     for r in results:
-        context_blocks.append(f"[Source: {r['doc_name']}#{r['anchor']}]\n{r['text']}")
-        q = select_short_quote(r['text'])
+        context_blocks.append(format_block(r))
+        q = _best_quote(r)
         if q:
             chosen_quotes.append(q)
 
         # Build the prompt (triple-quoted so bullets are on new lines)
-    context_str = "\n\n---\n\n".join(context_blocks[:settings.top_k])
+    context_str = BLOCK_SEPARATOR.join(context_blocks)
     user_prompt = f"""Question: {query}
 
 Context (authoritative sources; cite only these):
@@ -50,10 +56,17 @@ Write:
 - Then a short 1–2 sentence summary.
 - Respond only from the context. Do not speculate.
 """
+    return user_prompt, chosen_quotes
 
-    llm = LLMClient(settings)
-    raw = llm.generate(SYSTEM_PROMPT, user_prompt)
+def _best_quote(r: Dict[str, Any]) -> str:
+    """Top quote candidate: precomputed at ingest, or selected now for older indexes."""
+    quotes = r.get("quotes")
+    if quotes:
+        return quotes[0]
+    with metrics.stage("select_quote"):
+        return select_short_quote(r["text"])
 
+def _pick_quotes(chosen_quotes: List[str], results: List[Dict[str, Any]]) -> List[str]:
     # Add quotes (at least 1) — ensure unique & <= 30 words each
     quotes: List[str] = []
     for q in chosen_quotes[:2]:
@@ -65,31 +78,176 @@ Write:
 
     if not quotes and results:
         # Fallback: take a short quote from the top result
-        fallback = select_short_quote(results[0]["text"])
+        fallback = _best_quote(results[0])
         if fallback:
             quotes.append(fallback)
+    return quotes
+
+def _tail_parts(quotes: List[str], citations: List[str]) -> List[str]:
+    """The quotes + citations block appended after the model output."""
+    parts = [f'> Quote: "{q}"' for q in quotes]
+    if citations:
+        parts.append("Citations: " + "; ".join(citations))
+    return parts
 
+def compose_answer(raw: str, chosen_quotes: List[str], results: List[Dict[str, Any]]) -> Answer:
+    """Attach quotes and citations to the model output."""
+    quotes = _pick_quotes(chosen_quotes, results)
     citations = format_citations(results)
 
     # Compose final answer text with quotes and citations
     parts = [raw.strip()]  # model-written bullets + short summary
-    for q in quotes:
-        parts.append(f'> Quote: "{q}"')
-    if citations:
-        parts.append("Citations: " + "; ".join(citations))
+    parts.extend(_tail_parts(quotes, citations))
 
     formatted = "\n\n".join(parts)
     return Answer(text=formatted, quotes=quotes, citations=citations, used_contexts=results)
 
-
-# Simple audit logger for the app
-def log_audit(question: str, citations: List[str], paths: Paths = Paths()):
-    os.makedirs(paths.logs_dir, exist_ok=True)
-    log_path = os.path.join(paths.logs_dir, "audit_log.csv")
-    ts = datetime.datetime.utcnow().isoformat()
-    row = f'"{ts}","{question.replace(chr(34), chr(39))}","{"; ".join(citations).replace(chr(34), chr(39))}"\n'
-    header_needed = not os.path.exists(log_path)
-    with open(log_path, "a", encoding="utf-8") as f:
-        if header_needed:
-            f.write("timestamp,question,citations\n")
-        f.write(row)
+def answer_from_results(query: str, results: List[Dict[str, Any]], ok: bool, llm: LLMClient, settings: Settings = Settings()) -> Answer:
+    """Second half of the pipeline, for callers that already ran retrieval."""
+    with metrics.trace() as tr:
+        if not ok:
+            # Guardrail: insufficient
+            res = Answer(text="Insufficient context.", quotes=[], citations=[], used_contexts=[])
+        else:
+            with metrics.stage("pack"):
+                results = pack_context(results, settings)
+            with metrics.stage("prompt"):
+                user_prompt, chosen_quotes = build_prompt(query, results, settings)
+            with metrics.stage("llm"):
+                raw = llm.generate(SYSTEM_PROMPT, user_prompt)
+            with metrics.stage("post"):
+                res = compose_answer(raw, chosen_quotes, results)
+        if tr is not None:
+            res.trace = tr.to_dict()
+    return res
+
+# -------- Answer cache --------
+def _cache_scope(settings: Settings, filters: Optional[Dict[str, Any]] = None) -> str:
+    """Everything besides the index that changes what answer() returns."""
+    key = json.dumps([PROMPT_VERSION, SYSTEM_PROMPT, settings.openai_model, embedding_id(settings),
+                      settings.index_name, settings.top_k, settings.min_sim_threshold,
+                      settings.rerank and [settings.rerank_model, settings.rerank_candidates, settings.rerank_min_score],
+                      settings.context_packing and [settings.context_token_budget, settings.context_candidates,
+                                                    settings.context_score_gap, settings.context_dup_threshold]])
+    fkey = filters_key(normalize_filters(filters))
+    if fkey:
+        key += json.dumps(fkey)  # unfiltered keys stay as they were
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+class _CacheSlot:
+    """Lookup/store handle for one query; a no-op when ANSWER_CACHE is off."""
+
+    def __init__(self, query: str, paths: Paths, settings: Settings, filters: Optional[Dict[str, Any]] = None):
+        self.cache = None
+        if not settings.answer_cache:
+            return
+        self.cache = get_answer_cache(os.path.join(paths.cache_dir, "answers.sqlite"), settings)
+        self.query = query
+        self.qvec = get_embedder(settings.embedding_model, settings).embed(query)  # LRU-cached, reused by retrieve()
+        self.scope = _cache_scope(settings, filters)
+        self.version = get_retriever(paths.artifacts_dir, settings.index_name, settings).version
+
+    def get(self) -> Answer | None:
+        if self.cache is None:
+            return None
+        with metrics.stage("cache_lookup"):
+            payload = self.cache.lookup(self.qvec, self.scope, self.version)
+        if payload is None:
+            return None
+        metrics.incr("answer_cache_hits")
+        return Answer(**payload)
+
+    def put(self, res: Answer):
+        if self.cache is not None and res.citations:  # don't pin guardrail refusals
+            payload = asdict(res)
+            payload.pop("trace", None)  # belongs to the request that produced it
+            payload.pop("audited", None)
+            payload.pop("index_version", None)  # the cache is keyed on it already
+            self.cache.store(self.query, self.qvec, self.scope, self.version, payload)
+
+def answer(query: str, paths: Paths = Paths(), settings: Settings = Settings(),
+           filters: Optional[Dict[str, Any]] = None) -> Answer:
+    """Top-level API used by notebook and app. `filters`: see retriever.retrieve()."""
+    with metrics.trace() as tr:
+        res = _answer(canonical_query(query), paths, settings, filters)
+        if tr is not None:
+            res.trace = tr.to_dict()
+    res.index_version = _index_version(paths, settings)
+    return res
+
+def _index_version(paths: Paths, settings: Settings) -> Optional[str]:
+    """Version of the index already loaded in this process by retrieve()."""
+    try:
+        return get_retriever(paths.artifacts_dir, settings.index_name, settings).version
+    except Exception:
+        return None
+
+def _answer(query: str, paths: Paths, settings: Settings, filters: Optional[Dict[str, Any]] = None) -> Answer:
+    slot = _CacheSlot(query, paths, settings, filters)
+    cached = slot.get()
+    if cached is not None:
+        return cached
+    results, ok = retrieve(query, retrieval_depth(settings), settings.min_sim_threshold, settings, paths.artifacts_dir,
+                           filters=filters)
+    if not ok:
+        # Guardrail: insufficient
+        return Answer(text="Insufficient context.", quotes=[], citations=[], used_contexts=[])
+    res = answer_from_results(query, results, ok, LLMClient(settings), settings)
+    slot.put(res)
+    return res
+
+def answer_stream(query: str, paths: Paths = Paths(), settings: Settings = Settings(),
+                  filters: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming form of answer(). Yields (kind, payload) events in this order:
+      ("results", List[Dict])   retrieved chunks, before the LLM is called
+      ("token", str)            model output, as it arrives (zero or more)
+      ("tail", str)             the quotes + citations block
+      ("answer", Answer)        the same object answer() would have returned
+    A cache hit skips straight from "results" to "answer".
+    """
+    query = canonical_query(query)  # one form for the cache, retrieval and the prompt (see query.py)
+    # The trace is made current only between yields, never across one.
+    tr = metrics.new_trace()
+    with metrics.use_trace(tr):
+        slot = _CacheSlot(query, paths, settings, filters)
+        cached = slot.get()
+    if cached is not None:
+        cached.trace = metrics.finish(tr)
+        cached.index_version = slot.version
+        yield "results", cached.used_contexts
+        yield "answer", cached
+        return
+
+    with metrics.use_trace(tr):
+        results, ok = retrieve(query, retrieval_depth(settings), settings.min_sim_threshold, settings, paths.artifacts_dir,
+                               filters=filters)
+        if ok:
+            with metrics.stage("pack"):
+                results = pack_context(results, settings)
+    yield "results", results
+    if not ok:
+        # Guardrail: insufficient
+        yield "answer", Answer(text="Insufficient context.", quotes=[], citations=[], used_contexts=[],
+                               trace=metrics.finish(tr), index_version=_index_version(paths, settings))
+        return
+
+    with metrics.use_trace(tr):
+        with metrics.stage("prompt"):
+            user_prompt, chosen_quotes = build_prompt(query, results, settings)
+        tokens = LLMClient(settings).generate_stream(SYSTEM_PROMPT, user_prompt)
+    raw_parts: List[str] = []
+    t = time.perf_counter()
+    for token in tokens:
+        raw_parts.append(token)
+        yield "token", token
+
+    with metrics.use_trace(tr):
+        metrics.observe("llm", (time.perf_counter() - t) * 1000)
+        with metrics.stage("post"):
+            res = compose_answer("".join(raw_parts), chosen_quotes, results)
+        slot.put(res)
+    res.trace = metrics.finish(tr)
+    res.index_version = _index_version(paths, settings)
+    yield "tail", "\n\n".join(_tail_parts(res.quotes, res.citations))
+    yield "answer", res
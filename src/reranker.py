@@ -0,0 +1,101 @@
+# src/reranker.py
+from __future__ import annotations
+import hashlib, threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .config import Settings
+from .query import key_hash
+
+def query_key(query: str) -> str:
+    return key_hash(query)
+
+def chunk_key(r: Dict[str, str]) -> str:
+    """Stable across rebuilds (unlike FAISS row IDs): same doc, anchor and text -> same key."""
+    return hashlib.sha1(f"{r['doc_name']}\x1f{r['anchor']}\x1f{r['text']}".encode("utf-8")).hexdigest()[:16]
+
+class CrossEncoderReranker:
+    """
+    One CrossEncoder per process, on CPU. Pairs are scored in a single
+    `predict` call, sorted by length so each batch pads to similar sizes.
+    Scores are kept in a bounded LRU keyed on (query hash, chunk key).
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 4096, batch_size: int = 32, max_length: int = 512):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._predict_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+        with self._predict_lock:  # torch already uses every core; concurrent calls only thrash
+            scores = self.model.predict([pairs[i] for i in order], batch_size=self.batch_size,
+                                        show_progress_bar=False, convert_to_numpy=True)
+        out = np.empty(len(pairs), dtype="float32")
+        out[order] = np.asarray(scores, dtype="float32").reshape(-1)
+        return out
+
+    def score(self, items: Sequence[Tuple[str, Dict[str, str]]]) -> np.ndarray:
+        """Relevance of each (query, chunk) pair; uncached pairs go to the model in one pass."""
+        keys = [(query_key(q), chunk_key(r)) for q, r in items]
+        scores = np.empty(len(items), dtype="float32")
+        todo: Dict[Tuple[str, str], List[int]] = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                s = self._cache.get(key)
+                if s is None:
+                    todo.setdefault(key, []).append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = s
+            self.hits += len(items) - sum(len(v) for v in todo.values())
+            self.misses += len(todo)
+        if todo:
+            firsts = [idx[0] for idx in todo.values()]
+            fresh = self._predict([(items[i][0], items[i][1]["text"]) for i in firsts])
+            with self._cache_lock:
+                for (key, idx), s in zip(todo.items(), fresh.tolist()):
+                    scores[idx] = s
+                    if self.cache_size > 0:
+                        self._cache[key] = s
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+_rerankers: Dict[str, CrossEncoderReranker] = {}
+_rerankers_lock = threading.Lock()
+
+def get_reranker(settings: Settings = Settings()) -> CrossEncoderReranker:
+    """Return the process-wide reranker for settings.rerank_model."""
+    name = settings.rerank_model
+    rr = _rerankers.get(name)
+    if rr is None:
+        with _rerankers_lock:
+            rr = _rerankers.get(name)
+            if rr is None:
+                rr = CrossEncoderReranker(name, settings.rerank_cache_size, settings.rerank_batch_size)
+                _rerankers[name] = rr
+    return rr
@@ -1,72 +1,532 @@
 # src/retriever.py
 from __future__ import annotations
-import os
-from typing import List, Dict, Any, Tuple
+import os, sys, json, threading, time
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional
 
 import numpy as np
 
 from .config import Settings
-from .utils import ensure_dir
+from .embedder import get_embedder
+from . import metrics
+from .metastore import MetaStore, META_BIN_FILE
+from .lexical import LexicalIndex, LEXICAL_FILE, rrf_fuse
+from .query import canonical_query
+from .shards import (DOCS_FILE, SHARDS_DIR, SHARDS_FILE, filters_key, load_docs, load_shards, may_match,
+                     normalize_filters, selected_rows)
+from .utils import ensure_dir, quote_text
 
-def _embed_query(text: str, model_name: str) -> np.ndarray:
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(model_name)
-    vec = model.encode([text], normalize_embeddings=True)
-    return vec.astype("float32")  # shape: (1, dim)
+INDEX_FILE = "index.faiss"
+META_FILE = "metadata.jsonl"
+_SETTLE_SECONDS = 0.5  # a swap waits until ingest has stopped touching the files
 
-def load_index(artifacts_dir: str, index_name: str):
+def _embed_query(text: str, settings: Settings) -> np.ndarray:
+    vec = get_embedder(settings.embedding_model, settings).embed(text)
+    return vec.reshape(1, -1)  # shape: (1, dim)
+
+# -------- Metadata store --------
+class MetadataStore:
+    """Column-wise chunk metadata. doc_name/anchor are interned, so repeated
+    values share one string object instead of one per row."""
+    __slots__ = ("doc_names", "anchors", "texts", "spans")
+
+    def __init__(self, doc_names: List[str], anchors: List[str], texts: List[str],
+                 spans: Optional[List[Tuple[List[int], List[List[int]]]]] = None):
+        self.doc_names = tuple(doc_names)
+        self.anchors = tuple(anchors)
+        self.texts = tuple(texts)
+        self.spans = tuple(spans) if spans is not None else None  # (sentences, quotes) per row
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "MetadataStore":
+        docs, anchors, texts, spans = [], [], [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    docs.append(sys.intern(rec["doc_name"]))
+                    anchors.append(sys.intern(rec["anchor"]))
+                    texts.append(rec["text"])
+                    spans.append((rec.get("sentences", []), rec.get("quotes", [])))
+        has_spans = any(sent or quotes for sent, quotes in spans)
+        return cls(docs, anchors, texts, spans if has_spans else None)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def get(self, i: int) -> Dict[str, Any]:
+        rec = {"doc_name": self.doc_names[i], "anchor": self.anchors[i], "text": self.texts[i]}
+        if self.spans is not None:
+            sentences, quotes = self.spans[i]
+            rec["sentences"] = list(sentences)
+            rec["quotes"] = [quote_text(rec["text"], q) for q in quotes]
+        return rec
+
+def read_index(path: str, mmap: bool = True):
+    """faiss.read_index, memory-mapped when the installed faiss supports it (pages load on demand)."""
+    import faiss
+
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None) if mmap else None
+    if flag is not None:
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            pass  # index type without mmap support
+    return faiss.read_index(path)
+
+# -------- Resident retriever --------
+def _lap(timings: Optional[Dict[str, float]], stage: str, start: float):
+    """Add milliseconds since `start` to timings[stage] and to the request trace."""
+    ms = (time.perf_counter() - start) * 1000.0
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + ms
+    metrics.observe(stage, ms)
+
+class _Selection:
+    """Rows allowed by one filter, in the forms each search path needs."""
+    __slots__ = ("rows", "mask", "vectors", "_selector")
+
+    def __init__(self, rows: np.ndarray, n: int):
+        self.rows = rows
+        self.mask = np.zeros(n, dtype=bool)
+        self.mask[rows] = True
+        self.vectors: Optional[np.ndarray] = None  # for exact search over small selections
+        self._selector = None
+
+    def selector(self):
+        if self._selector is None:
+            import faiss
+            self._selector = faiss.IDSelectorBatch(self.rows)  # must outlive the SearchParameters using it
+        return self._selector
+
+_MAX_SELECTIONS = 16  # cached filters per snapshot (least recently used evicted)
+
+class _Snapshot:
+    """
+    One fully loaded (index, metadata, lexical, docs) set. Never mutated after
+    creation, apart from memoized per-filter selections.
+    """
+    __slots__ = ("index", "meta", "lexical", "docs", "signature", "version", "selections", "_selections_lock")
+
+    def __init__(self, index, meta, lexical: Optional[LexicalIndex], docs: Optional[List[Dict[str, Any]]],
+                 signature: Tuple, version: str):
+        self.index = index
+        self.meta = meta
+        self.lexical = lexical
+        self.docs = docs
+        self.signature = signature
+        self.version = version
+        self.selections: "OrderedDict[Tuple, _Selection]" = OrderedDict()
+        self._selections_lock = threading.Lock()
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """docs.json entries; for indexes built before it, untagged row ranges read from the metadata."""
+        if self.docs is None:
+            docs: List[Dict[str, Any]] = []
+            for i in range(len(self.meta)):
+                name = self.meta.get(i)["doc_name"]
+                if docs and docs[-1]["doc_name"] == name:
+                    docs[-1]["count"] += 1
+                else:
+                    docs.append({"doc_name": name, "start": i, "count": 1})
+            self.docs = docs
+        return self.docs
+
+    def select(self, filters) -> Optional[_Selection]:
+        """Rows matching normalized `filters`, or None for no filter."""
+        if not filters:
+            return None
+        key = filters_key(filters)
+        with self._selections_lock:
+            sel = self.selections.get(key)
+            if sel is not None:
+                self.selections.move_to_end(key)
+                return sel
+        ranges = selected_rows(self.documents(), filters)
+        rows = np.concatenate([np.arange(a, b, dtype="int64") for a, b in ranges]) if ranges \
+            else np.zeros(0, dtype="int64")
+        sel = _Selection(rows, len(self.meta))
+        with self._selections_lock:
+            sel = self.selections.setdefault(key, sel)  # another thread may have built it meanwhile
+            self.selections.move_to_end(key)
+            while len(self.selections) > _MAX_SELECTIONS:
+                self.selections.popitem(last=False)
+        return sel
+
+def _exact_search(index, qvecs: np.ndarray, sel: _Selection, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force inner product over the selected rows; same output shapes as index.search."""
+    if sel.vectors is None:
+        sel.vectors = index.reconstruct_batch(sel.rows)
+    sims = qvecs @ sel.vectors.T  # (n, rows)
+    k_eff = min(k, sims.shape[1])
+    top = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+    order = np.take_along_axis(sims, top, axis=1).argsort(axis=1)[:, ::-1]
+    top = np.take_along_axis(top, order, axis=1)
+    scores = np.full((len(qvecs), k), -np.inf, dtype="float32")
+    idxs = np.full((len(qvecs), k), -1, dtype="int64")
+    scores[:, :k_eff] = np.take_along_axis(sims, top, axis=1)
+    idxs[:, :k_eff] = sel.rows[top]
+    return scores, idxs
+
+class Retriever:
     """
-    Reads:
-      artifacts/{index_name}/index.faiss
-      artifacts/{index_name}/metadata.jsonl
-    Returns: (faiss.Index, List[Dict])
+    Long-lived view over artifacts/{index_name}/. Loads the index and metadata
+    (metadata.bin, memory-mapped, or metadata.jsonl for older builds) once, then re-checks file mtimes/sizes at most every `check_interval` seconds.
+    A rebuilt index is loaded on the side and swapped in with a single attribute
+    assignment, so concurrent searches always see a complete snapshot.
     """
-    import faiss, json
 
-    folder = os.path.join(artifacts_dir, index_name)
-    index_path = os.path.join(folder, "index.faiss")
-    meta_path = os.path.join(folder, "metadata.jsonl")
+    def __init__(self, artifacts_dir: str, index_name: str, settings: Settings = Settings()):
+        self.folder = os.path.join(artifacts_dir, index_name)
+        self.settings = settings
+        self.check_interval = settings.index_check_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._last_check = 0.0
+        self._load_lock = threading.Lock()
+
+    def _files(self) -> Tuple[str, ...]:
+        # Prefer the memory-mapped store; indexes built before it existed still load from JSONL.
+        meta = META_BIN_FILE if os.path.exists(os.path.join(self.folder, META_BIN_FILE)) else META_FILE
+        optional = tuple(n for n in (LEXICAL_FILE, DOCS_FILE) if os.path.exists(os.path.join(self.folder, n)))
+        return (INDEX_FILE, meta) + optional
+
+    def _signature(self) -> Tuple:
+        sig = []
+        for name in self._files():
+            st = os.stat(os.path.join(self.folder, name))
+            sig.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _settled(self) -> bool:
+        newest = max(os.stat(os.path.join(self.folder, n)).st_ctime for n in self._files())
+        return time.time() - newest >= _SETTLE_SECONDS
+
+    def _load(self, signature: Tuple) -> Optional[_Snapshot]:
+        import faiss, hashlib
+        from .ann import apply_search_params
+
+        index = apply_search_params(read_index(os.path.join(self.folder, INDEX_FILE), self.settings.index_mmap),
+                                    self.settings)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()  # lets hybrid search reconstruct vectors of lexical-only hits (bundles ship it)
+        meta_name = signature[1][0]
+        meta_path = os.path.join(self.folder, meta_name)
+        meta = MetaStore(meta_path) if meta_name == META_BIN_FILE else MetadataStore.from_jsonl(meta_path)
+        names = {name for name, _, _ in signature}
+        lexical = None
+        if LEXICAL_FILE in names:
+            lexical = LexicalIndex(os.path.join(self.folder, LEXICAL_FILE), self.settings.bm25_k1, self.settings.bm25_b)
+        docs = load_docs(self.folder) if DOCS_FILE in names else None
+        # Files changed while we were reading them, or index/metadata disagree:
+        # ingest is mid-write, keep serving the old snapshot.
+        if self._signature() != signature or index.ntotal != len(meta) \
+                or (lexical is not None and len(lexical) != len(meta)) \
+                or (docs is not None and sum(d["count"] for d in docs) != len(meta)):
+            return None
+        version = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:12]
+        return _Snapshot(index, meta, lexical, docs, signature, version)
+
+    def snapshot(self) -> _Snapshot:
+        snap = self._snapshot
+        now = time.monotonic()
+        if snap is not None and now - self._last_check < self.check_interval:
+            return snap
+        with self._load_lock:
+            snap = self._snapshot
+            if snap is not None and now - self._last_check < self.check_interval:
+                return snap
+            try:
+                signature = self._signature()
+            except FileNotFoundError:
+                if snap is None:
+                    raise FileNotFoundError("Index or metadata not found. Run ingestion first.")
+                return snap
+            if snap is not None and signature != snap.signature and not self._settled():
+                return snap  # files still being replaced; look again on the next call
+            self._last_check = now
+            if snap is None or signature != snap.signature:
+                with metrics.stage("load_index"):
+                    fresh = self._load(signature)
+                if fresh is not None:
+                    self._snapshot = snap = fresh  # atomic swap
+                elif snap is None:
+                    raise RuntimeError(f"Index at {self.folder} is being rebuilt; try again shortly.")
+            return snap
+
+    @property
+    def version(self) -> str:
+        return self.snapshot().version
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Indexed documents with their tags (docs.json)."""
+        return self.snapshot().documents()
+
+    def search(self, qvec: np.ndarray, top_k: int, query: Optional[str] = None,
+               timings: Optional[Dict[str, float]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many(qvec, top_k, [query] if query is not None else None, timings, filters)[0]
+
+    def search_many(self, qvecs: np.ndarray, top_k: int, queries: Optional[List[str]] = None,
+                    timings: Optional[Dict[str, float]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        One index.search for n queries. qvecs shape (n, dim) -> n result lists.
+        When `queries` are given and the index has a lexical.npz, BM25 runs
+        alongside and the two rankings are merged by reciprocal-rank fusion.
+        With `filters` (see shards.py) only rows of matching documents are
+        searched: exactly when there are at most FILTER_EXACT_MAX of them,
+        otherwise through a FAISS ID selector.
+        """
+        snap = self.snapshot()
+        sel = snap.select(normalize_filters(filters))
+        if sel is not None and not len(sel.rows):
+            return [[] for _ in range(len(qvecs))]
+        hybrid = queries is not None and snap.lexical is not None
+        fetch_k = max(top_k, self.settings.hybrid_candidates) if hybrid else top_k
+        t = time.perf_counter()
+        if sel is None:
+            scores, idxs = snap.index.search(qvecs, fetch_k)  # scores shape (n, k), idxs shape (n, k)
+        else:
+            from .ann import search_params
+            params = None
+            if len(sel.rows) > self.settings.filter_exact_max:
+                params = search_params(snap.index, sel.selector())
+            if params is None:
+                scores, idxs = _exact_search(snap.index, qvecs, sel, fetch_k)
+            else:
+                scores, idxs = snap.index.search(qvecs, fetch_k, params=params)
+        _lap(timings, "dense_search", t)
+        out: List[List[Dict[str, Any]]] = []
+        for n, (row_scores, row_idxs) in enumerate(zip(scores, idxs)):
+            dense = [(int(i), float(sc)) for sc, i in zip(row_scores, row_idxs) if i >= 0]
+            if not hybrid:
+                hits = [(i, sc, {}) for i, sc in dense[:top_k]]
+            else:
+                hits = self._fuse(snap, qvecs[n], queries[n], dense, fetch_k, top_k, timings, sel)
+            results: List[Dict[str, Any]] = []
+            for i, sc, extra in hits:
+                rec = snap.meta.get(i)
+                rec["score"] = sc
+                rec.update(extra)
+                results.append(rec)
+            out.append(results)
+        return out
 
-    if not (os.path.exists(index_path) and os.path.exists(meta_path)):
-        raise FileNotFoundError("Index or metadata not found. Run ingestion first.")
+    def _fuse(self, snap: _Snapshot, qvec: np.ndarray, query: str, dense: List[Tuple[int, float]],
+              fetch_k: int, top_k: int, timings: Optional[Dict[str, float]],
+              sel: Optional[_Selection] = None) -> List[Tuple[int, float, Dict[str, float]]]:
+        t = time.perf_counter()
+        lex_ids, lex_scores = snap.lexical.search(query, fetch_k, sel.mask if sel is not None else None)
+        _lap(timings, "bm25", t)
+        t = time.perf_counter()
+        bm25 = dict(zip(lex_ids.tolist(), lex_scores.tolist()))
+        fused = rrf_fuse([[i for i, _ in dense], lex_ids.tolist()], k=self.settings.rrf_k)[:top_k]
+        cosine = dict(dense)
+        missing = [i for i, _ in fused if i not in cosine]
+        if missing:
+            # Lexical-only hits get their exact cosine, so the MIN_SIM guardrail still applies.
+            vecs = snap.index.reconstruct_batch(np.array(missing, dtype="int64"))
+            cosine.update(zip(missing, (vecs @ qvec).tolist()))
+        hits = [(i, float(cosine[i]), {"bm25": float(bm25.get(i, 0.0)), "rrf": rrf}) for i, rrf in fused]
+        _lap(timings, "fusion", t)
+        return hits
 
-    index = faiss.read_index(index_path)
+# -------- Sharded index --------
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
 
-    records: List[Dict[str, Any]] = []
-    with open(meta_path, "r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                records.append(json.loads(line))
-    return index, records
+def _get_shard_pool(workers: int):
+    global _shard_pool
+    if _shard_pool is None:
+        with _shard_pool_lock:
+            if _shard_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _shard_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-search")
+    return _shard_pool
 
-def retrieve(query: str, top_k: int, min_sim_threshold: float, settings: Settings, artifacts_dir: str) -> Tuple[List[Dict[str, Any]], bool]:
+def merge_shard_results(lists: List[List[Dict[str, Any]]], top_k: int, hybrid: bool, rrf_k: int = 60) -> List[Dict[str, Any]]:
+    """
+    One ranking from several shards' candidates: by cosine, or for hybrid
+    search by RRF over the merged cosine order and each shard's own fused
+    order. Only ranks cross shards: BM25 (and so RRF) scores use per-shard
+    IDF and are not comparable between shards.
+    """
+    if len(lists) == 1:
+        return lists[0][:top_k]
+    pool = [r for results in lists for r in results]
+    if not hybrid:
+        return sorted(pool, key=lambda r: -r["score"])[:top_k]
+    dense = sorted(range(len(pool)), key=lambda i: -pool[i]["score"])
+    shard_orders, start = [], 0
+    for results in lists:  # each already in its shard's fused order
+        shard_orders.append(list(range(start, start + len(results))))
+        start += len(results)
+    return [{**pool[i], "rrf": rrf} for i, rrf in rrf_fuse([dense] + shard_orders, k=rrf_k)[:top_k]]
+
+class ShardedRetriever:
+    """
+    Search over artifacts/{index_name}/shards/* (see shards.py), one Retriever
+    per shard. Shards a filter rules out by shards.json are never opened; the
+    rest are searched in parallel (FAISS releases the GIL) and their
+    candidates merged into one top-k. Same interface as Retriever.
+    """
+
+    def __init__(self, artifacts_dir: str, index_name: str, settings: Settings = Settings()):
+        self.folder = os.path.join(artifacts_dir, index_name)
+        self.settings = settings
+        self._layout: Dict[str, Any] = {}
+        self._stamp = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def shards(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        if self._stamp is None or now - self._last_check >= self.settings.index_check_interval:
+            with self._lock:
+                st = os.stat(os.path.join(self.folder, SHARDS_FILE))
+                stamp = (st.st_mtime_ns, st.st_size)
+                if stamp != self._stamp:
+                    self._layout = (load_shards(self.folder) or {}).get("shards", {})
+                    self._stamp = stamp
+                self._last_check = now
+        return self._layout
+
+    def shard(self, name: str) -> Retriever:
+        return get_retriever(os.path.join(self.folder, SHARDS_DIR), name, self.settings)
+
+    def snapshot(self) -> List[_Snapshot]:
+        """Load every shard (warm-up)."""
+        return [self.shard(name).snapshot() for name in self.shards()]
+
+    def documents(self) -> List[Dict[str, Any]]:
+        return [d for name in self.shards() for d in self.shard(name).documents()]
+
+    @property
+    def version(self) -> str:
+        import hashlib
+        versions = sorted((name, self.shard(name).version) for name in self.shards())
+        return hashlib.sha1(repr(versions).encode("utf-8")).hexdigest()[:12]
+
+    def search(self, qvec: np.ndarray, top_k: int, query: Optional[str] = None,
+               timings: Optional[Dict[str, float]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self.search_many(qvec, top_k, [query] if query is not None else None, timings, filters)[0]
+
+    def search_many(self, qvecs: np.ndarray, top_k: int, queries: Optional[List[str]] = None,
+                    timings: Optional[Dict[str, float]] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        filters = normalize_filters(filters)
+        names = [name for name, info in self.shards().items() if may_match(info, filters)]
+        if not names:
+            return [[] for _ in range(len(qvecs))]
+        hybrid = queries is not None
+        fetch_k = max(top_k, self.settings.hybrid_candidates) if hybrid and len(names) > 1 else top_k
+
+        def one(name):
+            return self.shard(name).search_many(qvecs, fetch_k, queries, None, filters)
+
+        t = time.perf_counter()
+        if len(names) == 1:
+            per_shard = [one(names[0])]
+        else:
+            per_shard = list(_get_shard_pool(self.settings.shard_workers).map(one, names))
+        _lap(timings, "dense_search", t)
+        t = time.perf_counter()
+        out = [merge_shard_results([res[n] for res in per_shard], top_k, hybrid, self.settings.rrf_k)
+               for n in range(len(qvecs))]
+        _lap(timings, "fusion", t)
+        return out
+
+_retrievers: Dict[str, Any] = {}
+_retrievers_lock = threading.Lock()
+
+def get_retriever(artifacts_dir: str, index_name: str, settings: Settings = Settings()):
+    """
+    Return the process-wide Retriever for this index (shared by all sessions/threads),
+    or a ShardedRetriever when ingest wrote a shards.json there.
+    """
+    folder = os.path.abspath(os.path.join(artifacts_dir, index_name))
+    cls = ShardedRetriever if os.path.exists(os.path.join(folder, SHARDS_FILE)) else Retriever
+    key = (folder, cls.__name__)
+    r = _retrievers.get(key)
+    if r is None:
+        with _retrievers_lock:
+            r = _retrievers.get(key)
+            if r is None:
+                r = cls(artifacts_dir, index_name, settings)
+                _retrievers[key] = r
+    return r
+
+def rerank(items: List[Tuple[str, List[Dict[str, Any]]]], top_k: int,
+           settings: Settings) -> List[List[Dict[str, Any]]]:
+    """
+    Reorder each query's candidates by cross-encoder score (all pairs in one
+    batched pass) and keep the best top_k, dropping those under
+    RERANK_MIN_SCORE. `score` stays the cosine, so the guardrail is unchanged.
+    """
+    from .reranker import get_reranker
+
+    pairs = [(q, r) for q, results in items for r in results]
+    scores = iter(get_reranker(settings).score(pairs).tolist()) if pairs else iter(())
+    out = []
+    for _, results in items:
+        scored = sorted(((next(scores), n, r) for n, r in enumerate(results)), key=lambda x: (-x[0], x[1]))
+        kept = []
+        for sc, _, r in scored[:top_k]:
+            if kept and settings.rerank_min_score is not None and sc < settings.rerank_min_score:
+                break
+            kept.append({**r, "rerank": sc})
+        out.append(kept)
+    return out
+
+def _passes_guardrail(results: List[Dict[str, Any]], min_sim_threshold: float) -> bool:
+    # Fused results are ordered by rank, not cosine, so check the best cosine.
+    return len(results) > 0 and max(r["score"] for r in results) >= min_sim_threshold
+
+def retrieve(query: str, top_k: int, min_sim_threshold: float, settings: Settings, artifacts_dir: str,
+             timings: Optional[Dict[str, float]] = None,
+             filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
     """
     Returns (results, ok)
-      results: list of dicts with keys: doc_name, anchor, text, score
+      results: list of dicts with keys: doc_name, anchor, text, score (+ bm25, rrf when hybrid; rerank;
+               + sentences, quotes for indexes built with precomputed quote candidates)
       ok: True if best score >= threshold and results not empty
+    If `timings` is a dict, per-stage milliseconds are added to it
+    (embed, dense_search, bm25, fusion, rerank).
+    `filters` restricts the search to matching documents, e.g.
+    {"jurisdiction": "VARA"} or {"doc_name": ["FATF_Recommendations.pdf"]} (see shards.py).
+    The query is searched in its canonical form (see query.py).
     """
-    # Load index + metadata
-    index, records = load_index(artifacts_dir, settings.index_name)
+    query = canonical_query(query)
+    retriever = get_retriever(artifacts_dir, settings.index_name, settings)
 
     # Embed query
-    qvec = _embed_query(query, settings.embedding_model)  # (1, dim)
-
-    # Search
-    scores, idxs = index.search(qvec, top_k)  # scores shape (1, k), idxs shape (1, k)
-    scores = scores[0]
-    idxs = idxs[0]
-
-    results: List[Dict[str, Any]] = []
-    for score, i in zip(scores, idxs):
-        if i < 0:
-            continue
-        rec = records[int(i)]
-        results.append({
-            "doc_name": rec["doc_name"],
-            "anchor": rec["anchor"],
-            "text": rec["text"],
-            "score": float(score),
-        })
-
-    ok = len(results) > 0 and (results[0]["score"] >= min_sim_threshold)
+    t = time.perf_counter()
+    qvec = _embed_query(query, settings)  # (1, dim)
+    _lap(timings, "embed", t)
+
+    # Search (dense, plus BM25 + fusion when the index has a lexical.npz)
+    fetch_k = max(top_k, settings.rerank_candidates) if settings.rerank else top_k
+    results = retriever.search(qvec, fetch_k, query if settings.hybrid else None, timings, filters)
+
+    # Optional cross-encoder rerank of the wider candidate set
+    if settings.rerank:
+        t = time.perf_counter()
+        results = rerank([(query, results)], top_k, settings)[0]
+        _lap(timings, "rerank", t)
+
+    ok = _passes_guardrail(results, min_sim_threshold)
     return results, ok
+
+def retrieve_many(queries: List[str], top_k: int, min_sim_threshold: float, settings: Settings, artifacts_dir: str,
+                  filters: Optional[Dict[str, Any]] = None) -> List[Tuple[List[Dict[str, Any]], bool]]:
+    """Batch form of retrieve(): one encode call and one index.search for all queries."""
+    if not queries:
+        return []
+    queries = [canonical_query(q) for q in queries]
+    retriever = get_retriever(artifacts_dir, settings.index_name, settings)
+    qvecs = get_embedder(settings.embedding_model, settings).embed_many(queries)  # (n, dim)
+    fetch_k = max(top_k, settings.rerank_candidates) if settings.rerank else top_k
+    batch = retriever.search_many(qvecs, fetch_k, queries if settings.hybrid else None, None, filters)
+    if settings.rerank:
+        batch = rerank(list(zip(queries, batch)), top_k, settings)
+    return [(results, _passes_guardrail(results, min_sim_threshold)) for results in batch]
@@ -0,0 +1,305 @@
+# src/service.py
+"""
+Headless HTTP API for ComplianceBot (stdlib asyncio, no web framework).
+
+    python -m src.service --port 8080
+
+    POST /v1/answer          {"question": "...", "filters": {...}?} -> Answer as JSON
+    POST /v1/answer/stream   {"question": "..."} -> text/event-stream: results, token*, tail, answer
+    GET  /healthz            index version, runs in flight, queue capacity
+    GET  /metrics            Prometheus text (with METRICS=1)
+
+Every request shares one warm retriever, embedder and LLM client. Pipeline
+runs go to a pool of SERVICE_WORKERS threads; once that many are running and
+SERVICE_QUEUE_SIZE more are waiting, new questions get 503 + Retry-After.
+Questions with the same dedup key (src/query.py) in flight share one run:
+later callers replay the events produced so far and then follow the live
+stream. Each run is audited once (src/audit.py, source "api"); each caller
+that joined a run gets a "duplicate" record.
+"""
+from __future__ import annotations
+import json, time, asyncio, argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from . import metrics
+from .config import Paths, Settings
+from .query import dedup_key
+from .llm import is_api_error, is_busy_error
+from .shards import filters_key, normalize_filters
+
+MAX_BODY = 64 * 1024
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway",
+            503: "Service Unavailable", 504: "Gateway Timeout"}
+
+class _Flight:
+    """One pipeline run and every request waiting on it. Touched only from the event loop."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, event: Tuple[str, Any]):
+        self.events.append(event)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException]):
+        self.done, self.error = True, error
+        self._wake()
+
+    async def follow(self) -> AsyncIterator[Tuple[str, Any]]:
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class AnswerService:
+    def __init__(self, paths: Paths = Paths(), settings: Settings = Settings()):
+        self.paths = paths
+        self.settings = settings
+        self.pool = ThreadPoolExecutor(max_workers=settings.service_workers, thread_name_prefix="answer")
+        self.capacity = settings.service_workers + settings.service_queue_size
+        self.flights: Dict[Tuple, _Flight] = {}
+        self.admitted = 0  # runs queued or in progress
+        self.counts = {"requests": 0, "runs": 0, "coalesced": 0, "rejected": 0}
+
+    # -------- warm-up --------
+    async def warm(self):
+        from .warmup import warmup
+        await asyncio.get_running_loop().run_in_executor(self.pool, warmup, self.paths, self.settings)
+
+    # -------- admission + coalescing --------
+    def submit(self, question: str, filters: Optional[Dict[str, Any]] = None) -> Tuple[Optional[_Flight], bool]:
+        """(flight, coalesced), or (None, False) when the queue is full. `filters` must be normalized."""
+        self.counts["requests"] += 1
+        key = (dedup_key(question), filters_key(filters))
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.counts["coalesced"] += 1
+            metrics.incr("service_coalesced")
+            from .audit import audit_duplicate
+            audit_duplicate(question, "coalesced", "api", self.paths, self.settings,
+                            filters={k: sorted(v) for k, v in filters.items()} if filters else None)
+            return flight, True
+        if self.admitted >= self.capacity:
+            self.counts["rejected"] += 1
+            metrics.incr("service_rejected")
+            return None, False
+        flight = self.flights[key] = _Flight()
+        self.admitted += 1
+        self.counts["runs"] += 1
+        loop = asyncio.get_running_loop()
+
+        def run():
+            from .rag import answer_stream
+            from .audit import audit_answer
+            error = None
+            t0 = time.perf_counter()
+            try:
+                for event in answer_stream(question, self.paths, self.settings, filters):
+                    if event[0] == "answer":
+                        audit_answer(question, event[1], (time.perf_counter() - t0) * 1000.0, "api",
+                                     self.paths, self.settings,
+                                     filters={k: sorted(v) for k, v in filters.items()} if filters else None)
+                        event[1].audited = True  # clients must not log it again
+                    loop.call_soon_threadsafe(flight.push, event)
+            except BaseException as e:
+                error = e
+            loop.call_soon_threadsafe(self._finish, key, flight, error)
+
+        self.pool.submit(run)
+        return flight, False
+
+    def _finish(self, key: Tuple, flight: _Flight, error: Optional[BaseException]):
+        flight.finish(error)
+        if self.flights.get(key) is flight:
+            del self.flights[key]  # later repeats are served by the answer cache
+        self.admitted -= 1
+
+    def health(self) -> Dict[str, Any]:
+        from .retriever import get_retriever
+        try:
+            version = get_retriever(self.paths.artifacts_dir, self.settings.index_name, self.settings).version
+        except Exception as e:
+            version = f"unavailable: {e}"
+        return {"status": "ok", "index_version": version, "in_flight": self.admitted,
+                "capacity": self.capacity, **self.counts}
+
+    # -------- HTTP --------
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    await _send_json(writer, request, {"error": _REASONS[request]}, keep_alive=False)
+                    break
+                if not await self._route(writer, *request):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, writer, method: str, path: str, keep_alive: bool, body: bytes) -> bool:
+        path = path.split("?", 1)[0]
+        if path == "/healthz" and method == "GET":
+            await _send_json(writer, 200, self.health(), keep_alive)
+            return keep_alive
+        if path == "/metrics" and method == "GET":
+            await _send(writer, 200, metrics.render_prometheus().encode("utf-8"),
+                        "text/plain; version=0.0.4", keep_alive)
+            return keep_alive
+        if path not in ("/v1/answer", "/v1/answer/stream"):
+            await _send_json(writer, 404, {"error": "not found"}, keep_alive)
+            return keep_alive
+        if method != "POST":
+            await _send_json(writer, 405, {"error": "use POST"}, keep_alive)
+            return keep_alive
+        try:
+            payload = json.loads(body or b"{}")
+            question = payload.get("question", "")
+        except (ValueError, AttributeError):
+            question = None
+        if not isinstance(question, str) or not question.strip():
+            await _send_json(writer, 400, {"error": "body must be JSON with a non-empty 'question'"}, keep_alive)
+            return keep_alive
+        try:
+            filters = normalize_filters(payload.get("filters"))
+        except (ValueError, TypeError, AttributeError) as e:
+            await _send_json(writer, 400, {"error": f"bad 'filters': {e}"}, keep_alive)
+            return keep_alive
+
+        flight, coalesced = self.submit(question, filters)
+        if flight is None:
+            await _send_json(writer, 503, {"error": "busy, retry shortly"}, keep_alive, {"Retry-After": "1"})
+            return keep_alive
+        headers = {"X-Coalesced": "1" if coalesced else "0"}
+        if path == "/v1/answer/stream":
+            await self._stream(writer, flight, headers)
+            return False
+        try:
+            answer = await asyncio.wait_for(_final_answer(flight), self.settings.service_request_timeout)
+        except asyncio.TimeoutError:
+            await _send_json(writer, 504, {"error": "timed out"}, keep_alive)
+            return keep_alive
+        except Exception as e:
+            status, extra = _error_status(e)
+            await _send_json(writer, status, {"error": f"{e.__class__.__name__}: {e}"}, keep_alive, extra)
+            return keep_alive
+        await _send_json(writer, 200, asdict(answer), keep_alive, headers)
+        return keep_alive
+
+    async def _stream(self, writer, flight: _Flight, headers: Dict[str, str]):
+        head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache", "Connection: close"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        try:
+            async for kind, payload in flight.follow():
+                data = asdict(payload) if kind == "answer" else payload
+                writer.write(_sse(kind, data))
+                await writer.drain()
+        except ConnectionError:
+            raise  # client went away; the run carries on for anyone else following it
+        except Exception as e:
+            writer.write(_sse("error", {"error": f"{e.__class__.__name__}: {e}", "busy": _error_status(e)[0] == 503}))
+        await writer.drain()
+
+async def _final_answer(flight: _Flight):
+    answer = None
+    async for kind, payload in flight.follow():
+        if kind == "answer":
+            answer = payload
+    return answer
+
+def _error_status(e: BaseException) -> Tuple[int, Dict[str, str]]:
+    if is_busy_error(e):
+        return 503, {"Retry-After": "5"}
+    if is_api_error(e):
+        return 502, {}
+    return 500, {}
+
+def _sse(kind: str, data: Any) -> bytes:
+    return f"event: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def _read_request(reader: asyncio.StreamReader):
+    """(method, path, keep_alive, body), None at EOF, or an HTTP error status."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode("latin-1").split()
+    except ValueError:
+        return 400
+    headers: Dict[str, str] = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        return 400
+    if length < 0:
+        return 400
+    if length > MAX_BODY:
+        return 413
+    body = await reader.readexactly(length) if length else b""
+    conn = headers.get("connection", "").lower()
+    keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+    return method.upper(), path, keep_alive, body
+
+async def _send(writer, status: int, body: bytes, content_type: str, keep_alive: bool,
+                headers: Optional[Dict[str, str]] = None):
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+async def _send_json(writer, status: int, obj: Any, keep_alive: bool, headers: Optional[Dict[str, str]] = None):
+    await _send(writer, status, json.dumps(obj, ensure_ascii=False).encode("utf-8"),
+                "application/json", keep_alive, headers)
+
+async def serve(host: str, port: int, paths: Paths = Paths(), settings: Settings = Settings(),
+                ready: Optional[asyncio.Future] = None):
+    service = AnswerService(paths, settings)
+    if settings.warmup:
+        await service.warm()
+    server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+    if ready is not None:
+        ready.set_result(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+def main():
+    settings = Settings()
+    parser = argparse.ArgumentParser(description="Serve ComplianceBot over HTTP.")
+    parser.add_argument("--host", default=settings.service_host)
+    parser.add_argument("--port", type=int, default=settings.service_port)
+    args = parser.parse_args()
+    print(f"ComplianceBot API on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port, Paths(), settings))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# src/shards.py
+"""
+Document tags, search filters and the sharded index layout.
+
+Tags come from docs/tags.json, which maps path globs (relative to docs/) to
+tags; later patterns override earlier ones:
+
+    {"FATF_*.pdf": {"jurisdiction": "FATF", "doc_type": "recommendations"},
+     "uae/*":      {"jurisdiction": "VARA"}}
+
+Documents in a subfolder default to that folder as their jurisdiction.
+
+Every index folder has a docs.json that records each document's tags and row
+range. With SHARD_BY=jurisdiction (or doc_type, doc), ingest writes one
+index per tag value:
+
+    artifacts/{index_name}/shards.json
+    artifacts/{index_name}/shards/{shard}/index.faiss, metadata.bin, docs.json, ...
+
+A filter is {"doc_name" | "jurisdiction" | "doc_type": value or [values]}.
+Values are matched case-insensitively, and all keys must match.
+"""
+from __future__ import annotations
+import os, re, json, fnmatch
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+TAGS_FILE = "tags.json"
+DOCS_FILE = "docs.json"
+SHARDS_FILE = "shards.json"
+SHARDS_DIR = "shards"
+TAG_KEYS = ("jurisdiction", "doc_type")
+FILTER_KEYS = ("doc_name",) + TAG_KEYS
+
+Filters = Dict[str, FrozenSet[str]]
+
+# -------- Tags --------
+def load_tag_rules(docs_dir: str) -> List[Tuple[str, Dict[str, str]]]:
+    path = os.path.join(docs_dir, TAGS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [(pattern, {k: str(v) for k, v in tags.items() if k in TAG_KEYS}) for pattern, tags in json.load(f).items()]
+
+def doc_tags(rel_path: str, rules: List[Tuple[str, Dict[str, str]]]) -> Dict[str, str]:
+    """Tags for one document (path relative to docs/)."""
+    tags = {k: "" for k in TAG_KEYS}
+    if "/" in rel_path:
+        tags["jurisdiction"] = rel_path.split("/", 1)[0]
+    for pattern, rule in rules:
+        if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(os.path.basename(rel_path), pattern):
+            tags.update(rule)
+    return tags
+
+def shard_name(value: str) -> str:
+    """Folder name for a shard key value."""
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or "untagged"
+
+def shard_key(rel_path: str, tags: Dict[str, str], shard_by: str) -> str:
+    if shard_by == "doc":
+        return shard_name(os.path.splitext(os.path.basename(rel_path))[0])
+    if shard_by not in TAG_KEYS:
+        raise ValueError(f"SHARD_BY must be empty, doc or one of {', '.join(TAG_KEYS)}; got {shard_by!r}")
+    return shard_name(tags.get(shard_by, ""))
+
+# -------- docs.json / shards.json --------
+def _write_json(path: str, obj: Any):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=1, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def save_docs(out_dir: str, docs: List[Dict[str, Any]]):
+    """docs: [{doc_name, path, start, count, jurisdiction, doc_type}] in row order. Unchanged files are not touched."""
+    path = os.path.join(out_dir, DOCS_FILE)
+    obj = {"documents": docs}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if json.load(f) == obj:
+                return  # keep the mtime, so the retriever does not reload for nothing
+    _write_json(path, obj)
+
+def load_docs(folder: str) -> Optional[List[Dict[str, Any]]]:
+    path = os.path.join(folder, DOCS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["documents"]
+
+def save_shards(index_dir: str, shard_by: str, shards: Dict[str, List[Dict[str, Any]]]):
+    """shards: {shard: docs entries}. Tags shared by every document of a shard are recorded for routing."""
+    out = {}
+    for name, docs in sorted(shards.items()):
+        common = {k: docs[0][k] for k in TAG_KEYS if docs and all(d[k] == docs[0][k] for d in docs)}
+        out[name] = {"documents": sorted(d["doc_name"] for d in docs), "tags": common}
+    _write_json(os.path.join(index_dir, SHARDS_FILE), {"shard_by": shard_by, "shards": out})
+
+def load_shards(index_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(index_dir, SHARDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# -------- Filters --------
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Optional[Filters]:
+    """Validate and canonicalize a filter dict; None or {} means no filter."""
+    if not filters:
+        return None
+    out: Filters = {}
+    for key, value in filters.items():
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Unknown filter {key!r}; use {', '.join(FILTER_KEYS)}")
+        values = [value] if isinstance(value, str) else list(value)
+        out[key] = frozenset(str(v).lower() for v in values)
+    return out or None
+
+def filters_key(filters: Optional[Filters]) -> Optional[Tuple]:
+    """Hashable, order-independent form (for caches and coalescing keys)."""
+    return None if not filters else tuple(sorted((k, tuple(sorted(v))) for k, v in filters.items()))
+
+def matches(doc: Dict[str, Any], filters: Optional[Filters]) -> bool:
+    return not filters or all(str(doc.get(k, "")).lower() in v for k, v in filters.items())
+
+def may_match(shard: Dict[str, Any], filters: Optional[Filters]) -> bool:
+    """False when a shard's documents or common tags rule the whole shard out (no need to open it)."""
+    if not filters:
+        return True
+    names = {d.lower() for d in shard["documents"]}
+    if "doc_name" in filters and not names & filters["doc_name"]:
+        return False
+    return all(shard["tags"][k].lower() in v for k, v in filters.items() if k in shard["tags"])
+
+def selected_rows(docs: Iterable[Dict[str, Any]], filters: Optional[Filters]) -> List[Tuple[int, int]]:
+    """(start, end) row ranges of the documents that match."""
+    return [(d["start"], d["start"] + d["count"]) for d in docs if matches(d, filters)]
@@ -66,32 +66,69 @@ def md_sections_to_chunks(md_text: str) -> List[Tuple[str, str]]:
                 out.append((anchor, ch))
     return out
 
-def select_short_quote(text: str, max_words: int = 30) -> str:
-    # pick a sentence (<= max_words) - prioritize sentences with 'shall', 'must', 'should'
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    key_words = ('shall', 'must', 'should', 'required', 'prohibit', 'oblig', 'ensure')
-    # Rank: shorter and contains key words
+# ----------- Sentences & quotes -----------
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_QUOTE_KEYWORDS = ('shall', 'must', 'should', 'required', 'prohibit', 'oblig', 'ensure')
+_MIN_QUOTE_WORDS = 5
+_LETTER = re.compile(r'[^\W\d_]')
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of each sentence in `text`."""
+    start, end = len(text) - len(text.lstrip()), len(text.rstrip())
+    spans, pos = [], start
+    for m in _SENTENCE_BREAK.finditer(text, start, end):
+        spans.append((pos, m.start()))
+        pos = m.end()
+    spans.append((pos, end))
+    return spans
+
+def quote_spans(text: str, max_words: int = 30, n: int = 3) -> List[Tuple[int, int]]:
+    """Best quote candidates as (start, end) offsets, best first.
+    Sentences of 5..max_words words are ranked by obligation keywords ('shall', 'must', ...)
+    and closeness to ~15 words; otherwise the first sentence, cut to max_words."""
+    spans = sentence_spans(text)
     scored = []
-    for s in sentences:
+    for a, b in spans:
+        s = text[a:b]
         wc = len(s.split())
-        if wc == 0 or wc > max_words:
-            continue
-        score = 0
+        if wc < _MIN_QUOTE_WORDS or wc > max_words or not _LETTER.search(s):
+            continue  # too long, or a fragment such as a paragraph number ("4.")
         lower = s.lower()
-        for kw in key_words:
-            if kw in lower:
-                score += 2
+        score = sum(2 for kw in _QUOTE_KEYWORDS if kw in lower)
         score += max(0, 20 - abs(15 - wc))  # prefer around ~15 words
-        scored.append((score, s.strip().strip('"')))
+        # trim surrounding whitespace and quote marks
+        a += len(s) - len(s.lstrip().lstrip('"'))
+        b = a + len(s.strip().strip('"'))
+        scored.append((score, text[a:b], a, b))
     if scored:
         scored.sort(reverse=True)
-        return scored[0][1]
-    # fallback: trim first sentence
-    for s in sentences:
-        if s.strip():
-            words = s.split()[:max_words]
-            return ' '.join(words).strip()
-    return ''
+        out, seen = [], set()
+        for _, q, a, b in scored:
+            if q and q not in seen:
+                seen.add(q)
+                out.append((a, b))
+        return out[:n]
+    # fallback: trim first sentence with words in it
+    for a, b in spans:
+        if not _LETTER.search(text[a:b]):
+            continue
+        m = list(re.finditer(r'\S+', text[a:b]))[:max_words]
+        if m:
+            return [(a + m[0].start(), a + m[-1].end())]
+    return []
+
+def quote_text(text: str, span) -> str:
+    return ' '.join(text[span[0]:span[1]].split())
+
+def select_short_quote(text: str, max_words: int = 30) -> str:
+    # pick a sentence (<= max_words) - prioritize sentences with 'shall', 'must', 'should'
+    spans = quote_spans(text, max_words, n=1)
+    return quote_text(text, spans[0]) if spans else ''
+
+def estimate_tokens(text: str) -> int:
+    # Rough OpenAI token count (~4 chars/token for English); good enough for budgeting
+    return len(text) // 4 + 1
 
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
@@ -0,0 +1,160 @@
+# src/vector_cache.py
+"""
+On-disk cache of chunk embeddings, one directory per embedding model:
+
+    data/cache/embeddings/{model-slug}/vectors.npy   float32 (rows, dim), memory-mapped
+    data/cache/embeddings/{model-slug}/keys.json     {"model": ..., "dim": ..., "rows": {sha1(text): row}}
+
+Unchanged chunk text is never re-embedded, across re-ingests and across
+switches of EMBEDDING_MODEL. `python -m src.vector_cache` shows which models
+cover the current index.
+"""
+from __future__ import annotations
+import os, re, json, hashlib, argparse, threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import Paths, Settings
+from .utils import ensure_dir
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", model_name)
+
+class VectorCache:
+    """Append-only (text hash -> vector) store for one model. New rows are buffered until flush()."""
+
+    def __init__(self, root: str, model_name: str):
+        self.model_name = model_name
+        self.folder = os.path.join(root, model_slug(model_name))
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._dim: Optional[int] = None
+        self._vectors = None  # np.memmap of the flushed rows
+        self._pending: Dict[str, np.ndarray] = {}
+        keys_path = os.path.join(self.folder, "keys.json")
+        vec_path = os.path.join(self.folder, "vectors.npy")
+        if os.path.exists(keys_path) and os.path.exists(vec_path):
+            with open(keys_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(vec_path, mmap_mode="r")
+            if meta.get("model") == model_name and len(vectors) == len(meta["rows"]):
+                self._rows, self._dim, self._vectors = meta["rows"], meta["dim"], vectors
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows or key in self._pending
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        vec = self._pending.get(key)
+        if vec is not None:
+            return vec
+        row = self._rows.get(key)
+        return None if row is None else np.asarray(self._vectors[row])
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype="float32")
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+            for key, vec in zip(keys, vectors):
+                if key not in self._rows:
+                    self._pending[key] = vec
+
+    def flush(self):
+        """Write buffered rows: vectors.npy is rewritten to a temp file and renamed, then keys.json."""
+        with self._lock:
+            if not self._pending:
+                return
+            ensure_dir(self.folder)
+            new_keys = list(self._pending)
+            new_vecs = np.stack([self._pending[k] for k in new_keys])
+            old = self._vectors if self._vectors is not None else np.zeros((0, self._dim), dtype="float32")
+            vec_path = os.path.join(self.folder, "vectors.npy")
+            out = np.lib.format.open_memmap(vec_path + ".tmp", mode="w+", dtype="float32",
+                                            shape=(len(old) + len(new_vecs), self._dim))
+            out[:len(old)] = old
+            out[len(old):] = new_vecs
+            out.flush()
+            del out
+            rows = dict(self._rows)
+            for i, k in enumerate(new_keys):
+                rows[k] = len(old) + i
+            self._vectors = None  # release the old mapping before replacing the file
+            os.replace(vec_path + ".tmp", vec_path)
+            keys_path = os.path.join(self.folder, "keys.json")
+            with open(keys_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self._dim, "rows": rows}, f)
+            os.replace(keys_path + ".tmp", keys_path)
+            self._rows = rows
+            self._vectors = np.load(vec_path, mmap_mode="r")
+            self._pending = {}
+
+_caches: Dict[str, VectorCache] = {}
+_caches_lock = threading.Lock()
+
+def get_vector_cache(model_name: str, paths: Paths = Paths()) -> VectorCache:
+    """Return the process-wide VectorCache for `model_name`."""
+    root = os.path.join(paths.cache_dir, "embeddings")
+    key = os.path.join(root, model_slug(model_name))
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = VectorCache(root, model_name)
+                _caches[key] = cache
+    return cache
+
+def cached_encode(texts: List[str], model_name: str, encode, paths: Paths = Paths()) -> np.ndarray:
+    """
+    Embeddings for `texts`, calling `encode(list_of_texts)` only for texts not
+    already cached for this model. Call get_vector_cache(...).flush() to persist.
+    """
+    cache = get_vector_cache(model_name, paths)
+    keys = [text_hash(t) for t in texts]
+    missing: Dict[str, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in cache and k not in missing:
+            missing[k] = t
+    if missing:
+        cache.put_many(list(missing), encode(list(missing.values())))
+    if not keys:
+        return np.zeros((0, cache._dim or 0), dtype="float32")
+    return np.stack([cache.get(k) for k in keys])
+
+def main():
+    parser = argparse.ArgumentParser(description="Show cached embedding models and their coverage of the current index.")
+    parser.add_argument("--artifacts_dir", default=str(Paths().artifacts_dir))
+    args = parser.parse_args()
+
+    from .embed_backend import embedding_id
+
+    settings, paths = Settings(), Paths()
+    meta_path = os.path.join(args.artifacts_dir, settings.index_name, "metadata.jsonl")
+    hashes = []
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            hashes = [text_hash(json.loads(line)["text"]) for line in f if line.strip()]
+    root = os.path.join(paths.cache_dir, "embeddings")
+    if not os.path.isdir(root):
+        print("No cached embeddings yet.")
+        return
+    print(f"{'model':<55} {'dim':>5} {'rows':>8} {'index coverage':>15}")
+    for slug in sorted(os.listdir(root)):
+        keys_path = os.path.join(root, slug, "keys.json")
+        if not os.path.exists(keys_path):
+            continue
+        with open(keys_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        covered = sum(1 for h in hashes if h in meta["rows"])
+        marker = "*" if meta["model"] == embedding_id(settings) else " "
+        print(f"{marker}{meta['model']:<54} {meta['dim']:>5} {len(meta['rows']):>8} {covered:>7}/{len(hashes):<7}")
+
+if __name__ == "__main__":
+    main()
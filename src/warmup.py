@@ -0,0 +1,242 @@
+# src/warmup.py
+"""
+Cold start: preload, bundle, measure.
+
+Importing src.rag is cheap; faiss, torch/sentence_transformers and openai are
+imported on first use. warmup() pays that cost up front (index, embedding
+model, reranker, LLM connection pool), in the background if asked, so the
+first user after a deploy does not.
+
+    python -m src.warmup                       # warm up once and print per-step timings
+    python -m src.warmup bundle --out bundle/ [--with-model]
+    python -m src.warmup measure [--question "..."]
+
+`bundle` writes a serve-only copy of artifacts/{index_name}/ (every shard,
+for SHARD_BY layouts) that loads fastest: index.faiss with search parameters
+and the IVF direct map baked in (memory-mapped at load, see INDEX_MMAP),
+metadata.bin, lexical.npz, docs.json (tags, for filters) and,
+with --with-model, the embedding model saved locally (or, with an ONNX
+EMBED_BACKEND, its export). Point ARTIFACTS_DIR (and EMBEDDING_MODEL_PATH or
+EMBED_ONNX_DIR) at it.
+
+`measure` runs fresh interpreters and reports import time and time to the
+first answer, cold and after warmup().
+"""
+from __future__ import annotations
+import os, sys, json, time, shutil, hashlib, argparse, threading, subprocess
+from typing import Any, Dict, Optional
+
+from .config import Paths, Settings
+
+BUNDLE_FILE = "bundle.json"
+_SERVE_FILES = ("metadata.bin", "lexical.npz", "docs.json", "manifest.json")  # copied as-is; index.faiss is rewritten
+
+# -------- Warm-up --------
+def warmup(paths: Paths = Paths(), settings: Settings = Settings(), background: bool = False):
+    """
+    Load everything the first request would. Returns {step: ms, "errors": {...}},
+    or the started daemon thread when background=True. Never raises: a step
+    that fails (no index yet, no API key) is left for the first request to report.
+    """
+    if background:
+        t = threading.Thread(target=warmup, args=(paths, settings), name="warmup", daemon=True)
+        t.start()
+        return t
+
+    timings: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+
+    def step(name: str, fn):
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            errors[name] = f"{e.__class__.__name__}: {e}"
+        timings[name] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+    def index():
+        from .retriever import get_retriever
+        get_retriever(paths.artifacts_dir, settings.index_name, settings).snapshot()
+
+    def embedder():
+        from .embedder import get_embedder
+        get_embedder(settings.embedding_model, settings).embed("warm up")
+
+    def reranker():
+        from .reranker import get_reranker
+        get_reranker(settings).model
+
+    def llm():
+        from .llm import LLMClient
+        LLMClient(settings)  # imports openai/httpx and opens the shared connection pool
+
+    step("index", index)
+    step("embedder", embedder)
+    if settings.rerank:
+        step("reranker", reranker)
+    step("llm", llm)
+    timings["errors"] = errors
+    return timings
+
+# -------- Bundle --------
+def _sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _bundle_index(src: str, dst: str, settings: Settings):
+    """Copy one index folder (the single index, or one shard) for serving; returns the rewritten index."""
+    import faiss
+    from .ann import apply_search_params
+    from .metastore import META_BIN_FILE, convert_jsonl
+    from .retriever import INDEX_FILE, META_FILE
+
+    if not os.path.exists(os.path.join(src, INDEX_FILE)):
+        raise FileNotFoundError(f"No index at {src}. Run ingestion first.")
+    os.makedirs(dst)
+    index = apply_search_params(faiss.read_index(os.path.join(src, INDEX_FILE)), settings)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()  # serialized with the index, so load skips rebuilding it
+    faiss.write_index(index, os.path.join(dst, INDEX_FILE))
+    for name in _SERVE_FILES:
+        if os.path.exists(os.path.join(src, name)):
+            shutil.copy2(os.path.join(src, name), os.path.join(dst, name))
+    if not os.path.exists(os.path.join(dst, META_BIN_FILE)):
+        convert_jsonl(os.path.join(src, META_FILE), os.path.join(dst, META_BIN_FILE))
+    return index
+
+def build_bundle(out_dir: str, paths: Paths = Paths(), settings: Settings = Settings(),
+                 with_model: bool = False) -> Dict[str, Any]:
+    """
+    Write {out_dir}/{index_name}/ (with shards.json and shards/* for a sharded
+    index) and {out_dir}/model/; replaces an older bundle in one rename.
+    """
+    from .shards import SHARDS_DIR, SHARDS_FILE, load_shards
+
+    src = os.path.join(paths.artifacts_dir, settings.index_name)
+    out_dir = os.path.abspath(out_dir)
+    tmp = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    folder = os.path.join(tmp, settings.index_name)
+    shards = load_shards(src)
+    if shards is None:
+        indexes = [_bundle_index(src, folder, settings)]
+    else:
+        indexes = [_bundle_index(os.path.join(src, SHARDS_DIR, name), os.path.join(folder, SHARDS_DIR, name), settings)
+                   for name in shards["shards"]]
+        shutil.copy2(os.path.join(src, SHARDS_FILE), os.path.join(folder, SHARDS_FILE))
+
+    model_dir = None
+    if with_model and settings.embed_backend != "torch":
+        from .embed_backend import ensure_export, onnx_dir
+        model_dir = os.path.join(out_dir, "model_onnx")
+        export = ensure_export(settings.embedding_model, onnx_dir(settings), settings.embedding_model_path,
+                               int8=settings.embed_backend == "onnx_int8")
+        shutil.copytree(export, os.path.join(tmp, "model_onnx"))
+    elif with_model:
+        from .embedder import get_embedder
+        model_dir = os.path.join(out_dir, "model")
+        get_embedder(settings.embedding_model, settings).model.save(os.path.join(tmp, "model"))
+
+    info = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "index_name": settings.index_name,
+        "index_type": type(indexes[0]).__name__,
+        "shards": sorted(shards["shards"]) if shards is not None else None,
+        "ntotal": sum(int(index.ntotal) for index in indexes),
+        "embedding_model": settings.embedding_model,
+        "embed_backend": settings.embed_backend,
+        "model_dir": model_dir,
+        "files": {os.path.relpath(os.path.join(d, n), folder): {"bytes": os.path.getsize(os.path.join(d, n)),
+                                                                 "sha1": _sha1(os.path.join(d, n))}
+                  for d, _, names in sorted(os.walk(folder)) for n in sorted(names)},
+    }
+    with open(os.path.join(tmp, BUNDLE_FILE), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=1)
+
+    old = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return info
+
+# -------- Measure --------
+def _probe(question: str, warm: bool) -> Dict[str, Any]:
+    """Runs inside a fresh interpreter (see measure)."""
+    from dataclasses import replace
+
+    out: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    from . import rag
+    out["import_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    paths, settings = Paths(), replace(Settings(), answer_cache=False)  # time the pipeline, not the cache
+    if warm:
+        t1 = time.perf_counter()
+        out["warmup"] = warmup(paths, settings)
+        out["warmup_ms"] = round((time.perf_counter() - t1) * 1000.0, 1)
+    llm_ok = "llm" not in (out.get("warmup") or {}).get("errors", {})
+    if not warm:
+        from .llm import _get_api_key
+        llm_ok = bool(_get_api_key())
+    for label in ("first_ms", "second_ms"):
+        t1 = time.perf_counter()
+        if llm_ok:
+            rag.answer(question, paths, settings)
+        else:  # no LLM configured: time up to the prompt
+            from .context import retrieval_depth
+            from .retriever import retrieve
+            retrieve(question, retrieval_depth(settings), settings.min_sim_threshold, settings, paths.artifacts_dir)
+        out[label] = round((time.perf_counter() - t1) * 1000.0, 1)
+    out["measured"] = "answer" if llm_ok else "retrieval"
+    out["time_to_first_ms"] = round((time.perf_counter() - t0) * 1000.0 - out["second_ms"], 1)
+    return out
+
+def measure(question: str) -> Dict[str, Any]:
+    """Cold and warmed-up runs, each in a new process so nothing is already imported."""
+    results = {}
+    for mode in ("cold", "warm"):
+        cmd = [sys.executable, "-m", "src.warmup", "_probe", "--question", question] + (["--warm"] if mode == "warm" else [])
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=Paths().base_dir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{mode} probe failed:\n{proc.stderr}")
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        results[mode]["process_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    return results
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Warm up, bundle artifacts, or measure cold start.")
+    parser.add_argument("command", nargs="?", default="warm", choices=["warm", "bundle", "measure", "_probe"])
+    parser.add_argument("--out", default=os.path.join(Paths().base_dir, "bundle"), help="bundle directory")
+    parser.add_argument("--with-model", action="store_true", help="save the embedding model into the bundle")
+    parser.add_argument("--question", default="What does FATF Recommendation 16 require for wire transfers?")
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == "_probe":
+        print(json.dumps(_probe(args.question, args.warm)))
+    elif args.command == "warm":
+        print(json.dumps(warmup(), indent=1))
+    elif args.command == "bundle":
+        info = build_bundle(args.out, with_model=args.with_model)
+        print(json.dumps(info, indent=1))
+        print(f"\nServe it with: ARTIFACTS_DIR={args.out}"
+              + (f" {'EMBEDDING_MODEL_PATH' if info['embed_backend'] == 'torch' else 'EMBED_ONNX_DIR'}={info['model_dir']}"
+               if info["model_dir"] else ""))
+    else:
+        res = measure(args.question)
+        print(f"{'':<6} {'import ms':>10} {'warmup ms':>10} {'1st ms':>9} {'2nd ms':>9} {'to 1st ms':>10} {'process ms':>11}")
+        for mode, r in res.items():
+            print(f"{mode:<6} {r['import_ms']:>10} {r.get('warmup_ms', '-'):>10} {r['first_ms']:>9} "
+                  f"{r['second_ms']:>9} {r['time_to_first_ms']:>10} {r['process_ms']:>11}")
+        print(f"(timed: {res['cold']['measured']})")
+        errors = res["warm"].get("warmup", {}).get("errors")
+        if errors:
+            print("warmup errors:", json.dumps(errors))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# tests/conftest.py — make `src` importable when pytest is run from anywhere
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
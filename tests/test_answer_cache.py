@@ -0,0 +1,60 @@
+# tests/test_answer_cache.py
+import numpy as np
+
+from src.answer_cache import AnswerCache
+
+def _vec(*xs):
+    v = np.array(xs, dtype="float32")
+    return v / np.linalg.norm(v)
+
+PAYLOAD = {"text": "- Keep client money separate.", "quotes": [], "citations": ["VARA_Client_Money.md#s1"],
+           "used_contexts": []}
+
+def test_hit_on_near_duplicate_miss_below_threshold(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), threshold=0.95)
+    cache.store("client money rules", _vec(1, 0, 0), "scope", "v1", PAYLOAD)
+    assert cache.lookup(_vec(1, 0.1, 0), "scope", "v1") == PAYLOAD  # cosine ~0.995
+    assert cache.lookup(_vec(1, 1, 0), "scope", "v1") is None        # cosine ~0.707
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_scope_and_index_version_isolate_entries(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    cache.store("q", _vec(0, 1, 0), "scope", "v1", PAYLOAD)
+    assert cache.lookup(_vec(0, 1, 0), "other-scope", "v1") is None
+    assert cache.lookup(_vec(0, 1, 0), "scope", "v2") is None  # a new index retires the old answers
+    assert cache.lookup(_vec(0, 1, 0), "scope", "v1") is None
+    assert cache.stats()["size"] == 0
+
+def test_ttl_expiry(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), ttl=-1.0)
+    cache.store("q", _vec(0, 0, 1), "scope", "v1", PAYLOAD)
+    assert cache.lookup(_vec(0, 0, 1), "scope", "v1") is None
+
+def test_lru_eviction_and_other_writers(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    cache = AnswerCache(path, max_entries=2)
+    cache.store("a", _vec(1, 0, 0), "scope", "v1", {**PAYLOAD, "text": "a"})
+    cache.store("b", _vec(0, 1, 0), "scope", "v1", {**PAYLOAD, "text": "b"})
+    assert cache.lookup(_vec(1, 0, 0), "scope", "v1")["text"] == "a"  # "b" is now least recently used
+    other = AnswerCache(path, max_entries=2)  # another process sharing the file
+    other.store("c", _vec(0, 0, 1), "scope", "v1", {**PAYLOAD, "text": "c"})
+    assert cache.lookup(_vec(0, 1, 0), "scope", "v1") is None
+    assert cache.lookup(_vec(0, 0, 1), "scope", "v1")["text"] == "c"
+    assert cache.stats()["size"] == 2
+
+def test_indexes_sharing_a_file_keep_their_entries(tmp_path):
+    from dataclasses import replace
+    from src.config import Settings
+    from src.rag import _cache_scope
+
+    a = _cache_scope(replace(Settings(), index_name="faiss_index"))
+    b = _cache_scope(replace(Settings(), index_name="faiss_index_new"))
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    cache.store("q", _vec(1, 0, 0), a, "a-v1", {**PAYLOAD, "text": "a"})
+    cache.store("q", _vec(1, 0, 0), b, "b-v1", {**PAYLOAD, "text": "b"})
+    for _ in range(2):  # alternate, as eval compare mode does
+        assert cache.lookup(_vec(1, 0, 0), a, "a-v1")["text"] == "a"
+        assert cache.lookup(_vec(1, 0, 0), b, "b-v1")["text"] == "b"
+    assert cache.lookup(_vec(1, 0, 0), a, "a-v2") is None  # index a rebuilt: only its rows go
+    assert cache.lookup(_vec(1, 0, 0), b, "b-v1")["text"] == "b"
+    assert cache.stats()["size"] == 1
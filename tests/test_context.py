@@ -0,0 +1,66 @@
+# tests/test_context.py
+from dataclasses import replace
+
+from src.config import Settings
+from src.context import BLOCK_SEPARATOR, format_block, pack_context
+from src.utils import estimate_tokens
+
+SETTINGS = replace(Settings(), context_packing=True, context_token_budget=1200, context_candidates=6,
+                   context_score_gap=0.10, context_dup_threshold=0.8, top_k=5)
+
+def _chunk(doc, anchor, text, score):
+    return {"doc_name": doc, "anchor": anchor, "text": text, "score": score}
+
+def _words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def _tokens(packed):
+    return sum(estimate_tokens(format_block(r)) for r in packed) + \
+        estimate_tokens(BLOCK_SEPARATOR) * max(0, len(packed) - 1)
+
+def test_stays_within_budget_and_skips_to_shorter_blocks():
+    results = [_chunk("a.pdf", "p1", _words("a", 120), 0.90),
+               _chunk("b.pdf", "p2", _words("b", 400), 0.89),  # too long for what is left
+               _chunk("c.pdf", "p3", _words("c", 20), 0.88)]
+    s = replace(SETTINGS, context_token_budget=300)
+    packed = pack_context(results, s)
+    assert [r["doc_name"] for r in packed] == ["a.pdf", "c.pdf"]
+    assert _tokens(packed) <= s.context_token_budget
+
+def test_top_chunk_over_budget_is_trimmed_at_a_sentence():
+    sentences = [f"Sentence {i} says firms must keep records of every transfer." for i in range(40)]
+    text = " ".join(sentences)
+    starts = [text.index(s) for s in sentences]
+    packed = pack_context([_chunk("a.pdf", "p1", text, 0.9) | {"sentences": starts}],
+                          replace(SETTINGS, context_token_budget=100))
+    assert len(packed) == 1 and "sentences" not in packed[0]
+    assert packed[0]["text"].endswith(". …")
+    assert _tokens(packed) <= 100
+
+def test_nothing_fits():
+    assert pack_context([_chunk("a.pdf", "p1", _words("a", 50), 0.9)], replace(SETTINGS, context_token_budget=2)) == []
+
+def test_score_gap_merge_and_dedup():
+    overlap = _words("o", 8)
+    section = _words("x", 10) + " " + overlap + " " + _words("y", 10)
+    results = [_chunk("a.pdf", "p1", _words("x", 10) + " " + overlap, 0.90),
+               _chunk("a.pdf", "p1", overlap + " " + _words("y", 10), 0.86),   # same section, continues it
+               _chunk("b.pdf", "p9", section, 0.85),                            # restated elsewhere
+               _chunk("c.pdf", "p2", _words("z", 10), 0.70)]                   # below best - gap
+    packed = pack_context(results, SETTINGS)
+    assert [r["doc_name"] for r in packed] == ["a.pdf"]
+    assert packed[0]["text"] == section
+
+def test_packing_off_keeps_top_k():
+    results = [_chunk("a.pdf", f"p{i}", "text", 0.9 - i / 100) for i in range(8)]
+    assert len(pack_context(results, replace(SETTINGS, context_packing=False, top_k=3))) == 3
+
+def test_trimmed_block_keeps_only_quotes_it_still_contains():
+    sentences = [f"Sentence {i} says firms must keep records of every transfer." for i in range(40)]
+    text = " ".join(sentences)
+    chunk = _chunk("a.pdf", "p1", text, 0.9) | {"sentences": [text.index(s) for s in sentences],
+                                                 "quotes": [sentences[39], sentences[0]]}
+    packed = pack_context([chunk], replace(SETTINGS, context_token_budget=100))
+    assert packed[0]["quotes"] == [sentences[0]]
+    no_offsets = {k: v for k, v in chunk.items() if k != "sentences"}  # trimmed at a word instead
+    assert pack_context([no_offsets], replace(SETTINGS, context_token_budget=100))[0]["quotes"] == [sentences[0]]
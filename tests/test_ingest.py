@@ -0,0 +1,46 @@
+# tests/test_ingest.py
+import threading
+from dataclasses import replace
+
+import pytest
+
+from src import ingest
+from src.config import Settings
+
+def _docs(tmp_path, n=12):
+    for i in range(n):
+        body = "\n\n".join(f"Licensed firms must keep client money in segregated account number {i}-{j}." for j in range(40))
+        (tmp_path / f"doc{i:02d}.md").write_text(f"# Rules {i}\n\n{body}\n", encoding="utf-8")
+    return [str(p) for p in sorted(tmp_path.glob("*.md"))]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_embedding_failure_stops_the_extractor(tmp_path, monkeypatch, workers):
+    calls = []
+
+    def failing_embed(batch, settings, show_progress_bar=True):
+        calls.append(len(batch))
+        raise RuntimeError("embedder died")
+
+    monkeypatch.setattr(ingest, "embed_records", failing_embed)
+    settings = replace(Settings(), ingest_workers=workers, ingest_pages_per_task=0, ingest_embed_batch=2,
+                       ingest_queue_batches=1)
+    with pytest.raises(RuntimeError, match="embedder died"):
+        ingest.extract_and_embed(_docs(tmp_path), settings)
+    assert calls == [2]
+    assert not [t for t in threading.enumerate() if t.name == "ingest-extract"]
+
+def test_extract_and_embed_keeps_document_order(tmp_path, monkeypatch):
+    import numpy as np
+
+    monkeypatch.setattr(ingest, "embed_records",
+                        lambda batch, settings, show_progress_bar=True: np.ones((len(batch), 4), dtype="float32"))
+    paths = _docs(tmp_path, n=3)
+    settings = replace(Settings(), ingest_workers=2, ingest_pages_per_task=0, ingest_embed_batch=3,
+                       ingest_queue_batches=1)
+    out = ingest.extract_and_embed(paths, settings)
+    assert list(out) == paths
+    for path in paths:
+        recs, vecs = out[path]
+        assert [(r.anchor, r.text) for r in recs] == \
+            [(r.anchor, r.text) for r in ingest.load_document(path, settings=settings)]
+        assert vecs.shape == (len(recs), 4)
@@ -0,0 +1,173 @@
+# tests/test_llm.py
+import asyncio, json, threading, time
+from dataclasses import replace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from src.config import Settings
+from src.llm import LLMClient, TokenBucketLimiter
+
+def _elapsed(coro) -> float:
+    async def run():
+        t = time.monotonic()
+        await coro()
+        return time.monotonic() - t
+    return asyncio.run(run())
+
+def test_request_bucket_refills_at_rpm():
+    limiter = TokenBucketLimiter(rpm=120, tpm=0)  # 2 requests/s once the burst is spent
+
+    async def go():
+        for _ in range(120):
+            await limiter.acquire(1)
+        await limiter.acquire(1)
+    assert 0.4 <= _elapsed(go) < 1.0
+
+def test_token_bucket_refills_at_tpm():
+    limiter = TokenBucketLimiter(rpm=0, tpm=600)  # 10 tokens/s
+
+    async def go():
+        await limiter.acquire(600)
+        await limiter.acquire(5)
+    assert 0.4 <= _elapsed(go) < 1.0
+
+def test_refund_returns_tokens():
+    limiter = TokenBucketLimiter(rpm=0, tpm=600)
+
+    async def go():
+        await limiter.acquire(600)
+        limiter.refund(100)
+        await limiter.acquire(100)
+    assert _elapsed(go) < 0.1
+
+def test_oversized_request_is_admitted():
+    limiter = TokenBucketLimiter(rpm=0, tpm=60)
+    assert _elapsed(lambda: limiter.acquire(10_000)) < 0.1
+
+def test_penalize_blocks_every_caller():
+    limiter = TokenBucketLimiter(rpm=500, tpm=200_000)
+    limiter.penalize(0.3)
+
+    async def go():
+        await asyncio.gather(*(limiter.acquire(10) for _ in range(3)))
+    assert 0.25 <= _elapsed(go) < 0.8
+
+def test_non_positive_limits_are_unlimited():
+    for rpm, tpm in ((0, 0), (-1, -5)):
+        limiter = TokenBucketLimiter(rpm, tpm)
+
+        async def go():
+            for _ in range(1000):
+                await limiter.acquire(1000)
+        assert _elapsed(go) < 0.5
+
+# -------- LLMClient against local servers --------
+def _settings(url, **kw):
+    return replace(Settings(), openai_base_url=url, openai_model="stub", llm_rpm=0, llm_tpm=0, **kw)
+
+def _status_server(status):
+    """Answers every request with `status`; counts requests."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.server.requests += 1
+            data = json.dumps({"error": {"message": "nope"}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+@pytest.fixture(autouse=True)
+def _api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+
+@pytest.mark.parametrize("status, name", [(400, "BadRequestError"), (401, "AuthenticationError"),
+                                          (404, "NotFoundError")])
+def test_client_errors_are_not_retried(status, name):
+    server, url = _status_server(status)
+    try:
+        with pytest.raises(Exception) as err:
+            LLMClient(_settings(url, llm_max_retries=5)).generate("system", "user")
+        assert err.type.__name__ == name
+        assert server.requests == 1
+    finally:
+        server.shutdown()
+
+def test_server_errors_are_retried():
+    server, url = _status_server(500)
+    try:
+        with pytest.raises(Exception) as err:
+            LLMClient(_settings(url, llm_max_retries=2)).generate("system", "user")
+        assert err.type.__name__ == "InternalServerError"
+        assert server.requests == 2
+    finally:
+        server.shutdown()
+
+PROMPT = ("system", "Context:\n[Source: FATF_Recommendations.pdf#p12]\nOriginator information must be accurate.")
+
+def _stub_client(monkeypatch, rate_limit_every=0, **kw):
+    from src.llm_stub import start_stub_server, stub_reply
+
+    server, url = start_stub_server(rate_limit_every=rate_limit_every)
+    client = LLMClient(_settings(url, **kw))
+    penalties = []
+    limiter = client.aclient.limiter
+    real = limiter.penalize
+    monkeypatch.setattr(limiter, "penalize", lambda seconds: (penalties.append(seconds), real(seconds)))
+    expected = stub_reply([{"content": PROMPT[0]}, {"content": PROMPT[1]}])
+    return server, client, penalties, expected
+
+def test_generate_retries_a_429_once_for_everybody(monkeypatch):
+    server, client, penalties, expected = _stub_client(monkeypatch, rate_limit_every=2)
+    try:
+        assert client.generate(*PROMPT) == expected
+        assert client.generate(*PROMPT) == expected  # 2nd request is a 429, the retry answers
+        assert penalties == [0.05]  # the stub's Retry-After
+        assert server.requests == 3
+    finally:
+        server.shutdown()
+
+def test_agenerate_from_another_loop(monkeypatch):
+    server, client, penalties, expected = _stub_client(monkeypatch, rate_limit_every=3)
+
+    async def go():
+        return await asyncio.gather(*(client.agenerate(*PROMPT) for _ in range(4)))
+    try:
+        assert asyncio.run(go()) == [expected] * 4
+        assert penalties == [0.05] and server.requests == 5  # one 429, one shared pause, one retry
+    finally:
+        server.shutdown()
+
+def test_generate_stream_after_a_429(monkeypatch):
+    server, client, penalties, expected = _stub_client(monkeypatch, rate_limit_every=2)
+    try:
+        assert client.generate(*PROMPT) == expected
+        assert "".join(client.generate_stream(*PROMPT)) == expected
+        assert penalties == [0.05] and server.requests == 3
+    finally:
+        server.shutdown()
+
+def test_closing_a_stream_early_releases_the_semaphore(monkeypatch):
+    server, client, _, expected = _stub_client(monkeypatch, llm_max_concurrency=1)
+    try:
+        tokens = client.generate_stream(*PROMPT)
+        assert next(tokens) == "- "
+        tokens.close()
+        assert client.generate(*PROMPT) == expected  # would block forever if the slot were still held
+        deadline = time.monotonic() + 2
+        while client.aclient.semaphore._value != 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.aclient.semaphore._value == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,71 @@
+# tests/test_metastore.py
+import json, struct
+
+import numpy as np
+
+from src.metastore import MAGIC_V1, ROW_DTYPE_V1, MetaStore, convert_jsonl, save_metastore
+from src.utils import quote_text
+
+FIRST = "Countries should ensure that originator information is accurate."
+RECORDS = [
+    {"doc_name": "FATF_Recommendations.pdf", "anchor": "p12",
+     "text": FIRST + " It must accompany the transfer.",
+     "sentences": [0, len(FIRST) + 1], "quotes": [[0, len(FIRST)]]},
+    {"doc_name": "FATF_Recommendations.pdf", "anchor": "p13", "text": "Ünïcode — text with no spans."},
+    {"doc_name": "VARA_Client_Money.md", "anchor": "Client Money", "text": ""},
+]
+
+def _write_v1(records, path):
+    """A file in the original CBMETA1 layout: no span columns."""
+    strings, ids, rows, blobs, off = [], {}, [], [], 0
+    for r in records:
+        for s in (r["doc_name"], r["anchor"]):
+            if s not in ids:
+                ids[s] = len(strings)
+                strings.append(s)
+        data = r["text"].encode("utf-8")
+        rows.append((ids[r["doc_name"]], ids[r["anchor"]], off, len(data)))
+        blobs.append(data)
+        off += len(data)
+    rows_arr = np.array(rows, dtype=ROW_DTYPE_V1)
+    header = {"n": len(rows), "strings": strings, "rows_offset": 10 ** 15, "text_offset": 10 ** 15}
+    hdr_len = len(json.dumps(header))
+    rows_offset = (16 + hdr_len + 7) // 8 * 8
+    header.update(rows_offset=rows_offset, text_offset=rows_offset + rows_arr.nbytes)
+    with open(path, "wb") as f:
+        f.write(MAGIC_V1 + struct.pack("<Q", hdr_len) + json.dumps(header).encode("utf-8").ljust(hdr_len))
+        f.write(b"\0" * (rows_offset - 16 - hdr_len) + rows_arr.tobytes() + b"".join(blobs))
+
+def test_v2_round_trip(tmp_path):
+    path = str(tmp_path / "metadata.bin")
+    save_metastore(RECORDS, path)
+    store = MetaStore(path)
+    assert len(store) == len(RECORDS)
+    for i, r in enumerate(RECORDS):
+        got = store.get(i)
+        assert (got["doc_name"], got["anchor"], got["text"]) == (r["doc_name"], r["anchor"], r["text"])
+        assert store.text(i) == r["text"]
+        assert got["sentences"] == r.get("sentences", [])
+        assert got["quotes"] == [quote_text(r["text"], q) for q in r.get("quotes", [])]
+    assert store.get(0)["quotes"] == [FIRST]
+    assert store.strings.count("FATF_Recommendations.pdf") == 1  # interned
+
+def test_v1_files_still_load(tmp_path):
+    path = str(tmp_path / "metadata.bin")
+    _write_v1(RECORDS, path)
+    store = MetaStore(path)
+    assert len(store) == len(RECORDS)
+    for i, r in enumerate(RECORDS):
+        assert store.get(i) == {"doc_name": r["doc_name"], "anchor": r["anchor"], "text": r["text"]}
+
+def test_convert_jsonl_adds_spans(tmp_path):
+    jsonl = tmp_path / "metadata.jsonl"
+    rows = [{"doc_name": "a.md", "anchor": "s1",
+             "text": "Firms must keep client money separate from their own funds. Records are kept for five years."}]
+    jsonl.write_text("\n".join(json.dumps(r) for r in rows) + "\n", encoding="utf-8")
+    out = str(tmp_path / "metadata.bin")
+    assert convert_jsonl(str(jsonl), out) == 1
+    got = MetaStore(out).get(0)
+    assert got["text"] == rows[0]["text"]
+    assert got["sentences"][0] == 0 and len(got["sentences"]) == 2
+    assert got["quotes"] and all(q in rows[0]["text"] for q in got["quotes"])
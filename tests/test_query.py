@@ -0,0 +1,43 @@
+# tests/test_query.py
+import pytest
+
+from src.query import canonical_query, dedup_key
+
+@pytest.mark.parametrize("text, expected", [
+    ("what does  R.16 require ??", "what does FATF Recommendation 16 require?"),
+    ("R16 thresholds", "FATF Recommendation 16 thresholds"),
+    ("FATF R 16 scope", "FATF Recommendation 16 scope"),
+    ("fatf r16 scope", "FATF Recommendation 16 scope"),
+    ("Fatf R.16", "FATF Recommendation 16"),
+    ("rec. 16", "FATF Recommendation 16"),
+    ("FATF's Recommendation 10", "FATF Recommendation 10"),
+    ("INR.16 thresholds", "Interpretive Note to FATF Recommendation 16 thresholds"),
+    ("VARA’s rules – client money", "VARA's rules - client money"),
+    ("wait... which rule??", "wait... which rule?"),
+])
+def test_rewrites(text, expected):
+    assert canonical_query(text) == expected
+
+@pytest.mark.parametrize("text", [
+    "Fees of $16, R 20 per transfer",           # rand, not a Recommendation
+    "Is a 3 r 5 ok?",
+    "Recommendations 10 and 11",                # a plural list must keep every number
+    "INR 16 limit",                             # rupees
+    "Rec 41",                                   # there are 40 Recommendations
+    "Rec 16.5 percent",
+    "R2D2 and the Rector 5",
+    "Section 3.1 ...",                          # an ellipsis is not repeated punctuation
+])
+def test_false_positives_unchanged(text):
+    assert canonical_query(text) == text
+
+@pytest.mark.parametrize("text", ["R.16", "Rec 16?", "INR.16 and R 20", "fatf r 16", "Recommendations 10 and 11", "so ... R16..."])
+def test_idempotent(text):
+    once = canonical_query(text)
+    assert canonical_query(once) == once
+
+def test_dedup_key_merges_spellings():
+    assert dedup_key("What does Rec 16 require?") == dedup_key("what does FATF Recommendation 16 require")
+    assert dedup_key("“Client money” rules") == dedup_key('"client money" rules!!')
+    assert dedup_key("fatf r16 scope") == dedup_key("FATF R16 scope") == dedup_key("Fatf R.16 scope")
+    assert dedup_key("R 20 per transfer") != dedup_key("FATF Recommendation 20 per transfer")
@@ -0,0 +1,24 @@
+# tests/test_retriever.py
+from src.retriever import _MAX_SELECTIONS, _Snapshot
+from src.shards import filters_key, normalize_filters
+
+def _snapshot(n_docs):
+    docs = [{"doc_name": f"doc{i}.md", "start": 10 * i, "count": 10} for i in range(n_docs)]
+    return _Snapshot(None, [None] * (10 * n_docs), None, docs, (), "v1")
+
+def test_select_caches_filters_lru():
+    snap = _snapshot(_MAX_SELECTIONS + 4)
+    filters = [normalize_filters({"doc_name": f"doc{i}.md"}) for i in range(_MAX_SELECTIONS + 4)]
+    first = snap.select(filters[0])
+    assert first.rows.tolist() == list(range(10))
+    for f in filters[1:_MAX_SELECTIONS]:
+        snap.select(f)
+    assert snap.select(filters[0]) is first  # hit; now the most recently used
+    for f in filters[_MAX_SELECTIONS:]:
+        snap.select(f)
+    assert len(snap.selections) == _MAX_SELECTIONS
+    assert filters_key(filters[0]) in snap.selections
+    assert filters_key(filters[1]) not in snap.selections  # least recently used went first
+    newest = snap.select(filters[-1])
+    assert snap.select(filters[-1]) is newest  # filters past the limit are still cached
+    assert snap.select(None) is None